@@ -1,6 +1,29 @@
 import streamlit as st
-from crew import run_crew
+from crew import run_crew, warmup_steps
+from crew_logging import request_log
+from gazetteer import gazetteer
+from memory import monitor as memory_monitor
+from metrics import metrics
+from profiling import header_requests_profile, recent_profiles
+from request_context import new_request_id, request_scope
+from streamlit_support import fragment
+from warmup import start_warmup, status as warmup_status, wait_until_warm
 import os
+from datetime import time as dt_time
+
+
+@st.cache_resource(show_spinner=False)
+def start_crew():
+    """Warm up once per process (a no-op when serve.py has already started it)."""
+    start_warmup(warmup_steps)
+    return warmup_status
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def place_labels(query):
+    """Gazetteer autocompletion for the location field, cached across sessions."""
+    return [place.label for place in gazetteer().complete(query)] if query.strip() else []
+
 
 # --- Streamlit App Configuration ---
 st.set_page_config(
@@ -9,6 +32,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+start_crew()
+
 # --- Header and Description ---
 st.title("🍽️ CrewAI Restaurant Recommender")
 st.markdown("""
@@ -21,6 +46,39 @@ This demo is designed to be run on an AWS EC2 instance and uses the pre-configur
 """)
 
 # --- Sidebar for Instructions ---
+
+@fragment
+def service_metrics():
+    """Metrics snapshot, built only while shown; toggling reruns only this panel."""
+    if st.checkbox("Show service metrics", value=False, key="show_metrics"):
+        st.caption("Client-side rate limits and throttling for OpenAI, Serper and Open-Meteo.")
+        st.json(metrics.snapshot())
+
+
+@fragment
+def debug_panel():
+    """Profiling toggle and memory report; toggling reruns only this panel."""
+    st.checkbox(
+        "Profile requests",
+        value=False,
+        key="profile_requests",
+        help="Record a sampling profile (collapsed stacks and speedscope) of each recommendation."
+    )
+    for trace_path in reversed(recent_profiles):
+        st.code(trace_path, language=None)
+    # The report walks the allocation snapshot, so only build it when asked for
+    if st.checkbox("Show memory report", value=False, key="show_memory"):
+        st.caption("Memory (RSS, requests' objects still alive, top growing allocation sites)")
+        st.json(memory_monitor.report())
+
+
+def dining_time():
+    """The reservation time chosen in the sidebar ("" for current conditions)."""
+    if not (st.session_state.get("include_weather") and st.session_state.get("plan_ahead")):
+        return ""
+    return f"{st.session_state.dining_date:%Y-%m-%d} {st.session_state.dining_clock:%H:%M}"
+
+
 with st.sidebar:
     st.header("How the Crew Works")
     st.markdown("""
@@ -29,7 +87,7 @@ with st.sidebar:
     3. **Weather Advisor (optional):** Summarizes the current weather to help you plan for patio seating, attire, or travel.
     4. **Recommendation Generator:** Synthesizes the analysis into a final, personalized recommendation.
 
-    The process is sequential, and the agents delegate tasks to each other. The detailed collaboration log will be visible in the terminal where the Streamlit app is running.
+    The process is sequential, and the agents delegate tasks to each other. The collaboration log for each request is shown below its recommendation.
     """)
 
     st.info("Example Preference: 'A romantic, high-end French restaurant in New York City with a 5-star rating.'")
@@ -37,36 +95,116 @@ with st.sidebar:
     include_weather = st.checkbox(
         "Include current weather insights",
         value=True,
+        key="include_weather",
         help="Adds a weather specialist agent that provides a quick briefing for the dining location."
     )
 
+    plan_ahead = st.checkbox(
+        "Forecast for a reservation time",
+        value=False,
+        key="plan_ahead",
+        disabled=not include_weather,
+        help="Use the forecast for when you plan to dine (local time at the restaurant) instead of current conditions."
+    )
+    if include_weather and plan_ahead:
+        st.date_input("Dining date", key="dining_date")
+        st.time_input("Dining time", value=dt_time(19, 0), key="dining_clock")
+
+    with st.expander("Service metrics"):
+        service_metrics()
+
+    with st.expander("Debug"):
+        debug_panel()
+
 # --- Main Application Logic ---
 
-# Input field for user preferences
-user_preference = st.text_area(
-    "Tell us your dining preferences (Cuisine, Location, Price Range, Occasion, etc.):",
-    value="Affordable Italian restaurant in downtown Chicago with a rating above 4.0",
-    height=100
-)
+# Optional location, autocompleted from the offline gazetteer; typing reruns only this part
+@fragment
+def location_picker():
+    location_query = st.text_input(
+        "Location (optional):",
+        placeholder="Start typing a city or neighborhood, e.g. 'Wicker'",
+        key="location_query"
+    )
+    suggestions = place_labels(location_query)
+    if suggestions:
+        st.selectbox("Matching places", suggestions, key="location_match")
+
+
+def chosen_location():
+    """The autocompleted place if one matches the location field, else the field as typed."""
+    location_query = st.session_state.get("location_query", "").strip()
+    match = st.session_state.get("location_match")
+    return match if match in place_labels(location_query) else location_query
+
+
+def recommend(user_preference, location):
+    """Run the crew for a submitted preference; returns the result kept in session state."""
+    result = {"request_id": new_request_id(), "recommendation": None, "error": None}
+    if not warmup_status.done.is_set():
+        with st.spinner("Finishing start-up warm-up..."):
+            wait_until_warm(timeout=300)
+    # Display a spinner while the crew is running
+    with st.spinner("Agents are collaborating to find your perfect restaurant..."):
+        try:
+            # Run the CrewAI process
+            full_preference = f"{user_preference} (Location: {location})" if location else user_preference
+            # Profile when toggled on or asked for with the X-Profile header; otherwise sample at PROFILE_SAMPLE_RATE
+            headers = getattr(getattr(st, "context", None), "headers", None)
+            profile = True if st.session_state.get("profile_requests") or header_requests_profile(headers) else None
+            with request_scope(result["request_id"]):
+                result["recommendation"] = run_crew(
+                    full_preference, include_weather=bool(st.session_state.get("include_weather", True)),
+                    dining_time=dining_time(), profile=profile,
+                    tenant=st.session_state.setdefault("tenant", new_request_id())
+                )
+        except Exception as e:
+            result["error"] = e
+    return result
 
-# Button to trigger the recommendation
-if st.button("Get Recommendation", type="primary"):
-    if not user_preference:
-        st.error("Please enter your dining preferences to get a recommendation.")
+
+def show_result(result):
+    """Render a stored result (reruns redraw it from session state without running the crew)."""
+    if result["error"] is not None:
+        st.error(f"An error occurred during the CrewAI process. Please check the crew log below for details.")
+        st.exception(result["error"])
     else:
-        # Display a spinner while the crew is running
-        with st.spinner("Agents are collaborating to find your perfect restaurant... (Check terminal for verbose log)"):
-            try:
-                # Run the CrewAI process
-                final_recommendation = run_crew(user_preference, include_weather=include_weather)
-                
-                # Display the result
-                st.success("Recommendation Complete!")
-                st.markdown("---")
-                st.subheader("Your Personalized Restaurant Recommendation:")
-                st.markdown(final_recommendation)
-                st.markdown("---")
-
-            except Exception as e:
-                st.error(f"An error occurred during the CrewAI process. Please check the terminal for details.")
-                st.exception(e)
+        # Display the result
+        st.success("Recommendation Complete!")
+        st.markdown("---")
+        st.subheader("Your Personalized Restaurant Recommendation:")
+        st.markdown(result["recommendation"])
+        st.markdown("---")
+
+    # Agent steps and task results recorded for this request (see crew_logging.py)
+    with st.expander(f"Crew log (request {result['request_id']})"):
+        st.code("\n".join(request_log(result["request_id"])) or "No events recorded.", language=None)
+
+
+# The preference form and the result area; submitting reruns only this part, and the
+# last result is kept in session state so other reruns redraw it without the crew
+@fragment
+def recommender():
+    with st.form("preference_form"):
+        # Input field for user preferences
+        user_preference = st.text_area(
+            "Tell us your dining preferences (Cuisine, Location, Price Range, Occasion, etc.):",
+            value="Affordable Italian restaurant in downtown Chicago with a rating above 4.0",
+            height=100,
+            key="preference"
+        )
+        # Button to trigger the recommendation
+        submitted = st.form_submit_button("Get Recommendation", type="primary")
+
+    if submitted:
+        if not user_preference:
+            st.error("Please enter your dining preferences to get a recommendation.")
+        else:
+            st.session_state.result = recommend(user_preference, chosen_location())
+
+    if st.session_state.get("result"):
+        show_result(st.session_state.result)
+
+
+location_picker()
+recommender()
@@ -0,0 +1,208 @@
+"""
+Hard budgets for the agents' ReAct loops.
+
+A confused model can call the same tool over and over or keep producing
+replies the output parser rejects, turning one request into a 10x outlier.
+``budget_scope`` gives each crew run a ``RunBudget``; the agents' models
+(model_routing.RoutedModel) and tools (``budgeted_call``) check it:
+
+  - LLM iterations per agent and per request, tool calls per agent and per
+    request, tokens per request and wall time per request,
+  - repeated identical tool calls within the run are answered from a per-run
+    memo instead of being executed again, with a reminder to move on,
+  - when an agent is over budget its tool calls are refused and its next
+    model call becomes a forced final answer: one last generation asked to
+    answer with what it has, or, once tokens or time are exhausted, a final
+    answer built from its last tool observation without calling the model.
+
+Exceeded limits, memo hits and forced answers are counted in ``metrics`` and
+logged to the request's crew log.
+
+Settings (per agent, overridable per role as <NAME>_<ROLE>, e.g.
+BUDGET_MAX_ITERATIONS_ANALYST): BUDGET_MAX_ITERATIONS (8) and
+BUDGET_MAX_TOOL_CALLS (6); per request: BUDGET_REQUEST_MAX_ITERATIONS (20),
+BUDGET_REQUEST_MAX_TOOL_CALLS (15), BUDGET_MAX_TOKENS (60000) and
+BUDGET_MAX_SECONDS (240).
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from crew_logging import crew_log
+from metrics import metrics
+
+MAX_ITERATIONS = int(os.environ.get("BUDGET_MAX_ITERATIONS", "8"))
+MAX_TOOL_CALLS = int(os.environ.get("BUDGET_MAX_TOOL_CALLS", "6"))
+REQUEST_MAX_ITERATIONS = int(os.environ.get("BUDGET_REQUEST_MAX_ITERATIONS", "20"))
+REQUEST_MAX_TOOL_CALLS = int(os.environ.get("BUDGET_REQUEST_MAX_TOOL_CALLS", "15"))
+MAX_TOKENS = int(os.environ.get("BUDGET_MAX_TOKENS", "60000"))
+MAX_SECONDS = float(os.environ.get("BUDGET_MAX_SECONDS", "240"))
+
+FORCE_INSTRUCTION = (
+    "\n\nYou have used up your {limit} budget for this task. Do not call any more tools. "
+    "Respond now, using only the information you already have, in exactly this format:\n"
+    "Thought: I now know the final answer\nFinal Answer: <your best complete answer>"
+)
+REPEATED_CALL_NOTE = (
+    "\n\n[You already called this tool with the same input; this is the same result. "
+    "Use it, try a different input, or give your Final Answer.]"
+)
+REFUSED_CALL = (
+    "Tool budget exhausted: no more tool calls are allowed for this task. "
+    "Give your Final Answer now with the information you already have."
+)
+
+_current_budget = ContextVar("run_budget", default=None)
+
+
+def _role_limit(name, role, default):
+    return int(os.environ.get(f"{name}_{role.upper()}", default))
+
+
+class RunBudget:
+    """Limits and counters for one crew run."""
+
+    def __init__(self, max_iterations=MAX_ITERATIONS, max_tool_calls=MAX_TOOL_CALLS,
+                 request_max_iterations=REQUEST_MAX_ITERATIONS, request_max_tool_calls=REQUEST_MAX_TOOL_CALLS,
+                 max_tokens=MAX_TOKENS, max_seconds=MAX_SECONDS):
+        self.max_iterations = max_iterations
+        self.max_tool_calls = max_tool_calls
+        self.request_max_iterations = request_max_iterations
+        self.request_max_tool_calls = request_max_tool_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.started_at = time.monotonic()
+        self.iterations = Counter()  # per role
+        self.tool_calls = Counter()  # per role
+        self.tokens = 0
+        self.forced = set()  # roles that already got their forced final answer
+        self.active_role = None  # the agent whose model spoke last; tool calls are charged to it
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def _over(self, role):
+        """The first limit ``role`` (or the whole run) has reached, or None."""
+        if time.monotonic() - self.started_at >= self.max_seconds:
+            return "time"
+        if self.tokens >= self.max_tokens:
+            return "tokens"
+        if self.iterations[role] >= _role_limit("BUDGET_MAX_ITERATIONS", role, self.max_iterations):
+            return "iterations"
+        if sum(self.iterations.values()) >= self.request_max_iterations:
+            return "request iterations"
+        if self.tool_calls[role] >= _role_limit("BUDGET_MAX_TOOL_CALLS", role, self.max_tool_calls):
+            return "tool calls"
+        if sum(self.tool_calls.values()) >= self.request_max_tool_calls:
+            return "request tool calls"
+        return None
+
+    def before_llm(self, role):
+        """The limit that forces ``role`` to answer now, or None to let the call through."""
+        with self._lock:
+            self.active_role = role
+            limit = self._over(role)
+        if limit is not None:
+            metrics.inc("budget_exceeded_total", limit=limit, role=role)
+            crew_log.warning("%s is over its %s budget; forcing a final answer", role, limit)
+        return limit
+
+    def record_llm(self, role, tokens):
+        with self._lock:
+            self.iterations[role] += 1
+            self.tokens += tokens
+
+    def call_tool(self, tool, arguments, func):
+        """Run a tool call within budget, answering repeats from the per-run memo."""
+        key = (tool, json.dumps(arguments, sort_keys=True, default=str))
+        with self._lock:
+            role = self.active_role or "agent"
+            if key in self._memo:
+                metrics.inc("budget_tool_memo_hits_total", tool=tool)
+                crew_log.info("Repeated %s call answered from the run memo", tool)
+                return self._memo[key] + REPEATED_CALL_NOTE
+            limit = self._over(role)
+            if limit in ("tool calls", "request tool calls", "time"):
+                metrics.inc("budget_exceeded_total", limit=limit, role=role)
+                crew_log.warning("Refused a %s call: %s is over its %s budget", tool, role, limit)
+                return REFUSED_CALL
+            self.tool_calls[role] += 1
+        result = func()
+        with self._lock:
+            self._memo[key] = str(result)
+        return result
+
+    def summary(self):
+        return {
+            "seconds": round(time.monotonic() - self.started_at, 1),
+            "tokens": self.tokens,
+            "iterations": dict(self.iterations),
+            "tool_calls": dict(self.tool_calls),
+            "forced": sorted(self.forced),
+        }
+
+
+def current_budget():
+    return _current_budget.get()
+
+
+@contextmanager
+def budget_scope(budget=None):
+    """Run the block under one RunBudget; nested scopes share the outer one."""
+    if _current_budget.get() is not None:
+        yield _current_budget.get()
+        return
+    budget = budget or RunBudget()
+    token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+        crew_log.info("Run budget used: %s", budget.summary())
+
+
+def budgeted_call(tool, arguments, func):
+    """Call ``func()`` for an agent's ``tool`` call, through the run's budget and memo when there is one."""
+    budget = _current_budget.get()
+    if budget is None:
+        return func()
+    return budget.call_tool(tool, arguments, func)
+
+
+def budgeted_tool(tool, func):
+    """Wrap a one-argument tool function (LangChain ``Tool(func=...)``) with ``budgeted_call``."""
+
+    def run(argument):
+        return budgeted_call(tool, argument, lambda: func(argument))
+
+    run.__name__ = getattr(func, "__name__", tool)
+    run.__doc__ = func.__doc__
+    return run
+
+
+def _prompt_text(prompt):
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return "\n".join(str(getattr(message, "content", message)) for message in prompt)
+    return str(prompt)
+
+
+def forced_prompt(prompt, limit):
+    """The agent's prompt with the instruction to answer now."""
+    return _prompt_text(prompt) + FORCE_INSTRUCTION.format(limit=limit)
+
+
+def fallback_answer(prompt):
+    """A final answer from the agent's last tool observation, for when the model can't be called again."""
+    text = _prompt_text(prompt)
+    marker = text.rfind("Observation:")
+    observation = text[marker + len("Observation:"):].strip() if marker >= 0 else ""
+    observation = observation.split("\nThought:")[0].strip()
+    if not observation:
+        observation = "I could not complete this step within the request's budget; please try again."
+    return f"Thought: I now know the final answer\nFinal Answer: {observation}"
@@ -0,0 +1,144 @@
+"""
+Task-level checkpoints so a crew can resume from the first task whose inputs changed.
+
+Each task output is stored under a key derived from the inputs that task
+actually depends on plus the outputs of the upstream tasks it reads from. When a
+user only tweaks a downstream setting (ambiance, dietary needs, the weather
+toggle), the upstream keys are unchanged, their outputs are loaded from disk and
+only the remaining tasks run.
+
+With the cluster cache tier configured (CLUSTER_CACHE_NODES, see
+cluster_cache.py), checkpoints are also shared between hosts.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from cluster_cache import cluster_cache
+
+DEFAULT_CHECKPOINT_DIR = Path.home() / ".cache" / "crewai-restaurant" / "checkpoints"
+DEFAULT_TTL_SECONDS = 3600
+# Expired checkpoint files are deleted at most this often (from ``put``)
+DEFAULT_PRUNE_INTERVAL_SECONDS = 600
+
+
+def checkpoint_key(task_name, inputs=None, upstream_outputs=()):
+    """
+    Key for ``task_name`` given its own inputs and the outputs of the upstream
+    tasks it reads. Keying on upstream content (not upstream keys) means a
+    re-run upstream task that produced different text invalidates everything
+    downstream of it.
+    """
+    upstream = [hashlib.sha256(output.encode("utf-8")).hexdigest() for output in upstream_outputs]
+    payload = json.dumps(
+        {"task": task_name, "inputs": inputs or {}, "upstream": upstream},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def task_output_text(task):
+    """The raw text a finished CrewAI task produced, across CrewAI versions."""
+    output = getattr(task, "output", None)
+    if output is None:
+        return None
+    for attribute in ("raw", "raw_output", "exported_output"):
+        value = getattr(output, attribute, None)
+        if isinstance(value, str):
+            return value
+    return str(output)
+
+
+class CheckpointStore:
+    """
+    Stores task outputs as small JSON files, one per key, with a time-to-live.
+    Every ``prune_interval`` seconds a ``put`` also starts a background prune
+    of the expired files.
+    """
+
+    def __init__(self, directory=DEFAULT_CHECKPOINT_DIR, ttl_seconds=DEFAULT_TTL_SECONDS, cluster=None,
+                 prune_interval=DEFAULT_PRUNE_INTERVAL_SECONDS):
+        self.directory = Path(directory)
+        self.ttl_seconds = ttl_seconds
+        self.cluster = cluster
+        self.prune_interval = prune_interval
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def _path(self, key):
+        return self.directory / f"{key}.json"
+
+    def get(self, key, ttl_seconds=None):
+        """Return the stored output for ``key``, or None if missing or expired."""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        try:
+            record = json.loads(self._path(key).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            record = self._cluster_get(key)
+        if record is None or time.time() - record["saved_at"] > ttl:
+            return None
+        return record["output"]
+
+    def _cluster_get(self, key):
+        """A checkpoint saved by another host, or None."""
+        value = self.cluster.get(f"checkpoint:{key}") if self.cluster is not None else None
+        try:
+            return json.loads(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def put(self, key, task_name, output):
+        if output is None:
+            return
+        record = json.dumps({"task": task_name, "saved_at": time.time(), "output": output}, ensure_ascii=False)
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with self._lock:
+            tmp_path.write_text(record, encoding="utf-8")
+            tmp_path.replace(path)
+        if self.cluster is not None:
+            self.cluster.set(f"checkpoint:{key}", record, ttl=self.ttl_seconds)
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._pruned_at < self.prune_interval:
+                return
+            self._pruned_at = now
+        threading.Thread(target=self.prune, name="checkpoint-prune", daemon=True).start()
+
+    def prune(self):
+        """Delete expired checkpoints; returns how many were removed."""
+        removed = 0
+        cutoff = time.time() - self.ttl_seconds
+        for path in self.directory.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError:
+                continue
+        return removed
+
+
+def checkpoint_store_from_env():
+    """
+    Build the store from CHECKPOINTS (set to 0 to disable), CHECKPOINT_DIR,
+    CHECKPOINT_TTL_SECONDS and CHECKPOINT_PRUNE_INTERVAL_SECONDS. Returns None
+    when checkpointing is disabled.
+    """
+    if os.environ.get("CHECKPOINTS", "1") == "0":
+        return None
+    return CheckpointStore(
+        directory=os.environ.get("CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR),
+        ttl_seconds=float(os.environ.get("CHECKPOINT_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        prune_interval=float(os.environ.get("CHECKPOINT_PRUNE_INTERVAL_SECONDS", DEFAULT_PRUNE_INTERVAL_SECONDS)),
+        cluster=cluster_cache(),
+    )
@@ -0,0 +1,190 @@
+"""
+Circuit breakers with last-known-good fallbacks for the external tools.
+
+A CircuitBreaker counts consecutive failures of one dependency. After
+``failure_threshold`` failures it opens and callers fail fast for
+``reset_timeout`` seconds; then it goes half-open and lets a single probe
+through. A successful probe closes the circuit, a failed one re-opens it.
+
+``call_with_fallback`` runs a tool call behind a breaker and remembers its
+last good result per key. When the circuit is open (or the call fails) the
+tool returns that result with a staleness note, or a short "unavailable"
+marker, instead of making the agent wait on a timeout.
+
+Breaker states and transitions are exported through ``metrics``; transitions
+are also logged to the "crew" log.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from crew_logging import crew_log
+from metrics import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Gauge values for circuit_breaker_state
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised by ``CircuitBreaker.call`` when the circuit does not admit the call."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        metrics.set("circuit_breaker_state", STATE_VALUES[CLOSED], dependency=name)
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _transition(self, state):
+        metrics.inc("circuit_breaker_transitions_total", dependency=self.name, from_state=self._state, to_state=state)
+        metrics.set("circuit_breaker_state", STATE_VALUES[state], dependency=self.name)
+        crew_log.info("Circuit breaker '%s': %s -> %s", self.name, self._state, state)
+        self._state = state
+
+    def _maybe_half_open(self, now):
+        if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+            self._probe_in_flight = False
+
+    def allow(self):
+        """Whether a call may go ahead; in half-open state only one probe is admitted."""
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            metrics.inc("circuit_breaker_rejected_total", dependency=self.name)
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            metrics.inc("circuit_breaker_failures_total", dependency=self.name)
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition(OPEN)
+
+    def call(self, func, *args, failure_types=(Exception,), **kwargs):
+        """Run ``func`` behind the breaker; raises CircuitOpenError when the call is not admitted."""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        try:
+            result = func(*args, **kwargs)
+        except failure_types:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Not a dependency failure (e.g. a bug or bad input); release a half-open probe slot
+            with self._lock:
+                self._probe_in_flight = False
+            raise
+        self.record_success()
+        return result
+
+
+class LastGoodCache:
+    """Small LRU of the most recent successful result per key, with the time it was fetched."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """(value, fetched_at wall-clock time) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _age(seconds):
+    if seconds < 90:
+        return f"{seconds:.0f} seconds"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f} minutes"
+    return f"{seconds / 3600:.1f} hours"
+
+
+def call_with_fallback(breaker, cache, key, func, failure_types=(Exception,), unavailable=None):
+    """
+    Call ``func()`` behind ``breaker`` and cache its result under ``key``.
+
+    If the circuit is open or the call fails with one of ``failure_types``,
+    return the last good result for ``key`` with a staleness note, or the
+    ``unavailable`` marker when there is none.
+    """
+    try:
+        result = breaker.call(func, failure_types=failure_types)
+    except (CircuitOpenError, *failure_types) as exc:
+        reason = "circuit open" if isinstance(exc, CircuitOpenError) else f"error: {exc}"
+        cached = cache.get(key)
+        if cached is None:
+            metrics.inc("circuit_breaker_fallbacks_total", dependency=breaker.name, result="unavailable")
+            return unavailable or f"[{breaker.name} unavailable ({reason}); continue without this data]"
+        value, fetched_at = cached
+        metrics.inc("circuit_breaker_fallbacks_total", dependency=breaker.name, result="stale")
+        return (
+            f"[{breaker.name} unavailable ({reason}); showing cached data from "
+            f"{_age(time.time() - fetched_at)} ago]\n{value}"
+        )
+    cache.put(key, result)
+    return result
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name):
+    """
+    The shared breaker for a dependency. Defaults can be overridden with
+    CIRCUIT_<NAME>_FAILURES and CIRCUIT_<NAME>_RESET_SECONDS (name upper-cased
+    with dashes as underscores, e.g. CIRCUIT_OPEN_METEO_FAILURES).
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            prefix = "CIRCUIT_" + name.upper().replace("-", "_")
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_threshold=int(os.environ.get(f"{prefix}_FAILURES", "3")),
+                reset_timeout=float(os.environ.get(f"{prefix}_RESET_SECONDS", "30")),
+            )
+        return _breakers[name]
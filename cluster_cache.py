@@ -0,0 +1,351 @@
+"""
+Cluster-shared cache tier for both crews.
+
+The completion cache and the checkpoints live on each host, so behind a load
+balancer every instance recomputes what another one already has, and the hit
+rate drops as instances are added. With CLUSTER_CACHE_NODES set, they also
+read and write through ``ClusterCache``:
+
+  - keys are sharded over the cache nodes with consistent hashing
+    (``HashRing``, CLUSTER_CACHE_REPLICAS virtual nodes per node), so each
+    entry lives on exactly one node: adding a node adds its memory to the
+    cluster's capacity and moves only about 1/N of the keys,
+  - a small in-process LRU sits in front (two-level lookup); its entries
+    expire after CLUSTER_CACHE_LOCAL_TTL seconds so remote updates show up,
+  - a node that fails or times out (CLUSTER_CACHE_TIMEOUT) is skipped behind
+    its own circuit breaker; its keys are misses until it recovers.
+
+``CacheServer`` is the node: a size-bounded LRU with per-entry TTLs behind a
+small HTTP API (GET/PUT/DELETE /v1/<key>, GET /stats). Run a few on one
+machine to try the whole tier:
+
+    python cluster_cache.py serve --port 7701 &
+    python cluster_cache.py serve --port 7702 &
+    CLUSTER_CACHE_NODES=localhost:7701,localhost:7702 streamlit run app.py
+
+``python cluster_cache.py rebalance --nodes 4`` shows how evenly keys spread
+and how many move when a node is added.
+
+Settings: CLUSTER_CACHE_NODES (host:port list; unset disables the tier),
+CLUSTER_CACHE_LOCAL_ENTRIES (1024), CLUSTER_CACHE_LOCAL_TTL (60 seconds),
+CLUSTER_CACHE_TIMEOUT (0.25 seconds), CLUSTER_CACHE_REPLICAS (160) and, for
+servers, CLUSTER_CACHE_MAX_MB (256).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect, insort
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote
+
+import requests
+
+from circuit_breaker import CircuitOpenError, breaker
+from metrics import metrics
+
+REPLICAS = int(os.environ.get("CLUSTER_CACHE_REPLICAS", "160"))
+LOCAL_ENTRIES = int(os.environ.get("CLUSTER_CACHE_LOCAL_ENTRIES", "1024"))
+LOCAL_TTL = float(os.environ.get("CLUSTER_CACHE_LOCAL_TTL", "60"))
+TIMEOUT = float(os.environ.get("CLUSTER_CACHE_TIMEOUT", "0.25"))
+SERVER_MAX_BYTES = int(float(os.environ.get("CLUSTER_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, with ``replicas`` virtual points per node."""
+
+    def __init__(self, nodes=(), replicas=REPLICAS):
+        self.replicas = replicas
+        self._points = []  # sorted hashes
+        self._owners = {}  # hash -> node
+        self._lock = threading.Lock()
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self):
+        return sorted(set(self._owners.values()))
+
+    def add(self, node):
+        with self._lock:
+            for replica in range(self.replicas):
+                point = _hash(f"{node}#{replica}")
+                if point not in self._owners:
+                    insort(self._points, point)
+                    self._owners[point] = node
+
+    def remove(self, node):
+        with self._lock:
+            self._points = [point for point in self._points if self._owners[point] != node]
+            self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+
+    def node_for(self, key):
+        """The node that owns ``key`` (None on an empty ring)."""
+        with self._lock:
+            if not self._points:
+                return None
+            i = bisect(self._points, _hash(key)) % len(self._points)
+            return self._owners[self._points[i]]
+
+
+class LRUStore:
+    """Thread-safe LRU map bounded by entry count and/or total size, with optional per-entry TTLs."""
+
+    def __init__(self, max_entries=None, max_bytes=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self.entry(key)
+        return None if entry is None else entry[0]
+
+    def entry(self, key):
+        """``(value, expires_at)`` for a live entry (expires_at on ``clock``, None without a TTL), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and self.clock() >= entry[1]:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl=None):
+        size = len(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, None if ttl is None else self.clock() + ttl)
+            self.bytes += size
+            while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= len(entry[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ClusterCache:
+    """
+    Client for a set of cache nodes: an in-process LRU in front of the
+    consistent-hashed cluster. Values are strings.
+    """
+
+    def __init__(self, nodes, local_entries=LOCAL_ENTRIES, local_ttl=LOCAL_TTL, timeout=TIMEOUT,
+                 replicas=REPLICAS):
+        self.ring = HashRing(nodes, replicas=replicas)
+        self.local = LRUStore(max_entries=local_entries)
+        self.local_ttl = local_ttl
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _url(self, node, key):
+        return f"http://{node}/v1/{quote(key, safe='')}"
+
+    def _remote(self, key, method, **kwargs):
+        """One request to the key's node; None when the node is down or answers with an error."""
+        node = self.ring.node_for(key)
+        if node is None:
+            return None
+        try:
+            return breaker(f"cache-{node}").call(
+                self._session.request, method, self._url(node, key), timeout=self.timeout,
+                failure_types=(requests.RequestException,), **kwargs,
+            )
+        except (CircuitOpenError, requests.RequestException):
+            metrics.inc("cluster_cache_errors_total", node=node)
+            return None
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            metrics.inc("cluster_cache_lookups_total", tier="local", result="hit")
+            return value
+        response = self._remote(key, "GET")
+        if response is None or response.status_code != 200:
+            metrics.inc("cluster_cache_lookups_total", tier="remote", result="miss")
+            return None
+        metrics.inc("cluster_cache_lookups_total", tier="remote", result="hit")
+        value = response.content.decode("utf-8")
+        ttl = response.headers.get("X-TTL")
+        self.local.set(key, value, min(self.local_ttl, float(ttl)) if ttl else self.local_ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` locally and on the key's node (``ttl`` in seconds, None to keep until evicted)."""
+        self.local.set(key, value, self.local_ttl if ttl is None else min(self.local_ttl, ttl))
+        headers = {} if ttl is None else {"X-TTL": str(ttl)}
+        self._remote(key, "PUT", data=value.encode("utf-8"), headers=headers)
+
+    def delete(self, key):
+        self.local.delete(key)
+        self._remote(key, "DELETE")
+
+    def stats(self):
+        """Per-node server stats (None for nodes that don't answer)."""
+        stats = {"local_entries": len(self.local), "nodes": {}}
+        for node in self.ring.nodes:
+            try:
+                stats["nodes"][node] = self._session.get(f"http://{node}/stats", timeout=self.timeout).json()
+            except (requests.RequestException, ValueError):
+                stats["nodes"][node] = None
+        return stats
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def cluster_cache():
+    """The process-wide client for CLUSTER_CACHE_NODES, or None when the tier is not configured."""
+    global _default
+    nodes = [node.strip() for node in os.environ.get("CLUSTER_CACHE_NODES", "").split(",") if node.strip()]
+    if not nodes:
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = ClusterCache(nodes)
+        return _default
+
+
+# ============================================================================
+# CACHE SERVER
+# ============================================================================
+
+class CacheServer(ThreadingHTTPServer):
+    """One cache node: an LRUStore of bytes behind GET/PUT/DELETE /v1/<key> and GET /stats."""
+
+    daemon_threads = True
+
+    def __init__(self, address, max_bytes=SERVER_MAX_BYTES):
+        self.store = LRUStore(max_bytes=max_bytes, clock=time.time)
+        self.counts = Counter()
+        super().__init__(address, _CacheHandler)
+
+    def stats(self):
+        return {"entries": len(self.store), "bytes": self.store.bytes, "max_bytes": self.store.max_bytes,
+                **self.counts}
+
+
+class _CacheHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so clients reuse connections
+
+    def _key(self):
+        return unquote(self.path[len("/v1/"):]) if self.path.startswith("/v1/") else None
+
+    def _reply(self, code, body=b"", headers=None):
+        self.send_response(code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, json.dumps(self.server.stats()).encode(), {"Content-Type": "application/json"})
+            return
+        key = self._key()
+        entry = self.server.store.entry(key) if key else None
+        self.server.counts["hits" if entry else "misses"] += 1
+        if entry is None:
+            self._reply(404)
+            return
+        value, expires_at = entry
+        headers = {} if expires_at is None else {"X-TTL": f"{max(0.0, expires_at - time.time()):.0f}"}
+        self._reply(200, value, headers)
+
+    def do_PUT(self):
+        key = self._key()
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not key:
+            self._reply(404)
+            return
+        ttl = self.headers.get("X-TTL")
+        self.server.store.set(key, body, float(ttl) if ttl else None)
+        self.server.counts["sets"] += 1
+        self._reply(204)
+
+    def do_DELETE(self):
+        key = self._key()
+        if key:
+            self.server.store.delete(key)
+        self._reply(204)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_cache(port, host="127.0.0.1", max_bytes=SERVER_MAX_BYTES):
+    """Start a cache node on ``host:port`` in a daemon thread; returns the server."""
+    server = CacheServer((host, port), max_bytes=max_bytes)
+    threading.Thread(target=server.serve_forever, name=f"cache-server-{port}", daemon=True).start()
+    return server
+
+
+def rebalance_report(node_count, keys=100_000, replicas=REPLICAS):
+    """Key spread over ``node_count`` nodes and the share of keys that move when one more is added."""
+    nodes = [f"node{i}:7701" for i in range(node_count)]
+    before, after = HashRing(nodes, replicas), HashRing(nodes + [f"node{node_count}:7701"], replicas)
+    owners = [(before.node_for(f"key{i}"), after.node_for(f"key{i}")) for i in range(keys)]
+    spread = Counter(old for old, _ in owners)
+    return {
+        "keys_per_node": dict(sorted(spread.items())),
+        "max_over_mean": round(max(spread.values()) / (keys / node_count), 3),
+        "moved_on_add": round(sum(old != new for old, new in owners) / keys, 3),
+        "ideal_moved_on_add": round(1 / (node_count + 1), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run a cache node")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=7701)
+    serve.add_argument("--max-mb", type=float, default=SERVER_MAX_BYTES / 1024 / 1024)
+    rebalance = commands.add_parser("rebalance", help="show key spread and movement for a ring size")
+    rebalance.add_argument("--nodes", type=int, default=3)
+    rebalance.add_argument("--keys", type=int, default=100_000)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = CacheServer((args.host, args.port), max_bytes=int(args.max_mb * 1024 * 1024))
+        print(f"Cache node on {args.host}:{args.port} ({args.max_mb:.0f} MB)")
+        server.serve_forever()
+    else:
+        print(json.dumps(rebalance_report(args.nodes, args.keys), indent=2))
+
+
+if __name__ == "__main__":
+    main()
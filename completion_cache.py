@@ -0,0 +1,170 @@
+"""
+Persistent LLM completion cache shared by both crews.
+
+Plugs into LangChain's global LLM cache, so every ``ChatOpenAI`` / ``Ollama``
+client used by an Agent checks it before calling the model. Entries are keyed
+on the model and its parameters (LangChain's ``llm_string``) plus a hash of the
+canonicalised prompt, stored in SQLite and evicted least-recently-used once the
+cache grows past its size budget.
+
+An agent opts out by using an LLM client created with ``cache=False`` (see the
+recommendation generators in crew.py and crew_ollama.py).
+
+With the cluster cache tier configured (CLUSTER_CACHE_NODES, see
+cluster_cache.py), local misses are looked up in the cluster and new entries
+are written to both, so completions are shared between hosts.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+try:
+    from langchain_core.caches import BaseCache
+    from langchain_core.load import dumps, loads
+except ImportError:  # older LangChain releases
+    from langchain.schema.cache import BaseCache
+    from langchain.load import dumps, loads
+
+from cluster_cache import cluster_cache
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "crewai-restaurant" / "completions.sqlite"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def canonical_prompt(prompt: str) -> str:
+    """Normalise insignificant whitespace so equivalent prompts share an entry."""
+    return "\n".join(line.rstrip() for line in prompt.strip().replace("\r\n", "\n").split("\n"))
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(llm_string.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical_prompt(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class PersistentCompletionCache(BaseCache):
+    """SQLite-backed LangChain cache with least-recently-used size-bounded eviction."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES, cluster=None):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.cluster = cluster
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used)")
+
+    def lookup(self, prompt, llm_string):
+        key = cache_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+        value = row[0] if row is not None else self._cluster_lookup(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        try:
+            return loads(value)
+        except Exception:
+            # Written by an incompatible LangChain version; treat as a miss.
+            return None
+
+    def update(self, prompt, llm_string, return_val):
+        value = dumps(list(return_val))
+        key = cache_key(prompt, llm_string)
+        if self.cluster is not None:
+            self.cluster.set(f"completion:{key}", value)
+        self._store(key, value)
+
+    def _cluster_lookup(self, key):
+        """A completion another host cached, copied into the local cache; None on a miss."""
+        if self.cluster is None:
+            return None
+        value = self.cluster.get(f"completion:{key}")
+        if value is not None:
+            self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Trim to 90% of the budget so eviction doesn't run on every insert.
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM completions ORDER BY last_used"):
+            stale.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._conn.executemany("DELETE FROM completions WHERE key = ?", stale)
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+def install_completion_cache():
+    """
+    Install the persistent cache as LangChain's global LLM cache.
+
+    Controlled by COMPLETION_CACHE (set to 0 to disable), COMPLETION_CACHE_PATH
+    and COMPLETION_CACHE_MAX_MB. Returns the cache, or None when disabled.
+    """
+    if os.environ.get("COMPLETION_CACHE", "1") == "0":
+        return None
+
+    try:
+        from langchain_core.globals import set_llm_cache
+    except ImportError:
+        from langchain.globals import set_llm_cache
+
+    cache = PersistentCompletionCache(
+        path=os.environ.get("COMPLETION_CACHE_PATH", DEFAULT_CACHE_PATH),
+        max_bytes=int(float(os.environ.get("COMPLETION_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+        cluster=cluster_cache(),
+    )
+    set_llm_cache(cache)
+    return cache
@@ -1,4 +1,7 @@
+from datetime import datetime, time, timedelta
+from functools import lru_cache
 from typing import List
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 import requests
 from crewai import Agent, Task, Crew, Process
@@ -8,89 +11,277 @@ from crewai.tools import tool
 # Import the real tool
 from crewai_tools import SerperDevTool
 
+from budgets import budget_scope, budgeted_call
+from circuit_breaker import LastGoodCache, breaker, call_with_fallback
+from checkpoints import checkpoint_key, checkpoint_store_from_env, task_output_text
+from completion_cache import install_completion_cache
+from crew_logging import CREW_VERBOSE, crew_log, step_callback, task_callback
+from crewai_llm import RoutedLLM
+from degradation import controller as degradation, with_tier_note
+from gazetteer import gazetteer
+from materialized import MaterializedRecommendations, canonical_preference, query_key
+from memory import agents_in_use, monitor as memory_monitor, track_request, watch
+from model_routing import RoutedModel, tier_clients, tier_models
+from profiling import profile_request
+from query_planner import fan_out, merge_prompt, merged_fallback, plan_query
+from rate_limit import limiter, parse_retry_after, rate_limited_http_client, rate_limited_session
+from request_context import request_scope
+from scheduler import scheduler
+from warmup import WARMUP_TOP_CITIES, WarmupStep, traffic
+
+# Repeated agent prompts (e.g. the research step for the same preference) are
+# answered from a persistent completion cache instead of calling the model.
+completion_cache = install_completion_cache()
+
+# OpenAI, Serper and Open-Meteo calls share per-dependency rate limiters
+# (token bucket + adaptive concurrency); see rate_limit.py.
+openai_http_client = rate_limited_http_client("openai")
+http = rate_limited_session()
+
+# Agents are routed to a model tier by role (see model_routing.py): the
+# researcher and weather advisor mostly reformat tool output, so they run on the
+# small model; only the generator's user-facing copy needs the large one.
+OPENAI_MODELS = tier_models("OPENAI_MODEL", {"small": "gpt-4.1-nano", "medium": "gpt-4.1-mini", "large": "gpt-4.1"})
+ROLE_TIERS = {"researcher": "small", "weather": "small", "analyzer": "medium", "generator": "large"}
+
+models = tier_clients(OPENAI_MODELS, lambda name: ChatOpenAI(model=name, http_client=openai_http_client))
+
+# The generator writes the user-facing copy, so it always gets a fresh completion.
+creative_models = tier_clients(
+    OPENAI_MODELS, lambda name: ChatOpenAI(model=name, cache=False, http_client=openai_http_client)
+)
+
+
+# Open-Meteo and Serper sit behind circuit breakers: during an outage the tools
+# answer immediately with the last good result (or an "unavailable" marker)
+# instead of each call waiting out its timeouts; see circuit_breaker.py.
+last_good_results = LastGoodCache()
+
+
+class RateLimitedSerperDevTool(SerperDevTool):
+    """
+    SerperDevTool whose searches go through the shared Serper rate limiter and circuit breaker.
+    Agents' searches also count against the run's tool budget (see budgets.py).
+    """
+
+    def _run(self, *args, **kwargs):
+        return budgeted_call("Restaurant Search", kwargs or list(args), lambda: self._search(*args, **kwargs))
+
+    def _search(self, *args, **kwargs):
+        key = ("serper", repr(args), repr(sorted(kwargs.items())))
+        return call_with_fallback(
+            breaker("serper"),
+            last_good_results,
+            key,
+            lambda: self._limited_run(*args, **kwargs),
+            failure_types=(requests.RequestException,),
+            unavailable="[Restaurant search unavailable; rely on well-known restaurants you are confident about]",
+        )
+
+    def _limited_run(self, *args, **kwargs):
+        with limiter("serper").acquire() as call:
+            try:
+                result = super()._run(*args, **kwargs)
+            except requests.HTTPError as exc:
+                response = exc.response
+                if response is not None:
+                    call.record(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+                raise
+            call.record(200)
+        return result
+
+
 # Initialize the real tool
-restaurant_search_tool = SerperDevTool()
+restaurant_search_tool = RateLimitedSerperDevTool()
+
+
+# Hours of forecast requested around the dining time (before, after)
+DINING_WINDOW_HOURS = (1, 2)
+# Open-Meteo forecasts reach 16 days ahead
+FORECAST_HORIZON_DAYS = 16
 
 
 @tool("Dining Weather Lookup")
-def fetch_weather_report(location: str) -> str:
-    """Look up the current weather for the provided dining location and return a concise summary."""
+def fetch_weather_report(location: str, dining_time: str = "", timezone: str = "") -> str:
+    """
+    Look up the weather for the provided dining location and return a concise summary.
+    Pass dining_time as 'YYYY-MM-DD HH:MM' (or 'HH:MM' for today) to get the forecast for a reservation;
+    it is read in the location's local time unless an IANA timezone such as 'America/Chicago' is given.
+    """
+
+    return budgeted_call(
+        "Dining Weather Lookup",
+        {"location": location, "dining_time": dining_time, "timezone": timezone},
+        lambda: weather_report(location, dining_time, timezone),
+    )
+
+
+def weather_report(location: str, dining_time: str = "", timezone: str = "") -> str:
+    """The Dining Weather Lookup tool as a plain function (also used to prime caches at warm-up)."""
 
     cleaned_location = location.strip()
     if not cleaned_location:
         return "No location provided for the weather lookup."
 
-    try:
-        geocode_response = requests.get(
-            "https://geocoding-api.open-meteo.com/v1/search",
-            params={"name": cleaned_location, "count": 1, "language": "en", "format": "json"},
-            timeout=10,
-        )
-        geocode_response.raise_for_status()
-        geocode_data = geocode_response.json()
-        results = geocode_data.get("results") or []
-        if not results:
-            return f"No coordinates found for '{cleaned_location}'. Try a larger city or include the state/country."
-
-        location_match = results[0]
-        latitude = location_match.get("latitude")
-        longitude = location_match.get("longitude")
-        resolved_name = location_match.get("name")
-        country = location_match.get("country")
-
-        if latitude is None or longitude is None:
-            return f"Could not determine coordinates for '{cleaned_location}'."
-
-        weather_response = requests.get(
-            "https://api.open-meteo.com/v1/forecast",
-            params={
-                "latitude": latitude,
-                "longitude": longitude,
-                "current_weather": True,
-                "hourly": "precipitation_probability,weathercode",
-            },
-            timeout=10,
-        )
-        weather_response.raise_for_status()
-        weather_data = weather_response.json()
+    # Geocoding runs behind the breaker too, so an outage fails fast instead of waiting out its timeout
+    return call_with_fallback(
+        breaker("open-meteo"),
+        last_good_results,
+        ("open-meteo", cleaned_location.lower(), dining_time.strip() or "now", timezone.strip()),
+        lambda: _weather_lookup(cleaned_location, dining_time, timezone),
+        failure_types=(requests.RequestException,),
+        unavailable="Weather service unavailable right now; give general guidance without current conditions.",
+    )
+
+
+def _weather_lookup(cleaned_location: str, dining_time: str, timezone: str) -> str:
+    """Geocode the location, check the dining time and summarise the weather; raises requests.RequestException."""
 
+    geocoded = _geocode(cleaned_location.lower())
+    if geocoded is None:
+        return f"No coordinates found for '{cleaned_location}'. Try a larger city or include the state/country."
+    try:
+        dining_at = _parse_dining_time(dining_time, timezone, geocoded[4])
+    except ValueError as exc:
+        return str(exc)
+    if dining_at is not None:
+        days_ahead = (dining_at - datetime.now(dining_at.tzinfo)).total_seconds() / 86400
+        if days_ahead > FORECAST_HORIZON_DAYS:
+            return f"Forecasts only reach {FORECAST_HORIZON_DAYS} days ahead; check the weather closer to {dining_at:%a %d %b}."
+        if days_ahead < -1 / 24:
+            return f"The dining time {dining_at:%a %d %b %H:%M} is in the past; provide an upcoming time."
+    return _weather_summary(cleaned_location, geocoded, dining_at)
+
+
+@lru_cache(maxsize=256)
+def _geocode(name: str):
+    """
+    (name, country, latitude, longitude, timezone) for a place name, or None if it is unknown.
+    Names of places in the offline gazetteer are resolved locally; anything else ("Paris, Texas",
+    a street address) goes to the geocoding API.
+    """
+
+    place = gazetteer().exact(name)
+    if place is not None:
+        return place.name, place.country, place.latitude, place.longitude, place.timezone
+
+    geocode_response = http.get(
+        "https://geocoding-api.open-meteo.com/v1/search",
+        params={"name": name, "count": 1, "language": "en", "format": "json"},
+        timeout=10,
+    )
+    geocode_response.raise_for_status()
+    results = geocode_response.json().get("results") or []
+    if not results:
+        return None
+    match = results[0]
+    if match.get("latitude") is None or match.get("longitude") is None:
+        return None
+    return match.get("name"), match.get("country"), match["latitude"], match["longitude"], match.get("timezone") or "UTC"
+
+
+def _parse_dining_time(dining_time: str, timezone: str, location_tz: str):
+    """The dining time as an aware datetime in the location's timezone, or None when none was given."""
+
+    text = dining_time.strip()
+    if not text:
+        return None
+    try:
+        local_zone = ZoneInfo(location_tz)
+        zone = ZoneInfo(timezone.strip()) if timezone.strip() else local_zone
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{timezone}'. Use an IANA name such as 'America/New_York'.")
+    try:
+        if "-" in text:
+            dining_at = datetime.fromisoformat(text)
+        else:
+            # Time of day only: the next occurrence, allowing for "now-ish" bookings
+            at = time.fromisoformat(text)
+            now = datetime.now(zone)
+            dining_at = now.replace(hour=at.hour, minute=at.minute, second=0, microsecond=0, tzinfo=None)
+            if dining_at < now.replace(tzinfo=None) - timedelta(hours=1):
+                dining_at += timedelta(days=1)
+    except ValueError:
+        raise ValueError(f"Could not read dining time '{dining_time}'. Use 'YYYY-MM-DD HH:MM' or 'HH:MM'.")
+    if dining_at.tzinfo is None:
+        dining_at = dining_at.replace(tzinfo=zone)
+    return dining_at.astimezone(local_zone)
+
+
+def _weather_summary(cleaned_location: str, geocoded, dining_at=None) -> str:
+    """
+    Summarise the weather for a geocoded location, at ``dining_at`` (an aware datetime in the
+    location's timezone) or right now. Only the hours around that time are requested.
+    Raises requests.RequestException on service errors.
+    """
+
+    resolved_name, country, latitude, longitude, location_tz = geocoded
+    location_header = f"{resolved_name}, {country}" if country else resolved_name or cleaned_location
+
+    slot = (dining_at or datetime.now(ZoneInfo(location_tz))).replace(minute=0, second=0, microsecond=0)
+    before, after = DINING_WINDOW_HOURS
+    params = {
+        "latitude": latitude,
+        "longitude": longitude,
+        "timezone": location_tz,
+        "hourly": "temperature_2m,precipitation_probability,weathercode,windspeed_10m",
+        # Local times, so the hourly timestamps line up with the slot keys below
+        "start_hour": (slot - timedelta(hours=before if dining_at else 0)).strftime("%Y-%m-%dT%H:%M"),
+        "end_hour": (slot + timedelta(hours=after if dining_at else 5)).strftime("%Y-%m-%dT%H:%M"),
+    }
+    if dining_at is None:
+        params["current_weather"] = True
+
+    weather_response = http.get("https://api.open-meteo.com/v1/forecast", params=params, timeout=10)
+    weather_response.raise_for_status()
+    weather_data = weather_response.json()
+
+    hourly = weather_data.get("hourly") or {}
+    index = {timestamp: i for i, timestamp in enumerate(hourly.get("time") or [])}
+
+    def at(field: str, timestamp: str):
+        values = hourly.get(field) or []
+        i = index.get(timestamp)
+        return values[i] if i is not None and i < len(values) else None
+
+    slot_key = slot.strftime("%Y-%m-%dT%H:%M")
+    window: List[float] = [p for p in (hourly.get("precipitation_probability") or []) if p is not None]
+
+    if dining_at is None:
         current_weather = weather_data.get("current_weather") or {}
         temperature = current_weather.get("temperature")
         windspeed = current_weather.get("windspeed")
         weather_code = current_weather.get("weathercode")
-        weather_time = current_weather.get("time")
-
-        if temperature is None:
-            return "Weather data is temporarily unavailable. Please try again later."
-
-        weather_description = _WEATHER_CODES.get(weather_code, "current conditions")
-        location_header = f"{resolved_name}, {country}" if country else resolved_name or cleaned_location
-
-        hourly = weather_data.get("hourly") or {}
-        precipitation_probabilities: List[float] = hourly.get("precipitation_probability") or []
-        precipitation_summary = None
-        if precipitation_probabilities:
-            next_hours_prob = precipitation_probabilities[:6]
-            avg_precip = sum(next_hours_prob) / len(next_hours_prob)
-            precipitation_summary = f"Average precipitation chance next few hours: {avg_precip:.0f}%"
-
-        summary_lines = [
-            f"Weather for {location_header} at {weather_time}:",
-            f"- Temperature: {temperature}°C",
-            f"- Windspeed: {windspeed} km/h",
-            f"- Conditions: {weather_description}",
-        ]
-        if precipitation_summary:
-            summary_lines.append(f"- {precipitation_summary}")
-
-        summary_lines.append(
-            "Consider whether outdoor seating is comfortable and mention any contingency plans in your recommendation."
-        )
-
-        return "\n".join(summary_lines)
+        heading = f"Weather for {location_header} at {current_weather.get('time')}:"
+        precipitation_label = "Average precipitation chance next few hours"
+        precipitation = sum(window) / len(window) if window else None
+    else:
+        temperature = at("temperature_2m", slot_key)
+        windspeed = at("windspeed_10m", slot_key)
+        weather_code = at("weathercode", slot_key)
+        heading = f"Forecast for {location_header} around {dining_at:%a %d %b %H:%M} ({location_tz}):"
+        precipitation_label = "Highest precipitation chance around the dining time"
+        precipitation = max(window) if window else None
+
+    if temperature is None:
+        return "Weather data is temporarily unavailable. Please try again later."
+
+    weather_description = _WEATHER_CODES.get(weather_code, "current conditions")
+
+    summary_lines = [
+        heading,
+        f"- Temperature: {temperature}°C",
+        f"- Windspeed: {windspeed} km/h",
+        f"- Conditions: {weather_description}",
+    ]
+    if precipitation is not None:
+        summary_lines.append(f"- {precipitation_label}: {precipitation:.0f}%")
+
+    summary_lines.append(
+        "Consider whether outdoor seating is comfortable and mention any contingency plans in your recommendation."
+    )
 
-    except requests.RequestException as exc:
-        return f"Weather service error: {exc}. Please try again with a different location or later."
+    return "\n".join(summary_lines)
 
 
 _WEATHER_CODES = {
@@ -129,117 +320,364 @@ researcher = Agent(
     role='Restaurant Researcher',
     goal='Gather initial data on top-rated restaurants based on user-provided cuisine, location, and price range.',
     backstory="A meticulous food critic who excels at finding hidden gems and popular spots. You are the first step in the recommendation process.",
-    verbose=True,
+    verbose=CREW_VERBOSE,
     allow_delegation=False,
     tools=[restaurant_search_tool],
-    llm=llm
+    llm=RoutedLLM(RoutedModel("researcher", models, ROLE_TIERS["researcher"]))
 )
 
 analyzer = Agent(
     role='Cuisine and Trend Analyst',
     goal='Analyze the list of restaurants provided by the researcher, focusing on ratings, unique menu items, and current dining trends.',
     backstory="An expert in culinary trends and data analysis. You can spot patterns and identify the best value and experience from a list of options.",
-    verbose=True,
+    verbose=CREW_VERBOSE,
     allow_delegation=False,
-    llm=llm
+    llm=RoutedLLM(RoutedModel("analyzer", models, ROLE_TIERS["analyzer"]))
 )
 
 generator = Agent(
     role='Personalized Recommendation Generator',
     goal='Synthesize the analyzed data into a final, personalized, and persuasive recommendation for the user.',
     backstory="A professional concierge who crafts perfect dining experiences. Your final output must be clear, engaging, and directly address the user's initial request.",
-    verbose=True,
+    verbose=CREW_VERBOSE,
     allow_delegation=False,
-    llm=llm
+    llm=RoutedLLM(RoutedModel("generator", creative_models, ROLE_TIERS["generator"]))
 )
 
+# Writes the comparative answer for fan-out requests (see _run_plan); plain text, not a ReAct step
+merger = RoutedModel("merger", creative_models, ROLE_TIERS["generator"], validate=None)
+
 weather_specialist = Agent(
     role="Weather and Ambience Advisor",
     goal="Provide accurate, up-to-date weather insights for the dining location so guests can plan their experience.",
     backstory="A hospitality professional who monitors forecasts to ensure diners are prepared for patio seating, travel, and attire.",
-    verbose=True,
+    verbose=CREW_VERBOSE,
     allow_delegation=False,
     tools=[fetch_weather_report],
-    llm=llm,
+    llm=RoutedLLM(RoutedModel("weather", models, ROLE_TIERS["weather"])),
 )
 
 # --- Tasks ---
-def create_tasks(user_preference: str, include_weather: bool):
-    """Creates the tasks for the crew based on user input."""
+def _earlier_output(step: str, output: str) -> str:
+    """Hand a checkpointed task output to a task whose upstream step was not re-run."""
+    return f"\n\nOutput of the earlier {step} step (reused from a previous run):\n{output}"
 
-    task_research = Task(
-        description=f"Use the 'Restaurant Search Tool' to find a list of 3-5 top-rated restaurants that match the user's preference: '{user_preference}'. The output must be a detailed, realistic list of restaurants, including name, cuisine, rating (e.g., 4.5/5), price range (e.g., $$$), and a brief description.",
-        agent=researcher,
-        expected_output="A markdown-formatted list of 3-5 restaurants with all required details (name, cuisine, rating, price, description)."
-    )
 
-    weather_task = None
-    if include_weather:
-        weather_task = Task(
+def create_tasks(user_preference: str, include_weather: bool, completed: dict = None, dining_time: str = ""):
+    """
+    Creates the tasks for the crew based on user input.
+
+    ``dining_time`` ('YYYY-MM-DD HH:MM', local to the dining location) makes the
+    weather briefing a forecast for the reservation instead of current conditions.
+
+    ``completed`` maps task names to checkpointed outputs; those tasks are not
+    created and their outputs are passed to the tasks that depend on them.
+    Returns the remaining tasks in execution order, keyed by task name.
+    """
+
+    completed = completed or {}
+    tasks = {}
+
+    if "research" not in completed:
+        tasks["research"] = Task(
+            description=f"Use the 'Restaurant Search Tool' to find a list of 3-5 top-rated restaurants that match the user's preference: '{user_preference}'. The output must be a detailed, realistic list of restaurants, including name, cuisine, rating (e.g., 4.5/5), price range (e.g., $$$), and a brief description.",
+            agent=researcher,
+            expected_output="A markdown-formatted list of 3-5 restaurants with all required details (name, cuisine, rating, price, description)."
+        )
+
+    def upstream(*names):
+        """Context tasks for the live upstream steps and description text for the checkpointed ones."""
+        context = [tasks[name] for name in names if name in tasks]
+        reused = "".join(_earlier_output(name, completed[name]) for name in names if name in completed)
+        return context, reused
+
+    if include_weather and "weather" not in completed:
+        context, reused = upstream("research")
+        if dining_time:
+            lookup = (
+                f"The guest plans to dine at {dining_time} (local time at the restaurant). Use the 'Dining Weather Lookup' "
+                f"tool with dining_time='{dining_time}' to get the forecast for that time."
+            )
+        else:
+            lookup = "Use the 'Dining Weather Lookup' tool to gather the current weather conditions."
+        tasks["weather"] = Task(
             description=(
                 "Determine the dining location referenced by the user preference or inferred from the researched restaurants. "
-                "Use the 'Dining Weather Lookup' tool to gather the current weather conditions. Provide a concise summary of "
+                f"{lookup} Provide a concise summary of "
                 "temperature, precipitation expectations, and any comfort considerations relevant to dining (e.g., patio suitability)."
-            ),
+            ) + reused,
             agent=weather_specialist,
-            context=[task_research],
+            context=context,
             expected_output=(
                 "A short weather briefing for the identified location including temperature, wind, precipitation chances, "
                 "and guidance on how the conditions affect dining plans."
             ),
         )
 
-    task_analyze = Task(
-        description="Review the list of restaurants provided by the researcher. For each restaurant, analyze its key features, unique selling points, and why it would be a good fit for the user. Identify the single best recommendation.",
-        agent=analyzer,
-        context=[task_research] + ([weather_task] if weather_task else []),
-        expected_output=(
-            "A detailed analysis of the top 3-5 restaurants, referencing any relevant weather considerations when applicable, "
-            "and concluding with a clear identification of the single best recommendation and the reasons why."
-        ),
-    )
+    weather_steps = ("weather",) if include_weather else ()
 
-    task_generate = Task(
-        description="Based on the analysis, write a final, engaging, and personalized recommendation. The output should be a single, well-structured markdown response that presents the best restaurant and a brief mention of the runner-up options.",
-        agent=generator,
-        context=[task_analyze] + ([weather_task] if weather_task else []),
-        expected_output=(
-            "A final, personalized restaurant recommendation in a friendly, professional tone, formatted in markdown, and "
-            "including actionable weather insights when they are available."
-        ),
-    )
+    if "analyze" not in completed:
+        context, reused = upstream("research", *weather_steps)
+        tasks["analyze"] = Task(
+            description="Review the list of restaurants provided by the researcher. For each restaurant, analyze its key features, unique selling points, and why it would be a good fit for the user. Identify the single best recommendation." + reused,
+            agent=analyzer,
+            context=context,
+            expected_output=(
+                "A detailed analysis of the top 3-5 restaurants, referencing any relevant weather considerations when applicable, "
+                "and concluding with a clear identification of the single best recommendation and the reasons why."
+            ),
+        )
 
-    tasks = [task_research]
-    if weather_task:
-        tasks.append(weather_task)
-    tasks.extend([task_analyze, task_generate])
+    if "generate" not in completed:
+        context, reused = upstream("analyze", *weather_steps)
+        tasks["generate"] = Task(
+            description="Based on the analysis, write a final, engaging, and personalized recommendation. The output should be a single, well-structured markdown response that presents the best restaurant and a brief mention of the runner-up options." + reused,
+            agent=generator,
+            context=context,
+            expected_output=(
+                "A final, personalized restaurant recommendation in a friendly, professional tone, formatted in markdown, and "
+                "including actionable weather insights when they are available."
+            ),
+        )
 
     return tasks
 
-# --- Crew Setup Function ---
-def run_crew(user_preference: str, include_weather: bool = True) -> str:
-    """Initializes and runs the CrewAI process."""
 
-    tasks = create_tasks(user_preference, include_weather)
+# --- Checkpoints ---
+checkpoint_store = checkpoint_store_from_env()
+
+# Weather briefings go stale much faster than restaurant research.
+CHECKPOINT_TTL_SECONDS = {"weather": 15 * 60}
+
 
-    agents = [researcher]
+def _task_plan(user_preference: str, include_weather: bool, dining_time: str = ""):
+    """Task names in execution order, with the inputs and upstream tasks each one depends on."""
+    weather_steps = ["weather"] if include_weather else []
+    plan = [("research", {"user_preference": user_preference}, [])]
     if include_weather:
-        agents.append(weather_specialist)
-    agents.extend([analyzer, generator])
+        plan.append(("weather", {"dining_time": dining_time}, ["research"]))
+    plan.append(("analyze", {}, ["research"] + weather_steps))
+    plan.append(("generate", {}, ["analyze"] + weather_steps))
+    return plan
+
+
+def _restore_checkpoints(plan):
+    """Outputs of the leading tasks whose checkpoints are still valid."""
+    completed = {}
+    if checkpoint_store is None:
+        return completed
+    for name, inputs, upstream in plan:
+        key = checkpoint_key(name, inputs, [completed[dep] for dep in upstream])
+        output = checkpoint_store.get(key, ttl_seconds=CHECKPOINT_TTL_SECONDS.get(name))
+        if output is None:
+            break
+        completed[name] = output
+    return completed
+
+
+def _save_checkpoints(plan, completed, tasks):
+    if checkpoint_store is None:
+        return
+    outputs = dict(completed)
+    for name, inputs, upstream in plan:
+        if name in completed:
+            continue
+        output = task_output_text(tasks[name])
+        if output is None:
+            break
+        outputs[name] = output
+        checkpoint_store.put(checkpoint_key(name, inputs, [outputs[dep] for dep in upstream]), name, output)
+
+
+# --- Crew Setup Function ---
+def _task_finished(output):
+    """Log the task, then let a waiting higher-priority request take the slot before the next task."""
+    task_callback(output)
+    scheduler.yield_point()
+
+
+
+def run_crew(user_preference: str, include_weather: bool = True, dining_time: str = "", profile: bool = None,
+             priority: str = "interactive", tenant: str = "default") -> str:
+    """
+    Initializes and runs the CrewAI process, resuming from checkpointed tasks when possible.
+
+    ``profile`` records a sampling profile of this request (None: at PROFILE_SAMPLE_RATE; see profiling.py).
+    ``priority`` ("interactive", "api" or "batch") and ``tenant`` place the run in the scheduler's queues (see scheduler.py).
+    Under load, interactive and api runs are served at a reduced tier (see degradation.py); batch runs always get the full pipeline.
+    Comparison requests ("sushi in Tokyo vs Berlin") run one sub-crew per option in parallel and merge the answers (see query_planner.py).
+    """
+
+    plan = plan_query(user_preference)
+    for text in [subquery.text for subquery in plan.subqueries] if plan else [user_preference]:
+        place = gazetteer().resolve(text)
+        traffic.record(gazetteer().city_of(place).name if place else None)
+    with request_scope() as request_id:
+        answer = _materialized(user_preference, include_weather, dining_time) if plan is None else None
+        if answer is not None:
+            return answer
+        with scheduler.slot(priority, tenant), profile_request("run_crew", profile), track_request("run_crew"):
+            tier = "full" if priority == "batch" else degradation.admit(request_id)
+            if plan is not None:
+                return with_tier_note(_run_plan(user_preference, plan, include_weather, dining_time, tier), tier)
+            with budget_scope():
+                return with_tier_note(_run_crew(user_preference, include_weather, dining_time, tier), tier)
+
+
+def _materialized(user_preference: str, include_weather: bool, dining_time: str):
+    """The materialized answer for a request it fully covers, or None."""
+    key = None if dining_time else query_key(user_preference, include_weather=include_weather)
+    answer = materialized_recommendations.get(key)
+    if answer is not None:
+        crew_log.info("Served the materialized recommendation for '%s'", canonical_preference(key))
+    return answer
+
+
+def _run_plan(user_preference: str, plan, include_weather: bool, dining_time: str, tier: str):
+    """Run the plan's sub-queries as parallel sub-crews (each with its own budget), then merge their answers."""
+
+    def run(subquery):
+        answer = _materialized(subquery.text, include_weather, dining_time)
+        if answer is not None:
+            return answer
+        with budget_scope():
+            return _run_crew(subquery.text, include_weather, dining_time, tier)
+
+    crew_log.info("Comparing %s in parallel", ", ".join(plan.labels))
+    results = fan_out(plan.subqueries, run)
+    if tier == "data_only":
+        return merged_fallback(results)
+    try:
+        merged = merger.invoke(merge_prompt(user_preference, results))
+    except Exception as exc:
+        crew_log.warning("Merging the comparison failed, returning the answers side by side: %s", exc)
+        return merged_fallback(results)
+    return getattr(merged, "content", merged)
+
+
+def _run_crew(user_preference: str, include_weather: bool, dining_time: str, tier: str = "full",
+              resume: bool = True):
+    if tier != "full":
+        crew_log.info("Serving at degradation tier %s", tier)
+        include_weather = False
+    plan = _task_plan(user_preference, include_weather, dining_time)
+    completed = _restore_checkpoints(plan) if resume else {}
+    if len(completed) == len(plan):
+        crew_log.info("All tasks restored from checkpoints.")
+        return completed["generate"]
+    if completed:
+        crew_log.info("Resuming crew after checkpointed tasks: %s", ", ".join(completed))
+    if tier in ("cached_research", "data_only") and "research" not in completed:
+        completed["research"] = _search_results(user_preference)
+    if tier == "data_only":
+        return _data_only_recommendation(user_preference, completed["research"])
+
+    tasks = create_tasks(user_preference, include_weather, completed, dining_time)
+    agents = [task.agent for task in tasks.values()]
 
     restaurant_crew = Crew(
         agents=agents,
-        tasks=tasks,
+        tasks=list(tasks.values()),
         process=Process.sequential,
-        verbose=True,
+        verbose=CREW_VERBOSE,
+        step_callback=step_callback,
+        task_callback=_task_finished,
     )
-    
-    print("Starting Restaurant Recommendation Crew...")
-    result = restaurant_crew.kickoff()
-    print("Crew finished.")
+    watch(restaurant_crew, "crew")
+    for task in tasks.values():
+        watch(task, "task")
+
+    crew_log.info("Starting crew with tasks: %s", ", ".join(tasks))
+    # The agents are module-level; don't let this request's state ride along to the next one
+    with agents_in_use(agents):
+        result = restaurant_crew.kickoff()
+    watch(result, "result")
+    crew_log.info("Crew finished.")
+
+    _save_checkpoints(plan, completed, tasks)
     
     return result
 
+def _search_results(user_preference: str) -> str:
+    """The restaurant search output itself (last good result during an outage), standing in for the research task."""
+    return str(restaurant_search_tool._search(search_query=user_preference))
+
+
+def _data_only_recommendation(user_preference: str, research: str) -> str:
+    """A deterministic answer from the research data alone, without LLM calls."""
+    return (
+        f"### Restaurants matching: {user_preference}\n\n{research.strip()}\n\n"
+        "Please confirm opening hours and availability with the restaurant before you go."
+    )
+
+# --- Materialized recommendations ---
+# Open-Meteo weather codes grouped into the conditions that change dining advice
+_WEATHER_CONDITIONS = ((0, 1, "clear"), (2, 3, "cloudy"), (45, 48, "fog"), (51, 67, "rain"), (71, 77, "snow"),
+                       (80, 82, "rain"), (85, 86, "snow"), (95, 99, "storm"))
+
+
+def _weather_condition(city: str) -> str:
+    """The city's current weather condition ("clear", "rain", ...); a change invalidates its materialized answers."""
+    geocoded = _geocode(city.lower())
+    if geocoded is None:
+        return "unknown"
+    _, _, latitude, longitude, _ = geocoded
+    response = http.get(
+        "https://api.open-meteo.com/v1/forecast",
+        params={"latitude": latitude, "longitude": longitude, "current_weather": True},
+        timeout=10,
+    )
+    response.raise_for_status()
+    code = (response.json().get("current_weather") or {}).get("weathercode")
+    return next((name for low, high, name in _WEATHER_CONDITIONS if code is not None and low <= code <= high), "other")
+
+
+def _materialize(key):
+    """Run the crew for a popular query at batch priority and within the usual budgets, for materialized_recommendations."""
+    # Run every task afresh: a materialization usually follows a weather change that the
+    # checkpoints (research for an hour, weather for 15 minutes) know nothing about
+    with request_scope(), scheduler.slot("batch", "materializer"), budget_scope():
+        result = _run_crew(canonical_preference(key), dict(key.options)["include_weather"], "", resume=False)
+    return str(result), ()
+
+
+materialized_recommendations = MaterializedRecommendations(_materialize, condition=_weather_condition)
+
+
+# --- Warm-up ---
+def _build_crew():
+    tasks = create_tasks("warm-up", include_weather=True)
+    Crew(agents=[task.agent for task in tasks.values()], tasks=list(tasks.values()), process=Process.sequential)
+    return f"{len(tasks)} tasks"
+
+
+def _open_connections():
+    """Set up TLS connections in the pooled clients; any HTTP status will do."""
+    http.head("https://geocoding-api.open-meteo.com/v1/search", timeout=10)
+    http.head("https://api.open-meteo.com/v1/forecast", timeout=10)
+    openai_http_client.get("https://api.openai.com/v1/models", timeout=10)
+
+
+def _prime_weather(top_n):
+    """Fetch the current weather for the most requested cities (geocoding and last-good caches)."""
+    cities = traffic.top(top_n)
+    for city in cities:
+        weather_report(city)
+    return f"{len(cities)} cities"
+
+
+def warmup_steps(top_n=WARMUP_TOP_CITIES):
+    """Warm-up for this process; see warmup.py."""
+    return [
+        WarmupStep("crew", _build_crew),
+        WarmupStep("gazetteer", lambda: f"{len(gazetteer().places)} places"),
+        WarmupStep("connections", _open_connections, required=False),
+        WarmupStep("weather cache", lambda: _prime_weather(top_n), required=False),
+        WarmupStep("materializer", materialized_recommendations.start, required=False),
+        WarmupStep("memory monitor", memory_monitor.start, required=False),
+    ]
+
+
 if __name__ == '__main__':
     example_preference = "Affordable Italian restaurant in downtown Chicago with a rating above 4.0"
     print(f"\n--- Running Crew for: {example_preference} ---\n")
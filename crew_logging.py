@@ -0,0 +1,194 @@
+"""
+Bounded, asynchronous logging of crew events for both crews.
+
+Agents and crews used to run with ``verbose=True``, printing every thought,
+tool call and tool output to stdout from the request thread. Instead, crew
+events go to the "crew" logger through ``step_callback`` / ``task_callback``:
+
+  - the request thread only enqueues records (a bounded queue; records are
+    dropped and counted in ``crew_log_dropped_total`` if it is full),
+  - a QueueListener thread writes them to a size-rotated log file and to a
+    per-request ring buffer that the Streamlit apps show under each answer,
+  - per-step details are DEBUG records, kept for CREW_LOG_DETAIL_RATE of the
+    requests (chosen by request id, so a request is logged fully or not at all);
+    task results and errors are always kept.
+
+Settings: CREW_LOG_LEVEL (DEBUG), CREW_LOG_DETAIL_RATE (1.0), CREW_LOG_FILE
+(~/.cache/crewai-restaurant/logs/crew.log, empty to disable), CREW_LOG_MAX_MB
+(10), CREW_LOG_BACKUPS (5), CREW_LOG_BUFFER (events kept per request, 500)
+and CREW_VERBOSE (1 restores CrewAI's own console output).
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+from metrics import metrics
+from request_context import current_request_id
+
+# CrewAI's own step-by-step console output (off unless asked for)
+CREW_VERBOSE = os.environ.get("CREW_VERBOSE", "0") == "1"
+
+LOG_LEVEL = os.environ.get("CREW_LOG_LEVEL", "DEBUG").upper()
+DETAIL_RATE = float(os.environ.get("CREW_LOG_DETAIL_RATE", "1"))
+LOG_FILE = os.environ.get("CREW_LOG_FILE", str(Path.home() / ".cache" / "crewai-restaurant" / "logs" / "crew.log"))
+LOG_MAX_BYTES = int(float(os.environ.get("CREW_LOG_MAX_MB", "10")) * 1024 * 1024)
+LOG_BACKUPS = int(os.environ.get("CREW_LOG_BACKUPS", "5"))
+BUFFER_EVENTS = int(os.environ.get("CREW_LOG_BUFFER", "500"))
+BUFFER_REQUESTS = 100
+QUEUE_SIZE = 10000
+MAX_CHARS = 500
+
+FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(message)s"
+
+crew_log = logging.getLogger("crew")
+
+
+def _detailed(request_id):
+    """Whether a request keeps its DEBUG records; stable for the request's lifetime."""
+    if DETAIL_RATE >= 1 or request_id is None:
+        return DETAIL_RATE > 0
+    return zlib.crc32(request_id.encode()) % 10000 < DETAIL_RATE * 10000
+
+
+class _RequestFilter(logging.Filter):
+    """Tags records with the request id (on the request thread) and applies detail sampling."""
+
+    def filter(self, record):
+        record.request_id = current_request_id() or "-"
+        if record.levelno < logging.INFO:
+            return _detailed(current_request_id())
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.inc("crew_log_dropped_total")
+
+
+class RequestBufferHandler(logging.Handler):
+    """Keeps the last ``max_events`` formatted records of each of the last ``max_requests`` requests."""
+
+    def __init__(self, max_requests=BUFFER_REQUESTS, max_events=BUFFER_EVENTS):
+        super().__init__()
+        self.max_requests = max_requests
+        self.max_events = max_events
+        self._buffers = OrderedDict()
+        self._buffers_lock = threading.Lock()
+
+    def emit(self, record):
+        request_id = getattr(record, "request_id", "-")
+        if request_id == "-":
+            return
+        line = self.format(record)
+        with self._buffers_lock:
+            buffer = self._buffers.get(request_id)
+            if buffer is None:
+                buffer = self._buffers[request_id] = deque(maxlen=self.max_events)
+                while len(self._buffers) > self.max_requests:
+                    self._buffers.popitem(last=False)
+            buffer.append(line)
+
+    def lines(self, request_id):
+        with self._buffers_lock:
+            return list(self._buffers.get(request_id, ()))
+
+
+_queue = queue.Queue(QUEUE_SIZE)
+request_buffer = RequestBufferHandler()
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def configure_logging():
+    """Route the "crew" logger through the queue; safe to call more than once."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        formatter = logging.Formatter(FORMAT)
+        handlers = [request_buffer]
+        if LOG_FILE:
+            Path(LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+            handlers.append(RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                encoding="utf-8"))
+        console = logging.StreamHandler()
+        console.setLevel(logging.WARNING)
+        handlers.append(console)
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        queue_handler = _DroppingQueueHandler(_queue)
+        queue_handler.addFilter(_RequestFilter())
+        crew_log.addHandler(queue_handler)
+        crew_log.setLevel(LOG_LEVEL)
+        crew_log.propagate = False
+
+        _listener = QueueListener(_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def flush(timeout=1.0):
+    """Wait (briefly) until queued records have been written."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def request_log(request_id):
+    """Formatted crew events recorded for ``request_id``, oldest first."""
+    flush()
+    return request_buffer.lines(request_id)
+
+
+def _clip(value, limit=MAX_CHARS):
+    text = " ".join(str(value).split())
+    return text if len(text) <= limit else text[:limit] + f"... [{len(text) - limit} more chars]"
+
+
+def _describe_step(step):
+    tool = getattr(step, "tool", None)
+    if tool:
+        result = getattr(step, "result", None)
+        described = f"tool {tool}({_clip(getattr(step, 'tool_input', ''), 200)})"
+        return described + (f" -> {_clip(result)}" if result else "")
+    output = getattr(step, "output", None) or getattr(step, "return_values", None)
+    if output:
+        return f"final answer: {_clip(output)}"
+    return _clip(getattr(step, "result", step))
+
+
+def step_callback(step):
+    """Crew ``step_callback``: one DEBUG record per agent step (thought, tool call or answer)."""
+    if not crew_log.isEnabledFor(logging.DEBUG):
+        return
+    # Older CrewAI versions pass lists of (action, observation) pairs
+    steps = step if isinstance(step, list) else [step]
+    for item in steps:
+        if isinstance(item, tuple) and len(item) == 2:
+            action, observation = item
+            crew_log.debug("step: tool %s(%s) -> %s", getattr(action, "tool", "?"),
+                           _clip(getattr(action, "tool_input", ""), 200), _clip(observation))
+            continue
+        thought = getattr(item, "thought", None)
+        if thought:
+            crew_log.debug("thought: %s", _clip(thought, 300))
+        crew_log.debug("step: %s", _describe_step(item))
+
+
+def task_callback(output):
+    """Crew ``task_callback``: one INFO record per finished task."""
+    agent = getattr(output, "agent", "") or "agent"
+    crew_log.info("task finished by %s: %s", agent, _clip(getattr(output, "raw", None) or output, 300))
+
+
+configure_logging()
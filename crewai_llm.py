@@ -0,0 +1,56 @@
+"""
+CrewAI-native front for ``model_routing.RoutedModel`` (the OpenAI crew).
+
+LiteLLM-based CrewAI releases, the ones with ``crewai.tools.tool`` that
+crew.py uses, turn any ``llm=`` that isn't one of their own LLM classes into
+``LLM(model=<obj>.model_name)`` when an Agent is built. A RoutedModel handed to
+such an Agent is never called: no routing, escalation, budgets or JSON mode,
+and the LangChain clients behind it (completion cache, rate-limited httpx
+client) are bypassed as well.
+
+``RoutedLLM`` is a ``BaseLLM``, which CrewAI keeps as it is. Its ``call``
+converts CrewAI's role/content messages to LangChain messages and goes
+through ``RoutedModel.invoke`` with the stop words of the current call, so
+everything RoutedModel does applies again. It reports no native function
+calling, so agents keep using the ReAct text loop that RoutedModel validates.
+
+The Ollama crew pins a LangChain-based CrewAI release that calls the model
+as a Runnable, and uses RoutedModel directly.
+"""
+
+from typing import Any
+
+from crewai.llms.base_llm import BaseLLM
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+_MESSAGE_TYPES = {"system": SystemMessage, "assistant": AIMessage}
+
+
+def _langchain_messages(messages):
+    if isinstance(messages, str):
+        return [HumanMessage(content=messages)]
+    converted = []
+    for message in messages:
+        content = message.get("content") or ""
+        if not isinstance(content, str):  # Multimodal parts; the agents only send text
+            content = "\n".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+        converted.append(_MESSAGE_TYPES.get(message.get("role"), HumanMessage)(content=content))
+    return converted
+
+
+class RoutedLLM(BaseLLM):
+    """A RoutedModel as a CrewAI LLM (see module docstring)."""
+
+    routed: Any = None
+
+    def __init__(self, routed, **kwargs):
+        super().__init__(model=routed.model_name, routed=routed, **kwargs)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None,
+             from_agent=None, response_model=None):
+        stop = self.stop_sequences
+        result = self.routed.invoke(_langchain_messages(messages), **({"stop": stop} if stop else {}))
+        return self._apply_stop_words(str(getattr(result, "content", result)))
+
+    def supports_stop_words(self):
+        return True
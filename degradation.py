@@ -0,0 +1,175 @@
+"""
+Load-aware graceful degradation for both crews.
+
+Before a crew run starts, ``controller.admit()`` picks the service tier for
+the request from the current load:
+
+  0 full             the whole pipeline
+  1 no_weather       skip weather enrichment (and, for the Ollama crew, the
+                     analyst's tool loop in favour of prefetched lookups)
+  2 cached_research  no research agent: reuse checkpointed research or the
+                     (cached) search tool output directly
+  3 data_only        no LLM calls: a deterministic summary of the tool data
+
+Signals, any of which can raise the tier: requests waiting for an interactive
+or api scheduler slot, mean LLM call latency and the LLM error rate over the
+last DEGRADE_WINDOW_SECONDS. The tier rises as soon as a signal crosses the
+threshold for a higher tier; it steps back down one tier at a time, only after
+every signal has stayed below DEGRADE_RECOVER_RATIO of the current tier's
+thresholds for DEGRADE_HOLD_SECONDS, so it doesn't flap around a threshold.
+
+The tier is reported in each response (``with_tier_note``), per request
+(``applied_tier``) and in ``metrics`` (degradation_tier, transitions and
+requests served per tier).
+
+Settings: DEGRADE_QUEUE (requests waiting, "3,6,12"), DEGRADE_LATENCY (mean
+LLM call seconds, "20,40,80"), DEGRADE_ERROR_RATE ("0.2,0.4,0.6"), each the
+thresholds for tiers 1-3; DEGRADE_WINDOW_SECONDS (60), DEGRADE_HOLD_SECONDS
+(30), DEGRADE_RECOVER_RATIO (0.5) and DEGRADE_TIER (pin a tier, e.g. for
+drills; "off" disables degradation).
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from metrics import metrics
+from scheduler import scheduler
+
+TIERS = ("full", "no_weather", "cached_research", "data_only")
+
+TIER_NOTES = {
+    "no_weather": "Served in reduced mode under heavy load: weather details were skipped.",
+    "cached_research": "Served in reduced mode under heavy load: based on cached restaurant research.",
+    "data_only": "Served in data-only mode under heavy load: a summary of the restaurant data without AI analysis.",
+}
+
+MIN_CALLS_FOR_ERROR_RATE = 5
+
+
+def _thresholds(name, default):
+    values = tuple(float(value) for value in os.environ.get(name, default).split(","))
+    if len(values) != len(TIERS) - 1:
+        raise ValueError(f"{name} needs {len(TIERS) - 1} comma-separated thresholds, got {values}")
+    return values
+
+
+class DegradationController:
+    def __init__(self, queue=(3, 6, 12), latency=(20, 40, 80), error_rate=(0.2, 0.4, 0.6), window=60.0,
+                 hold=30.0, recover_ratio=0.5, pinned=None, clock=time.monotonic):
+        self.thresholds = {"queue": queue, "latency": latency, "error_rate": error_rate}
+        self.window = window
+        self.hold = hold
+        self.recover_ratio = recover_ratio
+        self.pinned = pinned
+        self.clock = clock
+        self.level = 0
+        self._changed_at = clock()
+        self._calls = deque()  # (time, seconds, ok)
+        self._applied = OrderedDict()
+        self._lock = threading.Lock()
+        metrics.set("degradation_tier", 0)
+
+    def observe_llm(self, seconds, ok=True):
+        """Record one LLM call (fed by model_routing)."""
+        with self._lock:
+            self._calls.append((self.clock(), seconds, ok))
+
+    def signals(self):
+        with self._lock:
+            return self._signals(self.clock())
+
+    def _signals(self, now):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+        calls = len(self._calls)
+        failures = sum(1 for _, _, ok in self._calls if not ok)
+        stats = scheduler.stats()
+        return {
+            "queue": stats["interactive"]["waiting"] + stats["api"]["waiting"],
+            "latency": sum(seconds for _, seconds, _ in self._calls) / calls if calls else 0.0,
+            "error_rate": failures / calls if calls >= MIN_CALLS_FOR_ERROR_RATE else 0.0,
+        }
+
+    def _pressure(self, signals, scale=1.0):
+        """Highest tier whose threshold (times ``scale``) any signal reaches."""
+        level = 0
+        for name, value in signals.items():
+            for tier, threshold in enumerate(self.thresholds[name], start=1):
+                if value >= threshold * scale:
+                    level = max(level, tier)
+        return level
+
+    def _set_level(self, level, now):
+        metrics.inc("degradation_transitions_total", from_tier=TIERS[self.level], to_tier=TIERS[level])
+        metrics.set("degradation_tier", level)
+        self.level = level
+        self._changed_at = now
+
+    def tier(self):
+        """The tier for a request starting now (updates the controller state)."""
+        if self.pinned is not None:
+            return self.pinned
+        with self._lock:
+            now = self.clock()
+            signals = self._signals(now)
+            target = self._pressure(signals)
+            if target > self.level:
+                self._set_level(target, now)
+            elif (self.level > 0 and now - self._changed_at >= self.hold
+                    and self._pressure(signals, self.recover_ratio) < self.level):
+                self._set_level(self.level - 1, now)
+            return TIERS[self.level]
+
+    def admit(self, request_id=None):
+        """Pick the tier for a request and remember it under ``request_id``."""
+        tier = self.tier()
+        metrics.inc("degradation_requests_total", tier=tier)
+        if request_id is not None:
+            with self._lock:
+                self._applied[request_id] = tier
+                while len(self._applied) > 1000:
+                    self._applied.popitem(last=False)
+        return tier
+
+    def applied_tier(self, request_id):
+        with self._lock:
+            return self._applied.get(request_id)
+
+
+def with_tier_note(result, tier):
+    """Append the tier notice to a crew result (a string or an object with ``raw``) when degraded."""
+    note = TIER_NOTES.get(tier)
+    if note is None:
+        return result
+    if hasattr(result, "raw"):
+        result.raw = f"{result.raw}\n\n_{note}_"
+        return result
+    return f"{result}\n\n_{note}_"
+
+
+def _controller_from_env():
+    pinned = os.environ.get("DEGRADE_TIER")
+    if pinned == "off":
+        pinned = "full"
+    if pinned is not None and pinned not in TIERS:
+        raise ValueError(f"DEGRADE_TIER={pinned!r}; use one of {', '.join(TIERS)} or off")
+    return DegradationController(
+        queue=_thresholds("DEGRADE_QUEUE", "3,6,12"),
+        latency=_thresholds("DEGRADE_LATENCY", "20,40,80"),
+        error_rate=_thresholds("DEGRADE_ERROR_RATE", "0.2,0.4,0.6"),
+        window=float(os.environ.get("DEGRADE_WINDOW_SECONDS", "60")),
+        hold=float(os.environ.get("DEGRADE_HOLD_SECONDS", "30")),
+        recover_ratio=float(os.environ.get("DEGRADE_RECOVER_RATIO", "0.5")),
+        pinned=pinned,
+    )
+
+
+# Process-wide controller
+controller = _controller_from_env()
+
+
+def applied_tier(request_id):
+    """Tier served to ``request_id`` (None if unknown)."""
+    return controller.applied_tier(request_id)
@@ -0,0 +1,251 @@
+"""
+Offline gazetteer: place names, coordinates and timezones for both crews.
+
+data/gazetteer.json (or GAZETTEER_PATH) lists cities and neighborhoods with
+their aliases. ``Gazetteer`` builds two indexes over the normalised names:
+
+  - an Aho-Corasick automaton, so every place mentioned in a free-text
+    preference is found in one pass over the text, whole words only;
+  - a sorted prefix index for autocomplete in the Streamlit location inputs.
+
+Resolving places locally replaces substring scans of the tool data and
+remote geocoding calls, and makes "unknown location" an explicit answer
+instead of a silent fallback to some default city.
+
+Usage:
+    python gazetteer.py find "ramen near Shibuya or in Osaka"
+    python gazetteer.py complete "san"
+"""
+
+import json
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+DEFAULT_PATH = Path(__file__).resolve().parent / "data" / "gazetteer.json"
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    """Case-fold, strip accents and collapse punctuation/whitespace to single spaces."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    ascii_text = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", ascii_text.replace("'", "")).strip()
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    kind: str  # "city" or "neighborhood"
+    country: str
+    latitude: float
+    longitude: float
+    timezone: str
+    city: Optional[str] = None  # Parent city of a neighborhood
+
+    @property
+    def label(self):
+        parts = [self.name] + ([self.city] if self.city else [])
+        if self.country and self.country != self.name:
+            parts.append(self.country)
+        return ", ".join(parts)
+
+
+@dataclass(frozen=True)
+class Match:
+    place: Place
+    alias: str  # The normalised alias that matched
+    start: int  # Offsets into the normalised text
+    end: int
+
+
+class _Automaton:
+    """Aho-Corasick automaton over normalised aliases; values are lists of places per alias."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # (alias length, alias) for patterns ending at each state
+        for alias in patterns:
+            state = 0
+            for ch in alias:
+                if ch not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][ch] = len(self._goto) - 1
+                state = self._goto[state][ch]
+            self._out[state].append((len(alias), alias))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scan(self, text):
+        """Yield (start, end, alias) for every pattern occurrence in ``text``."""
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, alias in self._out[state]:
+                yield i + 1 - length, i + 1, alias
+
+
+class Gazetteer:
+    def __init__(self, places: List[Place], aliases):
+        """``aliases`` maps each place to the names it is known by (its own name included)."""
+        self.places = places
+        self._by_name = {}
+        self._by_alias = {}
+        for place in places:
+            self._by_name.setdefault(place.name, place)
+            for alias in aliases[place]:
+                key = normalize(alias)
+                if key and place not in self._by_alias.setdefault(key, []):
+                    self._by_alias[key].append(place)
+        self._automaton = _Automaton(self._by_alias)
+        self._prefixes = sorted(self._by_alias)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            records = json.load(f)["places"]
+        cities = {record["name"]: record for record in records if record["kind"] == "city"}
+        places, aliases = [], {}
+        for record in records:
+            parent = cities.get(record.get("city"), {})
+            place = Place(
+                name=record["name"],
+                kind=record["kind"],
+                country=record.get("country") or parent.get("country", ""),
+                latitude=record["latitude"],
+                longitude=record["longitude"],
+                timezone=record.get("timezone") or parent.get("timezone", "UTC"),
+                city=record.get("city"),
+            )
+            places.append(place)
+            aliases[place] = [place.name] + record.get("aliases", [])
+        return cls(places, aliases)
+
+    def find_all(self, text) -> List[Match]:
+        """
+        Places mentioned in ``text``, in order of appearance. Matches are whole
+        words, and overlapping matches keep the leftmost-longest one ("New York
+        City" rather than "New York"). An alias shared by several places (such
+        as "Soho") resolves to the one whose city is also mentioned.
+        """
+        normalized = normalize(text)
+        candidates = [
+            (start, end, alias)
+            for start, end, alias in self._automaton.scan(normalized)
+            if (start == 0 or normalized[start - 1] == " ") and (end == len(normalized) or normalized[end] == " ")
+        ]
+        candidates.sort(key=lambda c: (c[0], -(c[1] - c[0])))
+
+        chosen, covered = [], 0
+        for start, end, alias in candidates:
+            if start >= covered:
+                chosen.append((start, end, alias))
+                covered = end
+
+        mentioned = {place.name for _, _, alias in chosen for place in self._by_alias[alias]}
+        matches = []
+        for start, end, alias in chosen:
+            options = self._by_alias[alias]
+            place = next((p for p in options if p.city in mentioned), options[0])
+            matches.append(Match(place, alias, start, end))
+        return matches
+
+    def find_places(self, text) -> List[Place]:
+        seen = []
+        for match in self.find_all(text):
+            if match.place not in seen:
+                seen.append(match.place)
+        return seen
+
+    def exact(self, text) -> Optional[Place]:
+        """The place ``text`` is a name or alias of, else None ("Paris, Texas" is not Paris)."""
+        places = self._by_alias.get(normalize(text))
+        return places[0] if places else None
+
+    def resolve(self, text) -> Optional[Place]:
+        """The place ``text`` names exactly, else the first place mentioned in it, else None."""
+        exact = self.exact(text)
+        if exact is not None:
+            return exact
+        places = self.find_places(text)
+        return places[0] if places else None
+
+    def get(self, name) -> Optional[Place]:
+        return self._by_name.get(name)
+
+    def city_of(self, place: Place) -> Place:
+        """The city a neighborhood belongs to (a city is its own city)."""
+        return self._by_name.get(place.city, place) if place.city else place
+
+    def complete(self, prefix, limit=10) -> List[Place]:
+        """Places with a name or alias starting with ``prefix``; exact matches and cities first."""
+        key = normalize(prefix)
+        if not key:
+            return []
+        ranks = {}
+        i = bisect_left(self._prefixes, key)
+        while i < len(self._prefixes) and self._prefixes[i].startswith(key):
+            alias = self._prefixes[i]
+            for place in self._by_alias[alias]:
+                rank = (alias != key, place.kind != "city", place.name)
+                ranks[place] = min(rank, ranks.get(place, rank))
+            i += 1
+        return sorted(ranks, key=ranks.get)[:limit]
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def gazetteer() -> Gazetteer:
+    """The shared gazetteer, loaded from GAZETTEER_PATH (default: data/gazetteer.json) on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Gazetteer.load(os.environ.get("GAZETTEER_PATH") or DEFAULT_PATH)
+        return _default
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the offline gazetteer")
+    sub = parser.add_subparsers(dest="command", required=True)
+    find = sub.add_parser("find", help="places mentioned in a piece of text")
+    find.add_argument("text")
+    complete = sub.add_parser("complete", help="autocomplete a place name")
+    complete.add_argument("prefix")
+    args = parser.parse_args()
+
+    if args.command == "find":
+        for match in gazetteer().find_all(args.text):
+            place = match.place
+            print(f"{place.label} ({place.kind}) {place.latitude}, {place.longitude} {place.timezone}  [{match.alias}]")
+    else:
+        for place in gazetteer().complete(args.prefix):
+            print(place.label)
+
+
+if __name__ == "__main__":
+    main()
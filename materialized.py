@@ -0,0 +1,300 @@
+"""
+Materialized recommendations for the most popular queries.
+
+Most traffic asks for the same few things ("affordable Italian in Chicago").
+``query_key`` reduces a request to (place, cuisine, price band) plus the
+crew-specific options (weather briefing, dietary and ambiance selections),
+and returns None when the text says anything else, so a precomputed answer is
+only served for requests it fully answers.
+
+``MaterializedRecommendations`` counts how often each key is asked for
+(decayed over time, so the hot set follows traffic) and a background thread
+recomputes the hottest keys through the crew at batch priority. A lookup that
+hits is answered directly, without the crew, the scheduler or any LLM call.
+
+Entries are invalidated selectively:
+  - ``invalidate(tags)`` drops entries tagged with a changed venue or city
+    (catalog updates in the Ollama crew, see data_source.Change),
+  - ``check_conditions()`` asks the crew for each city's weather condition
+    (e.g. "clear" / "rain", or which venues are weather-suitable) and drops the
+    city's entries when it has changed; temperature drift within the same
+    condition keeps them,
+  - entries older than MATERIALIZE_MAX_AGE seconds are recomputed.
+An answer whose tags (or city's condition) were invalidated while it was being
+computed is discarded rather than stored, and computed again on the next refresh.
+
+Settings: MATERIALIZE (1; 0 disables lookups and the refresher),
+MATERIALIZE_HOT_SIZE (20 keys kept), MATERIALIZE_MIN_HITS (3 requests before
+a key is precomputed), MATERIALIZE_INTERVAL (300 seconds between refreshes),
+MATERIALIZE_MAX_AGE (3600 seconds).
+"""
+
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from crew_logging import crew_log
+from gazetteer import gazetteer, normalize
+from metrics import metrics
+
+ENABLED = os.environ.get("MATERIALIZE", "1") != "0"
+HOT_SIZE = int(os.environ.get("MATERIALIZE_HOT_SIZE", "20"))
+MIN_HITS = float(os.environ.get("MATERIALIZE_MIN_HITS", "3"))
+INTERVAL = float(os.environ.get("MATERIALIZE_INTERVAL", "300"))
+MAX_AGE = float(os.environ.get("MATERIALIZE_MAX_AGE", "3600"))
+
+# Popularity is multiplied by this after every refresh, so old favourites fade
+DECAY = 0.8
+
+CUISINES = {
+    "american", "barbecue", "bbq", "brazilian", "british", "caribbean", "chinese", "contemporary", "ethiopian",
+    "french", "fusion", "german", "greek", "indian", "irish", "italian", "japanese", "korean", "lebanese",
+    "mediterranean", "mexican", "middle eastern", "peruvian", "pizza", "ramen", "seafood", "spanish", "steak",
+    "steakhouse", "sushi", "tapas", "thai", "turkish", "vegan", "vegetarian", "vietnamese",
+}
+PRICE_WORDS = {
+    "affordable": "$", "budget": "$", "cheap": "$", "inexpensive": "$",
+    "moderate": "$$", "moderately priced": "$$", "mid range": "$$", "midrange": "$$",
+    "expensive": "$$$", "fancy": "$$$", "high end": "$$$", "upscale": "$$$",
+    "luxury": "$$$$", "fine dining": "$$$$",
+}
+PRICE_PHRASES = {"$": "affordable", "$$": "moderately priced", "$$$": "upscale", "$$$$": "fine dining"}
+# Words that don't change the answer beyond what the key captures
+FILLER = set("""
+    a an the some any good great best top nice popular restaurant restaurants place places spot spots food meal eats
+    dining dinner lunch brunch eat eating in at near around downtown central centre center city area for with and
+    of to me i im we looking want find recommend recommendation suggest please cuisine price range location party
+    size people person persons guests rated rating ratings highly above over at least stars star
+""".split())
+
+_PRICE_SIGNS = re.compile(r"\${1,4}")
+# A rating threshold or a party size narrows the answer beyond what the key captures
+_NUMBER = re.compile(r"^(\d+|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|dozen)$")
+
+QueryKey = namedtuple("QueryKey", "place city cuisine price options")
+
+
+def _take_phrases(words, phrases):
+    """Remove known (one- or two-word) phrases from ``words``; returns the ones found."""
+    found, rest, i = [], [], 0
+    while i < len(words):
+        pair = " ".join(words[i:i + 2])
+        if i + 1 < len(words) and pair in phrases:
+            found.append(pair)
+            i += 2
+        elif words[i] in phrases:
+            found.append(words[i])
+            i += 1
+        else:
+            rest.append(words[i])
+            i += 1
+    return found, rest
+
+
+def query_key(text, **options):
+    """
+    The materialization key for a request, or None if it isn't one a
+    precomputed answer covers (no place, several cuisines, a numeric
+    constraint such as a rating threshold or party size, or other wishes).
+    ``options`` are the crew's other inputs, e.g. include_weather=True.
+    """
+    matches = gazetteer().find_all(text)
+    places = {match.place for match in matches}
+    if len(places) != 1:
+        return None
+    place = places.pop()
+
+    normalized = normalize(text)
+    for match in sorted(matches, key=lambda match: match.start, reverse=True):
+        normalized = normalized[:match.start] + " " + normalized[match.end:]
+    words = normalized.split()
+    prices, words = _take_phrases(words, PRICE_WORDS)
+    cuisines, words = _take_phrases(words, CUISINES)
+    if any(word not in FILLER or _NUMBER.match(word) for word in words):
+        return None
+
+    bands = {PRICE_WORDS[word] for word in prices} | set(_PRICE_SIGNS.findall(text))
+    if len(bands) > 1 or len(set(cuisines)) > 1:
+        return None
+    return QueryKey(
+        place=place.name,
+        city=gazetteer().city_of(place).name,
+        cuisine=cuisines[0] if cuisines else None,
+        price=bands.pop() if bands else None,
+        options=tuple(sorted(options.items())),
+    )
+
+
+def canonical_preference(key):
+    """The request text a materialized entry is computed for."""
+    words = ["Top-rated"]
+    if key.price:
+        words.append(PRICE_PHRASES[key.price])
+    if key.cuisine:
+        words.append(key.cuisine.title())
+    return f"{' '.join(words)} restaurant in {key.place}"
+
+
+class _Entry:
+    __slots__ = ("value", "tags", "condition", "computed_at")
+
+    def __init__(self, value, tags, condition, computed_at):
+        self.value = value
+        self.tags = frozenset(tags)
+        self.condition = condition
+        self.computed_at = computed_at
+
+
+class MaterializedRecommendations:
+    """
+    Precomputed answers for hot keys. ``compute(key)`` returns ``(answer,
+    tags)`` (tags such as ``("venue", name)``); ``condition(city)`` returns the
+    weather condition entries for that city depend on.
+    """
+
+    def __init__(self, compute, condition=None, hot_size=HOT_SIZE, min_hits=MIN_HITS, max_age=MAX_AGE,
+                 clock=time.time):
+        self.compute = compute
+        self.condition = condition
+        self.hot_size = hot_size
+        self.min_hits = min_hits
+        self.max_age = max_age
+        self.clock = clock
+        self._entries = {}
+        self._popularity = {}
+        # Invalidations are numbered; ``_invalidated`` has the latest one per tag, ``_conditions``
+        # the latest condition seen per city, so a compute that overlaps a change can be discarded
+        self._generation = 0
+        self._invalidated = {}
+        self._conditions = {}
+        self._computing = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def get(self, key):
+        """The materialized answer for ``key`` (None on a miss); counts the request towards popularity."""
+        if key is None or not ENABLED:
+            return None
+        with self._lock:
+            self._popularity[key] = self._popularity.get(key, 0.0) + 1
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry.computed_at > self.max_age:
+                entry = None
+        metrics.inc("materialized_lookups_total", result="hit" if entry else "miss")
+        return entry.value if entry else None
+
+    def hot_keys(self):
+        with self._lock:
+            ranked = sorted(self._popularity.items(), key=lambda item: item[1], reverse=True)
+        return [key for key, count in ranked[:self.hot_size] if count >= self.min_hits]
+
+    def _bump(self, tags):
+        """Record an invalidation of ``tags`` (under the lock)."""
+        self._generation += 1
+        for tag in tags:
+            self._invalidated[tag] = self._generation
+
+    def _drop(self, keys, reason):
+        for key in keys:
+            del self._entries[key]
+        if keys:
+            metrics.inc("materialized_invalidations_total", len(keys), reason=reason)
+        metrics.set("materialized_entries", len(self._entries))
+        return len(keys)
+
+    def invalidate(self, tags, reason="data"):
+        """Drop the entries tagged with any of ``tags``; returns the count."""
+        tags = set(tags)
+        with self._lock:
+            self._bump(tags)
+            return self._drop([key for key, entry in self._entries.items() if entry.tags & tags], reason)
+
+    def check_conditions(self):
+        """Drop the entries of cities whose weather condition changed since they were computed."""
+        if self.condition is None:
+            return 0
+        with self._lock:
+            cities = {key.city for key in self._entries} | self._computing
+        current = {}
+        for city in cities:
+            try:
+                current[city] = self.condition(city)
+            except Exception:
+                crew_log.exception("Weather condition check failed for %s", city)
+        with self._lock:
+            changed = {city for city, condition in current.items()
+                       if self._conditions.get(city, condition) != condition}
+            self._conditions.update(current)
+            self._bump({("city", city) for city in changed})
+            stale = [key for key, entry in self._entries.items()
+                     if key.city in current and entry.condition != current[key.city]]
+            return self._drop(stale, "weather")
+
+    def refresh(self):
+        """Recompute the hot keys that are missing or too old, most popular first; returns the count."""
+        self.check_conditions()
+        refreshed = 0
+        hot = self.hot_keys()
+        for key in hot:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry.computed_at <= self.max_age:
+                continue
+            try:
+                condition = self.condition(key.city) if self.condition else None
+                with self._lock:
+                    if self.condition is not None:
+                        self._conditions[key.city] = condition
+                    started = self._generation
+                    self._computing.add(key.city)
+                try:
+                    value, tags = self.compute(key)
+                finally:
+                    with self._lock:
+                        self._computing.discard(key.city)
+            except Exception:
+                crew_log.exception("Could not materialize %s", canonical_preference(key))
+                continue
+            tags = set(tags) | {("city", key.city)}
+            with self._lock:
+                if any(self._invalidated.get(tag, 0) > started for tag in tags):
+                    # Invalidated while it was being computed; the next refresh tries again
+                    metrics.inc("materialized_discarded_total")
+                    continue
+                self._entries[key] = _Entry(value, tags, condition, self.clock())
+            refreshed += 1
+            metrics.inc("materialized_refreshes_total")
+
+        with self._lock:
+            # Keep only the hot set, and let popularity decay
+            self._drop([key for key in self._entries if key not in hot], "cold")
+            self._popularity = {key: count * DECAY for key, count in self._popularity.items() if count * DECAY >= 0.1}
+        return refreshed
+
+    def start(self, interval=INTERVAL):
+        """Refresh every ``interval`` seconds in a daemon thread (once per process)."""
+        if self._thread is not None or not ENABLED:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    crew_log.exception("Materialized recommendations refresh failed")
+
+        self._thread = threading.Thread(target=run, name="materializer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __len__(self):
+        return len(self._entries)
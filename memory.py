@@ -0,0 +1,264 @@
+"""
+Memory growth tracking and leak detection for the long-running app servers.
+
+``track_request`` wraps ``run_crew`` / ``get_recommendation`` and records the
+change in RSS (and, with MEMORY_TRACE=1, in tracemalloc-traced bytes) over the
+request in ``metrics``. RSS is process-wide, so with concurrent requests the
+deltas overlap; the per-request histogram still shows which requests grow the
+heap and the gauges show the trend.
+
+Objects a request creates (its crew, tasks and results) are registered with
+``watch``. They should be garbage once the request is over; the monitor checks
+a little later and reports the ones still alive as survivors
+(memory_survivors_total per kind, and ``report()``), which points at whatever
+keeps them: typically the module-level agents. ``reset_agent_state`` clears
+the per-request state those agents carry between runs (conversation memory,
+tool cache, last used tool); the crews run with ``agents_in_use`` so the
+reset happens only once no other concurrent request is using an agent.
+
+``monitor.start()`` (a warm-up step) runs in a daemon thread every
+MEMORY_INTERVAL seconds: it updates the RSS / traced / gc gauges, checks
+survivors and, when tracing, diffs tracemalloc snapshots and keeps the top
+growing allocation sites. ``python memory.py`` prints a report.
+
+Settings: MEMORY_TRACE (0; 1 starts tracemalloc, which costs CPU and memory),
+MEMORY_TRACE_FRAMES (10), MEMORY_INTERVAL (300 seconds), MEMORY_TOP_SITES (10)
+and MEMORY_WARN_MB (50: requests growing RSS by more are logged).
+"""
+
+import gc
+import os
+import resource
+import threading
+import time
+import tracemalloc
+import weakref
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from crew_logging import crew_log
+from metrics import metrics
+from request_context import current_request_id
+
+TRACE = os.environ.get("MEMORY_TRACE", "0") == "1"
+TRACE_FRAMES = int(os.environ.get("MEMORY_TRACE_FRAMES", "10"))
+INTERVAL = float(os.environ.get("MEMORY_INTERVAL", "300"))
+TOP_SITES = int(os.environ.get("MEMORY_TOP_SITES", "10"))
+WARN_BYTES = float(os.environ.get("MEMORY_WARN_MB", "50")) * 1024 * 1024
+
+# Seconds after its request ends before a watched object counts as a survivor
+SURVIVOR_GRACE = 5.0
+
+_BYTE_BUCKETS = tuple(2 ** power for power in range(16, 31, 2))  # 64 KB .. 1 GB
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def _traced_bytes():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+class _Watched:
+    __slots__ = ("ref", "kind", "request_id", "ended_at")
+
+    def __init__(self, ref, kind, request_id):
+        self.ref = ref
+        self.kind = kind
+        self.request_id = request_id
+        self.ended_at = None
+
+
+class MemoryMonitor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._watched = []
+        self._snapshot = None
+        self._thread = None
+        self.survivors = deque(maxlen=100)  # (kind, request_id, type name)
+        self.growth = []  # Top allocation sites by growth since the previous snapshot
+        self.unwatchable = Counter()
+
+    # -- per request ----------------------------------------------------
+
+    def watch(self, obj, kind):
+        """Expect ``obj`` to be garbage after the current request."""
+        try:
+            ref = weakref.ref(obj)
+        except TypeError:  # str results, pydantic models without __weakref__
+            self.unwatchable[kind] += 1
+            return
+        with self._lock:
+            self._watched.append(_Watched(ref, kind, current_request_id()))
+
+    def _request_ended(self, request_id):
+        now = time.monotonic()
+        with self._lock:
+            for watched in self._watched:
+                if watched.request_id == request_id and watched.ended_at is None:
+                    watched.ended_at = now
+
+    @contextmanager
+    def track_request(self, name):
+        request_id = current_request_id()
+        rss_before, traced_before = rss_bytes(), _traced_bytes()
+        try:
+            yield
+        finally:
+            self._request_ended(request_id)
+            rss_delta = rss_bytes() - rss_before
+            metrics.observe("memory_request_rss_delta_bytes", rss_delta, buckets=_BYTE_BUCKETS, operation=name)
+            if tracemalloc.is_tracing():
+                metrics.observe("memory_request_traced_delta_bytes", _traced_bytes() - traced_before,
+                                buckets=_BYTE_BUCKETS, operation=name)
+            if rss_delta > WARN_BYTES:
+                crew_log.warning("RSS grew by %.1f MB during %s", rss_delta / 2 ** 20, name)
+
+    # -- periodic checks ------------------------------------------------
+
+    def check_survivors(self):
+        """Report watched objects still alive SURVIVOR_GRACE seconds after their request; returns them."""
+        gc.collect()
+        now = time.monotonic()
+        found, keep = [], []
+        with self._lock:
+            for watched in self._watched:
+                obj = watched.ref()
+                if obj is None:
+                    continue
+                if watched.ended_at is not None and now - watched.ended_at >= SURVIVOR_GRACE:
+                    found.append((watched.kind, watched.request_id, type(obj).__name__))
+                    continue  # Reported once
+                keep.append(watched)
+            self._watched = keep
+        for kind, request_id, type_name in found:
+            metrics.inc("memory_survivors_total", kind=kind)
+            crew_log.warning("%s %s from request %s is still alive after the request", kind, type_name, request_id)
+        self.survivors.extend(found)
+        return found
+
+    def diff_allocations(self):
+        """Top allocation sites by growth since the previous call (tracing only)."""
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        previous, self._snapshot = self._snapshot, snapshot
+        if previous is None:
+            return []
+        self.growth = [
+            {"site": str(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff,
+             "size": stat.size}
+            for stat in snapshot.compare_to(previous, "lineno")[:TOP_SITES]
+            if stat.size_diff > 0
+        ]
+        return self.growth
+
+    def sample(self):
+        metrics.set("memory_rss_bytes", rss_bytes())
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            metrics.set("memory_traced_bytes", current)
+            metrics.set("memory_traced_peak_bytes", peak)
+        metrics.set("memory_gc_objects", len(gc.get_objects()))
+        self.check_survivors()
+        self.diff_allocations()
+
+    def start(self, interval=INTERVAL):
+        """Start tracing (if MEMORY_TRACE) and the periodic checks, once per process."""
+        if self._thread is not None:
+            return
+        if TRACE and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+        def run():
+            while True:
+                try:
+                    self.sample()
+                except Exception:
+                    crew_log.exception("Memory monitor check failed")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name="memory-monitor", daemon=True)
+        self._thread.start()
+        return f"every {interval:.0f}s, tracemalloc {'on' if tracemalloc.is_tracing() else 'off'}"
+
+    def report(self):
+        return {
+            "rss_mb": round(rss_bytes() / 2 ** 20, 1),
+            "traced_mb": round(_traced_bytes() / 2 ** 20, 1),
+            "watched": len(self._watched),
+            "survivors": [{"kind": kind, "request_id": request_id, "type": type_name}
+                          for kind, request_id, type_name in self.survivors],
+            "top_growth": self.growth,
+        }
+
+
+monitor = MemoryMonitor()
+watch = monitor.watch
+track_request = monitor.track_request
+
+
+_agents_in_flight = Counter()  # id(agent) -> requests currently running with it
+_agents_lock = threading.Lock()
+
+
+@contextmanager
+def agents_in_use(agents):
+    """
+    Mark ``agents`` as used by the current request. When the last request
+    using an agent finishes, its state is reset (``reset_agent_state``), so a
+    request never clears memory or caches another one is still relying on.
+    """
+    agents = list({id(agent): agent for agent in agents}.values())
+    with _agents_lock:
+        for agent in agents:
+            _agents_in_flight[id(agent)] += 1
+    try:
+        yield
+    finally:
+        with _agents_lock:
+            idle = []
+            for agent in agents:
+                _agents_in_flight[id(agent)] -= 1
+                if not _agents_in_flight[id(agent)]:
+                    del _agents_in_flight[id(agent)]
+                    idle.append(agent)
+            # Under the lock, so a request starting now can't pick up an agent mid-reset
+            reset_agent_state(idle)
+
+
+def reset_agent_state(agents):
+    """
+    Clear the state module-level agents carry from one request to the next:
+    conversation memory, the tool result cache and the last used tool.
+    """
+    for agent in agents:
+        executor = getattr(agent, "agent_executor", None)
+        for memory in (getattr(agent, "memory", None), getattr(executor, "memory", None)):
+            if hasattr(memory, "clear"):
+                memory.clear()
+        cache = getattr(getattr(agent, "cache_handler", None), "_cache", None)
+        if isinstance(cache, dict):
+            cache.clear()
+        tools_handler = getattr(agent, "tools_handler", None)
+        if tools_handler is not None and hasattr(tools_handler, "last_used_tool"):
+            tools_handler.last_used_tool = {}
+
+
+if __name__ == "__main__":
+    import json
+
+    monitor.sample()
+    print(json.dumps(monitor.report(), indent=2))
@@ -0,0 +1,121 @@
+"""
+Minimal in-process metrics registry shared by both crews.
+
+Counters, gauges and histograms are keyed by name plus a small set of labels.
+``snapshot()`` returns plain dicts for the Streamlit debug views and
+``render_prometheus()`` produces the Prometheus text format for scraping.
+"""
+
+import threading
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Approximate quantile: the upper bound of the bucket containing it."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(tuple(buckets))
+            histogram.observe(value)
+
+    def get(self, name, **labels):
+        """Current value of a counter or gauge (0 if never set)."""
+        key = _key(name, labels)
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def quantile(self, name, q, **labels):
+        with self._lock:
+            histogram = self._histograms.get(_key(name, labels))
+            return histogram.quantile(q) if histogram else 0.0
+
+    def snapshot(self):
+        def label_str(labels):
+            return ",".join(f"{k}={v}" for k, v in labels)
+
+        with self._lock:
+            return {
+                "counters": {f"{n}{{{label_str(l)}}}": v for (n, l), v in self._counters.items()},
+                "gauges": {f"{n}{{{label_str(l)}}}": v for (n, l), v in self._gauges.items()},
+                "histograms": {
+                    f"{n}{{{label_str(l)}}}": {"count": h.count, "sum": h.sum, "p50": h.quantile(0.5),
+                                               "p99": h.quantile(0.99)}
+                    for (n, l), h in self._histograms.items()
+                },
+            }
+
+    def render_prometheus(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"{name}{fmt(labels)} {value}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                lines.append(f"{name}{fmt(labels)} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else bound
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_count{fmt(labels)} {histogram.count}")
+                lines.append(f"{name}_sum{fmt(labels)} {histogram.sum}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry
+metrics = MetricsRegistry()
@@ -0,0 +1,255 @@
+"""
+Per-agent model routing for both crews.
+
+Agents get a ``RoutedModel`` instead of one shared LLM client. Each agent role
+maps to a model tier (small, medium, large) and every call is delegated to the
+client for the tier chosen at call time:
+
+  - the role's tier (the crews' ROLE_TIERS, overridable per role with
+    MODEL_TIER_<ROLE>, e.g. MODEL_TIER_RESEARCHER=medium),
+  - routing rules, applied in order; ``busy_rule`` routes to the small tier
+    while more than MODEL_ROUTING_BUSY_QUEUE requests wait in the scheduler,
+  - escalation: a reply the agent's output parser would reject is retried one
+    tier up, and the role stays on that tier for the rest of the request.
+
+Agents reply in JSON mode unless STRUCTURED_OUTPUT is off (see
+structured_output.py): the prompt asks for a JSON object, the backend is
+constrained to JSON, and the validated reply is handed to the agent as ReAct
+text.
+
+Calls are checked against the run's budget first (see budgets.py); an agent
+over budget gets a forced final answer instead.
+
+Calls, latency, prompt/completion tokens (as reported by the backend), parse
+failures (by mode: json or text), CrewAI's format-retry rounds, escalations
+and busy downgrades are recorded per role and model in ``metrics``; call latency and errors also feed the degradation controller.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.runnables import Runnable
+except ImportError:  # older LangChain releases
+    from langchain.callbacks.base import BaseCallbackHandler
+    from langchain.schema.runnable import Runnable
+
+from budgets import current_budget, fallback_answer, forced_prompt
+from degradation import controller as degradation
+from metrics import metrics
+from request_context import current_request_id
+from scheduler import scheduler
+from structured_output import (
+    is_format_retry, json_mode, json_prompt, parse_agent_reply, structured_enabled, tool_names, with_text,
+)
+
+TIERS = ("small", "medium", "large")
+
+BUSY_QUEUE = int(os.environ.get("MODEL_ROUTING_BUSY_QUEUE", "4"))
+
+# What CrewAI's ReAct output parser accepts: a tool call or a final answer
+_ACTION = re.compile(r"Action\s*\d*\s*:.*?Action\s*\d*\s*Input\s*\d*\s*:", re.DOTALL)
+_FINAL_ANSWER = "Final Answer:"
+
+
+def react_output_ok(text):
+    """Whether an agent reply can be parsed as a tool call or a final answer."""
+    return _FINAL_ANSWER in text or bool(_ACTION.search(text))
+
+
+def tier_models(prefix, defaults):
+    """Model name per tier, each overridable with <PREFIX>_<TIER> (e.g. OPENAI_MODEL_SMALL)."""
+    return {tier: os.environ.get(f"{prefix}_{tier.upper()}", defaults[tier]) for tier in TIERS}
+
+
+def tier_clients(models, factory):
+    """One client per tier; tiers naming the same model share a client."""
+    clients = {}
+    return {tier: clients.setdefault(name, factory(name)) for tier, name in models.items()}
+
+
+def role_tier(role, default):
+    tier = os.environ.get(f"MODEL_TIER_{role.upper()}", default)
+    if tier not in TIERS:
+        raise ValueError(f"MODEL_TIER_{role.upper()}={tier!r}; use one of {', '.join(TIERS)}")
+    return tier
+
+
+def busy_rule(threshold=BUSY_QUEUE):
+    """Route to the small tier while more than ``threshold`` requests wait for a scheduler slot (0 disables)."""
+
+    def rule(role, tier):
+        if not threshold or tier == "small":
+            return tier
+        waiting = sum(entry["waiting"] for entry in scheduler.stats().values())
+        if waiting <= threshold:
+            return tier
+        metrics.inc("model_busy_downgrades_total", role=role, from_tier=tier)
+        return "small"
+
+    return rule
+
+
+DEFAULT_RULES = (busy_rule(),)
+
+
+class _Escalations:
+    """Tier each role was escalated to in a request (bounded to the most recent requests)."""
+
+    def __init__(self, max_requests=256):
+        self.max_requests = max_requests
+        self._tiers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, role):
+        request_id = current_request_id()
+        with self._lock:
+            return self._tiers.get((request_id, role)) if request_id else None
+
+    def set(self, role, tier):
+        request_id = current_request_id()
+        if request_id is None:
+            return
+        with self._lock:
+            self._tiers[(request_id, role)] = tier
+            while len(self._tiers) > self.max_requests:
+                self._tiers.popitem(last=False)
+
+
+_escalations = _Escalations()
+
+
+class _UsageHandler(BaseCallbackHandler):
+    """Picks the token counts out of an OpenAI or Ollama response."""
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage")
+        if usage:
+            self.prompt_tokens = usage.get("prompt_tokens", 0)
+            self.completion_tokens = usage.get("completion_tokens", 0)
+            return
+        for generations in response.generations:
+            for generation in generations:
+                info = generation.generation_info or {}
+                self.prompt_tokens += info.get("prompt_eval_count", 0)
+                self.completion_tokens += info.get("eval_count", 0)
+
+
+def _with_handler(config, handler):
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        config["callbacks"] = [handler]
+    elif isinstance(callbacks, list):
+        config["callbacks"] = callbacks + [handler]
+    else:  # a callback manager
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler)
+        config["callbacks"] = callbacks
+    return config
+
+
+class RoutedModel(Runnable):
+    """
+    LLM for one agent role that picks a client per call (see module docstring).
+    Agents bind stop words to it like to any LangChain model.
+    """
+
+    def __init__(self, role, clients, tier="medium", rules=DEFAULT_RULES, validate=react_output_ok, structured=None):
+        self.role = role
+        self.clients = clients
+        self.tier = role_tier(role, tier)
+        self.rules = rules
+        self.validate = validate
+        # JSON-mode replies only make sense for agents, whose replies are validated
+        self.structured = validate is not None and (structured_enabled(role) if structured is None else structured)
+
+    @property
+    def model_name(self):
+        return _model_name(self.clients[self.tier])
+
+    def select_tier(self):
+        tier = self.tier
+        for rule in self.rules:
+            tier = rule(self.role, tier)
+        escalated = _escalations.get(self.role)
+        if escalated is not None and TIERS.index(escalated) > TIERS.index(tier):
+            tier = escalated
+        return tier
+
+    def invoke(self, input, config=None, **kwargs):
+        budget = current_budget()
+        limit = budget.before_llm(self.role) if budget is not None else None
+        if limit is not None:
+            return self._forced_answer(budget, input, config, limit, **kwargs)
+        if self.validate is not None and is_format_retry(input):
+            metrics.inc("model_format_retries_total", role=self.role)
+        prompt = json_prompt(input) if self.structured else input
+        tools = tool_names(input) if self.structured else ()
+        tier = self.select_tier()
+        while True:
+            client = self.clients[tier]
+            if self.structured:
+                result = self._call(client, prompt, config, **dict(kwargs, **json_mode(client)))
+                raw = getattr(result, "content", result)
+                text = parse_agent_reply(raw, tools)
+                if text is not None:
+                    return with_text(result, text)
+                if react_output_ok(raw):  # Answered in ReAct text despite the instructions
+                    return result
+            else:
+                result = self._call(client, input, config, **kwargs)
+                if self.validate is None or self.validate(getattr(result, "content", result)):
+                    return result
+            metrics.inc("model_parse_failures_total", role=self.role, model=_model_name(client),
+                        mode="json" if self.structured else "text")
+            larger = next((t for t in TIERS[TIERS.index(tier) + 1:] if self.clients[t] is not client), None)
+            if larger is None:
+                # Nothing larger to try; the agent's own parser asks the model to fix its format
+                return result
+            metrics.inc("model_escalations_total", role=self.role, from_tier=tier, to_tier=larger)
+            _escalations.set(self.role, larger)
+            tier = larger
+
+    def _forced_answer(self, budget, input, config, limit, **kwargs):
+        """One last generation told to answer now; without a model call once time or tokens are gone."""
+        metrics.inc("budget_forced_answers_total", role=self.role)
+        if limit in ("time", "tokens") or self.role in budget.forced:
+            return fallback_answer(input)
+        budget.forced.add(self.role)
+        result = self._call(self.clients[self.select_tier()], forced_prompt(input, limit), config, **kwargs)
+        text = getattr(result, "content", result)
+        return text if react_output_ok(text) else f"Final Answer: {text}"
+
+    def _call(self, client, input, config, **kwargs):
+        model = _model_name(client)
+        usage = _UsageHandler()
+        start = time.perf_counter()
+        try:
+            result = client.invoke(input, _with_handler(config, usage), **kwargs)
+        except Exception:
+            metrics.inc("model_errors_total", role=self.role, model=model)
+            degradation.observe_llm(time.perf_counter() - start, ok=False)
+            raise
+        elapsed = time.perf_counter() - start
+        degradation.observe_llm(elapsed)
+        metrics.observe("model_call_seconds", elapsed, role=self.role, model=model)
+        metrics.inc("model_calls_total", role=self.role, model=model)
+        metrics.inc("model_prompt_tokens_total", usage.prompt_tokens, role=self.role, model=model)
+        metrics.inc("model_completion_tokens_total", usage.completion_tokens, role=self.role, model=model)
+        budget = current_budget()
+        if budget is not None:
+            budget.record_llm(self.role, usage.prompt_tokens + usage.completion_tokens)
+        return result
+
+
+def _model_name(client):
+    return getattr(client, "model_name", None) or getattr(client, "model", None) or type(client).__name__
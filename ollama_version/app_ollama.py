@@ -4,13 +4,50 @@ Features: Weather, Peak Time, Address, Dietary Restrictions, Ambiance
 """
 
 import streamlit as st
-import sys
-from pathlib import Path
 
-# Add parent directory to path to import crew_ollama
-sys.path.insert(0, str(Path(__file__).parent))
-
-from crew_ollama import get_recommendation
+# Streamlit puts this script's directory on sys.path, so crew_ollama imports directly
+from crew_ollama import get_recommendation, warmup_steps
+from gazetteer import gazetteer  # Repository root, put on sys.path by crew_ollama
+from crew_logging import request_log
+from memory import monitor as memory_monitor
+from profiling import header_requests_profile, recent_profiles
+from request_context import new_request_id, request_scope
+from streamlit_support import fragment, set_state
+from warmup import start_warmup, status as warmup_status, wait_until_warm
+
+
+@st.cache_resource(show_spinner=False)
+def start_crew():
+    """Load the model and prime caches once per process (a no-op when serve.py has already started it)."""
+    start_warmup(warmup_steps)
+    return warmup_status
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def place_labels(query):
+    """Gazetteer autocompletion for the location field, cached across sessions."""
+    return [place.label for place in gazetteer().complete(query)] if query.strip() else []
+
+
+# Form values loaded by the example and clear buttons
+EXAMPLE_VALUES = {
+    "preferences": "A vegan-friendly restaurant in San Francisco with a view, suitable for a business dinner",
+    "location": "San Francisco",
+    "dietary": ["Vegan"],
+    "ambiance": ["Business", "Romantic"],
+    "cuisine": "Contemporary",
+    "price": "$$$",
+    "party_size": 2,
+}
+CLEAR_VALUES = {
+    "preferences": "",
+    "location": "San Francisco",
+    "dietary": ["None"],
+    "ambiance": ["Casual"],
+    "cuisine": "",
+    "price": "Any",
+    "party_size": 2,
+}
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -23,6 +60,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+start_crew()
+
 # ============================================================================
 # CUSTOM CSS
 # ============================================================================
@@ -75,6 +114,22 @@ st.markdown("""
 # SIDEBAR CONFIGURATION
 # ============================================================================
 
+@fragment
+def debug_panel():
+    """Profiling toggle and memory report; toggling reruns only this panel."""
+    st.checkbox(
+        "Profile requests",
+        value=False,
+        key="profile_requests",
+        help="Record a sampling profile (collapsed stacks and speedscope) of each recommendation."
+    )
+    for trace_path in reversed(recent_profiles):
+        st.code(trace_path, language=None)
+    # The report walks the allocation snapshot, so only build it when asked for
+    if st.checkbox("Show memory report", value=False, key="show_memory"):
+        st.json(memory_monitor.report())
+
+
 with st.sidebar:
     st.markdown("### 🔧 System Information")
     st.info("""
@@ -131,6 +186,11 @@ with st.sidebar:
     
     st.markdown("---")
     
+    st.markdown("### 🐞 Debug")
+    debug_panel()
+    
+    st.markdown("---")
+    
     st.markdown("### ⚙️ Configuration")
     st.write("**Model:** Neural Chat 7B (Ollama)")
     st.write("**Instance Type:** AWS g5.xlarge")
@@ -163,213 +223,264 @@ Welcome to the enhanced Ollama-powered restaurant recommendation system! This ap
 # INPUT FORM
 # ============================================================================
 
+# Editing a field inside the form doesn't rerun the app; only submitting does
+for state_key, default in CLEAR_VALUES.items():
+    st.session_state.setdefault(state_key, default)
+
 st.markdown("### 🔍 Tell Us Your Preferences")
 
-col1, col2 = st.columns(2)
+col_button1, col_button2 = st.columns(2)
 
-with col1:
-    # Main preferences
-    st.markdown("**Basic Preferences**")
-    
-    user_preferences = st.text_area(
-        "What are you looking for in a restaurant?",
-        placeholder="e.g., 'An affordable restaurant in San Francisco with a rating above 4.0 close to the waterfront'",
-        height=100,
-        key="preferences"
-    )
-    
-    location = st.selectbox(
-        "Preferred Location",
-        ["San Francisco", "Berlin", "Tokyo", "Other"],
-        key="location"
-    )
-    
-    if location == "Other":
-        location = st.text_input("Enter your preferred location:")
-
-with col2:
-    # Enhanced preferences
-    st.markdown("**Enhanced Preferences**")
-    
-    dietary_restrictions = st.multiselect(
-        "Dietary Restrictions",
-        ["None", "Vegan", "Vegetarian", "Gluten-Free", "Pescatarian", "Halal", "Kosher"],
-        default=["None"],
-        key="dietary"
-    )
-    
-    # Convert to string
-    if "None" in dietary_restrictions or len(dietary_restrictions) == 0:
-        dietary_str = "No restrictions"
-    else:
-        dietary_str = ", ".join(dietary_restrictions)
-    
-    ambiance_preference = st.multiselect(
-        "Desired Ambiance",
-        ["Casual", "Romantic", "Fine Dining", "Business", "Family-Friendly", "Trendy", "Traditional", "Upscale"],
-        default=["Casual"],
-        key="ambiance"
+# Callbacks set the fields before the next run, so one click is one rerun
+with col_button1:
+    st.button(
+        "🔄 Clear Form",
+        use_container_width=True,
+        on_click=set_state,
+        kwargs=dict(CLEAR_VALUES, result=None)
     )
-    
-    # Convert to string
-    ambiance_str = ", ".join(ambiance_preference) if ambiance_preference else "Casual"
 
-# Additional preferences
-st.markdown("**Additional Considerations**")
-
-col3, col4, col5 = st.columns(3)
-
-with col3:
-    cuisine_preference = st.text_input(
-        "Preferred Cuisine (optional)",
-        placeholder="e.g., Italian, Asian, Mediterranean",
-        key="cuisine"
+with col_button2:
+    st.button(
+        "📋 Load Example",
+        use_container_width=True,
+        on_click=set_state,
+        kwargs=EXAMPLE_VALUES
     )
 
-with col4:
-    price_range = st.selectbox(
-        "Price Range",
-        ["Any", "$", "$$", "$$$", "$$$$"],
-        key="price"
-    )
 
-with col5:
-    party_size = st.number_input(
-        "Party Size",
-        min_value=1,
-        max_value=20,
-        value=2,
-        key="party_size"
+@fragment
+def location_picker():
+    """Location field with autocompletion from the offline gazetteer; typing reruns only this part."""
+    location = st.text_input(
+        "Preferred Location",
+        placeholder="Start typing a city or neighborhood, e.g. 'Kreu'",
+        key="location"
     )
+    suggestions = place_labels(location)
+    if suggestions:
+        st.selectbox("Matching places", suggestions, key="location_match")
 
-# ============================================================================
-# SUBMISSION AND PROCESSING
-# ============================================================================
 
-st.markdown("---")
+def chosen_location():
+    """The autocompleted place if one matches the location field, else the field as typed."""
+    location = st.session_state.get("location", "")
+    match = st.session_state.get("location_match")
+    return match if match in place_labels(location) else location
 
-col_button1, col_button2, col_button3 = st.columns([1, 1, 1])
 
-with col_button1:
-    submit_button = st.button(
-        "🚀 Get Recommendation",
-        use_container_width=True,
-        type="primary"
-    )
+location_picker()
 
-with col_button2:
-    clear_button = st.button(
-        "🔄 Clear Form",
-        use_container_width=True
-    )
 
-with col_button3:
-    example_button = st.button(
-        "📋 Load Example",
-        use_container_width=True
-    )
-
-# Handle example button
-if example_button:
-    st.session_state.preferences = "A vegan-friendly restaurant in San Francisco with a view, suitable for a business dinner"
-    st.session_state.location = "San Francisco"
-    st.session_state.dietary = ["Vegan"]
-    st.session_state.ambiance = ["Business", "Romantic"]
-    st.session_state.cuisine = "Contemporary"
-    st.session_state.price = "$$$"
-    st.session_state.party_size = 2
-    st.rerun()
-
-# Handle clear button
-if clear_button:
-    st.session_state.preferences = ""
-    st.session_state.location = "San Francisco"
-    st.session_state.dietary = ["None"]
-    st.session_state.ambiance = ["Casual"]
-    st.session_state.cuisine = ""
-    st.session_state.price = "Any"
-    st.session_state.party_size = 2
-    st.rerun()
-
-# ============================================================================
-# RECOMMENDATION PROCESSING
-# ============================================================================
-
-if submit_button:
-    if not user_preferences.strip():
-        st.error("❌ Please enter your dining preferences!")
+def recommend(preferences):
+    """Run the crew for the submitted form; returns the result kept in session state."""
+    dietary = preferences["dietary"]
+    # Convert to string
+    if "None" in dietary or len(dietary) == 0:
+        dietary_str = "No restrictions"
     else:
-        # Build full preference string
-        full_preferences = f"{user_preferences}"
-        if cuisine_preference:
-            full_preferences += f", Cuisine: {cuisine_preference}"
-        if price_range != "Any":
-            full_preferences += f", Price: {price_range}"
-        full_preferences += f", Party size: {party_size}"
+        dietary_str = ", ".join(dietary)
+    ambiance_str = ", ".join(preferences["ambiance"]) if preferences["ambiance"] else "Casual"
+    location = preferences["location"]
+    
+    # Build full preference string
+    full_preferences = f"{preferences['text']}"
+    if preferences["cuisine"]:
+        full_preferences += f", Cuisine: {preferences['cuisine']}"
+    if preferences["price"] != "Any":
+        full_preferences += f", Price: {preferences['price']}"
+    full_preferences += f", Party size: {preferences['party_size']}"
+    if location.strip():
         full_preferences += f", Location: {location}"
+    
+    result = {
+        "request_id": new_request_id(),
+        "recommendation": None,
+        "error": None,
+        "location": location,
+        "dietary": dietary_str,
+        "ambiance": ambiance_str,
+        "cuisine": preferences["cuisine"] or "Any",
+        "price": preferences["price"],
+        "party_size": preferences["party_size"],
+    }
+    if not warmup_status.done.is_set():
+        with st.spinner("⏳ Loading the model..."):
+            wait_until_warm(timeout=600)
+    
+    # Show processing status
+    status = st.empty()
+    with st.spinner("🤖 Agents are collaborating to find your perfect restaurant..."):
+        status.markdown("""
+        <div class="info-box">
+        <strong>Processing:</strong>
+        <br>🔍 Researcher is searching for options...
+        <br>📊 Analyst is evaluating preferences...
+        <br>✍️ Generator is crafting your recommendation...
+        </div>
+        """, unsafe_allow_html=True)
         
-        # Show processing status
-        with st.spinner("🤖 Agents are collaborating to find your perfect restaurant..."):
-            st.markdown("""
-            <div class="info-box">
-            <strong>Processing:</strong>
-            <br>🔍 Researcher is searching for options...
-            <br>📊 Analyst is evaluating preferences...
-            <br>✍️ Generator is crafting your recommendation...
-            </div>
-            """, unsafe_allow_html=True)
-            
-            try:
-                # Get recommendation from crew
-                recommendation = get_recommendation(
+        try:
+            # Get recommendation from crew
+            # Profile when toggled on or asked for with the X-Profile header; otherwise sample at PROFILE_SAMPLE_RATE
+            headers = getattr(getattr(st, "context", None), "headers", None)
+            profile = True if st.session_state.get("profile_requests") or header_requests_profile(headers) else None
+            with request_scope(result["request_id"]):
+                result["recommendation"] = get_recommendation(
                     user_preferences=full_preferences,
                     dietary_restrictions=dietary_str,
-                    ambiance_preference=ambiance_str
+                    ambiance_preference=ambiance_str,
+                    profile=profile,
+                    tenant=st.session_state.setdefault("tenant", new_request_id())
                 )
-                
-                # Display recommendation
-                st.markdown("""
-                <div class="success-box">
-                <strong>✅ Recommendation Complete!</strong>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                st.markdown("""
-                <div class="recommendation-box">
-                """, unsafe_allow_html=True)
-                
-                st.markdown("### 🏆 Your Personalized Restaurant Recommendation")
-                st.markdown(recommendation)
-                
-                st.markdown("</div>", unsafe_allow_html=True)
-                
-                # Display summary
-                st.markdown("---")
-                st.markdown("### 📋 Recommendation Summary")
-                
-                col_summary1, col_summary2 = st.columns(2)
-                
-                with col_summary1:
-                    st.markdown(f"""
-                    **Your Preferences:**
-                    - Location: {location}
-                    - Dietary: {dietary_str}
-                    - Ambiance: {ambiance_str}
-                    - Party Size: {party_size}
-                    """)
-                
-                with col_summary2:
-                    st.markdown(f"""
-                    **Restaurant Details:**
-                    - Cuisine: {cuisine_preference if cuisine_preference else 'Any'}
-                    - Price Range: {price_range}
-                    - Weather: Considered
-                    - Peak Hours: Analyzed
-                    """)
-                
-            except Exception as e:
-                st.error(f"❌ Error generating recommendation: {str(e)}")
-                st.info("Make sure Ollama is running: `ollama serve`")
+        except Exception as e:
+            result["error"] = str(e)
+    status.empty()
+    return result
+
+
+def show_result(result):
+    """Render a stored result (reruns redraw it from session state without running the crew)."""
+    if result["error"] is not None:
+        st.error(f"❌ Error generating recommendation: {result['error']}")
+        st.info("Make sure Ollama is running: `ollama serve`")
+    else:
+        # Display recommendation
+        st.markdown("""
+        <div class="success-box">
+        <strong>✅ Recommendation Complete!</strong>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        st.markdown("""
+        <div class="recommendation-box">
+        """, unsafe_allow_html=True)
+        
+        st.markdown("### 🏆 Your Personalized Restaurant Recommendation")
+        st.markdown(result["recommendation"])
+        
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        # Display summary
+        st.markdown("---")
+        st.markdown("### 📋 Recommendation Summary")
+        
+        col_summary1, col_summary2 = st.columns(2)
+        
+        with col_summary1:
+            st.markdown(f"""
+            **Your Preferences:**
+            - Location: {result['location']}
+            - Dietary: {result['dietary']}
+            - Ambiance: {result['ambiance']}
+            - Party Size: {result['party_size']}
+            """)
+        
+        with col_summary2:
+            st.markdown(f"""
+            **Restaurant Details:**
+            - Cuisine: {result['cuisine']}
+            - Price Range: {result['price']}
+            - Weather: Considered
+            - Peak Hours: Analyzed
+            """)
+    
+    # Agent steps and task results recorded for this request (see crew_logging.py)
+    with st.expander(f"📜 Crew log (request {result['request_id']})"):
+        st.code("\n".join(request_log(result["request_id"])) or "No events recorded.", language=None)
+
+
+@fragment
+def recommender():
+    """The preferences form and the result area; submitting reruns only this part."""
+    with st.form("preferences_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            # Main preferences
+            st.markdown("**Basic Preferences**")
+            
+            user_preferences = st.text_area(
+                "What are you looking for in a restaurant?",
+                placeholder="e.g., 'An affordable restaurant in San Francisco with a rating above 4.0 close to the waterfront'",
+                height=100,
+                key="preferences"
+            )
+        
+        with col2:
+            # Enhanced preferences
+            st.markdown("**Enhanced Preferences**")
+            
+            dietary_restrictions = st.multiselect(
+                "Dietary Restrictions",
+                ["None", "Vegan", "Vegetarian", "Gluten-Free", "Pescatarian", "Halal", "Kosher"],
+                key="dietary"
+            )
+            
+            ambiance_preference = st.multiselect(
+                "Desired Ambiance",
+                ["Casual", "Romantic", "Fine Dining", "Business", "Family-Friendly", "Trendy", "Traditional", "Upscale"],
+                key="ambiance"
+            )
+        
+        # Additional preferences
+        st.markdown("**Additional Considerations**")
+        
+        col3, col4, col5 = st.columns(3)
+        
+        with col3:
+            cuisine_preference = st.text_input(
+                "Preferred Cuisine (optional)",
+                placeholder="e.g., Italian, Asian, Mediterranean",
+                key="cuisine"
+            )
+        
+        with col4:
+            price_range = st.selectbox(
+                "Price Range",
+                ["Any", "$", "$$", "$$$", "$$$$"],
+                key="price"
+            )
+        
+        with col5:
+            party_size = st.number_input(
+                "Party Size",
+                min_value=1,
+                max_value=20,
+                key="party_size"
+            )
+        
+        submitted = st.form_submit_button(
+            "🚀 Get Recommendation",
+            use_container_width=True,
+            type="primary"
+        )
+    
+    # ========================================================================
+    # RECOMMENDATION PROCESSING
+    # ========================================================================
+    
+    if submitted:
+        if not user_preferences.strip():
+            st.error("❌ Please enter your dining preferences!")
+        else:
+            st.session_state.result = recommend({
+                "text": user_preferences,
+                "location": chosen_location(),
+                "dietary": dietary_restrictions,
+                "ambiance": ambiance_preference,
+                "cuisine": cuisine_preference,
+                "price": price_range,
+                "party_size": party_size,
+            })
+    
+    if st.session_state.get("result"):
+        show_result(st.session_state.result)
+
+
+st.markdown("---")
+
+recommender()
 
 # ============================================================================
 # FOOTER
@@ -0,0 +1,109 @@
+"""
+Memory and lookup benchmark: nested dicts vs the compact catalog.
+
+Generates a synthetic catalog with the same shape as the restaurant data in
+crew_ollama.py and compares heap usage and lookup latency for:
+  - the nested ``{city: [dict, ...]}`` representation
+  - an in-memory compact Catalog
+  - a memory-mapped catalog file (pages shared between worker processes)
+
+Usage:
+    python bench_catalog.py --venues 1000000 --cities 2000
+"""
+
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from catalog import Catalog, build_catalog, write_catalog
+
+CUISINES = ["Italian", "French/Contemporary", "Sushi/Japanese", "Ramen/Japanese", "German/Traditional",
+            "Turkish/Street Food", "American/Asian Fusion", "Vegetarian/Vegan", "Mexican", "Thai"]
+WEATHER = ["sunny", "clear", "partly_cloudy", "any"]
+DIETARY = ["vegan", "vegetarian", "gluten-free", "pescatarian", "halal", "kosher"]
+AMBIANCE = ["casual, lively", "fine dining, elegant, upscale", "romantic, intimate", "traditional, cozy, historic",
+            "trendy, modern"]
+FEATURES = ["outdoor seating", "tasting menu", "wine selection", "quick service", "counter seating",
+            "michelin star", "bay view", "beer selection"]
+PEAK_HOURS = ["12:00-14:00, 18:00-20:00", "11:30-13:00, 17:30-19:30", "17:30-19:00, 20:00-21:30"]
+
+
+def synthesize(venue_count, city_count, seed=7):
+    rng = random.Random(seed)
+    cities = [f"City {i:05d}" for i in range(city_count)]
+    records = {city: [] for city in cities}
+    for i in range(venue_count):
+        city = cities[i % city_count]
+        records[city].append({
+            "name": f"Venue {i:07d}",
+            "cuisine": rng.choice(CUISINES),
+            "rating": round(rng.uniform(3.5, 5.0), 1),
+            "price_range": "$" * rng.randint(1, 4),
+            "address": f"{rng.randint(1, 999)} Main St, {city}",
+            "weather_suitable": rng.sample(WEATHER, rng.randint(1, 2)),
+            "peak_hours": rng.choice(PEAK_HOURS),
+            "dietary_options": rng.sample(DIETARY, rng.randint(0, 3)),
+            "ambiance": rng.choice(AMBIANCE),
+            "special_features": rng.sample(FEATURES, 3),
+        })
+    return records
+
+
+def measure(label, factory):
+    gc.collect()
+    tracemalloc.start()
+    value = factory()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {current / 1_048_576:>10.1f} MiB on the Python heap")
+    return value
+
+
+def time_lookups(label, lookup, keys):
+    start = time.perf_counter()
+    for key in keys:
+        lookup(key)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed / len(keys) * 1e6:>10.2f} µs per lookup")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--venues", type=int, default=200_000)
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"Synthesizing {args.venues} venues in {args.cities} cities...\n")
+    records = measure("nested dicts", lambda: synthesize(args.venues, args.cities))
+    blob = build_catalog(records)
+    compact = measure("compact catalog (heap)", lambda: Catalog(bytearray(blob)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.rcat")
+        write_catalog(records, path)
+        print(f"{'catalog file size':<28} {os.path.getsize(path) / 1_048_576:>10.1f} MiB")
+        mapped = measure("compact catalog (mmap)", lambda: Catalog.open(path))
+
+        rng = random.Random(11)
+        cities = [f"City {rng.randrange(args.cities):05d}" for _ in range(args.lookups)]
+        names = [f"Venue {rng.randrange(args.venues):07d}" for _ in range(args.lookups)]
+        print()
+        time_lookups("dict city lookup", lambda city: [v["name"] for v in records[city]], cities)
+        time_lookups("mmap city lookup", lambda city: [v.name for v in mapped.venues_in(city)], cities)
+
+        by_name = {v["name"]: v for venues in records.values() for v in venues}
+        time_lookups("dict name lookup", by_name.get, names)
+        time_lookups("mmap name lookup", mapped.find, names)
+        time_lookups("mmap tag filter (per city)",
+                     lambda city: mapped.with_tag("dietary_options", "vegan", city=city), cities)
+        mapped.close()
+    del compact
+
+
+if __name__ == "__main__":
+    main()
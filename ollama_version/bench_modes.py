@@ -0,0 +1,65 @@
+"""
+Side-by-side latency and quality comparison of the crew and collapsed pipelines.
+
+Runs the same sample requests through ``get_recommendation`` in both modes,
+prints per-mode latency, and writes every answer to a markdown report so the
+outputs can be compared by eye. The completion cache and task checkpoints are
+disabled so each run does the full work.
+
+Usage:
+    python bench_modes.py --repeat 2 --report bench_modes.md
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+os.environ["COMPLETION_CACHE"] = "0"
+os.environ["CHECKPOINTS"] = "0"
+os.environ.setdefault("RESTAURANT_DATA_WATCH", "0")
+
+from crew_ollama import get_recommendation  # noqa: E402
+
+SAMPLE_REQUESTS = [
+    ("A cozy restaurant in Berlin for a birthday, Party size: 4, Location: Berlin", "Vegetarian", "Traditional"),
+    ("Quick lunch spot, Price: $, Party size: 1, Location: Tokyo", "No restrictions", "Casual"),
+    ("Anniversary dinner with a view, Party size: 2, Location: San Francisco", "Vegan", "Romantic"),
+]
+
+MODES = ("crew", "collapsed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--report", default="bench_modes.md")
+    args = parser.parse_args()
+
+    timings = {mode: [] for mode in MODES}
+    report = ["# Crew vs collapsed pipeline\n"]
+
+    for preferences, dietary, ambiance in SAMPLE_REQUESTS:
+        report.append(f"## {preferences}\n\nDietary: {dietary} · Ambiance: {ambiance}\n")
+        for mode in MODES:
+            for attempt in range(args.repeat):
+                start = time.perf_counter()
+                result = get_recommendation(preferences, dietary, ambiance, mode=mode)
+                elapsed = time.perf_counter() - start
+                timings[mode].append(elapsed)
+                print(f"{mode:<10} {elapsed:7.1f}s  {preferences[:60]}")
+            report.append(f"### {mode} ({elapsed:.1f}s)\n\n{result}\n")
+
+    print()
+    print(f"{'mode':<10} {'mean s':>8} {'median s':>9} {'max s':>7}")
+    for mode in MODES:
+        values = timings[mode]
+        print(f"{mode:<10} {statistics.mean(values):>8.1f} {statistics.median(values):>9.1f} {max(values):>7.1f}")
+
+    with open(args.report, "w", encoding="utf-8") as handle:
+        handle.write("\n".join(report))
+    print(f"\nAnswers written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Measure Ollama prompt-evaluation time for the inline vs prefix prompt layouts.
+
+Sends the agent + task prompts of a series of varied requests straight to the
+Ollama API (generating a single token) and reports the prompt tokens Ollama had
+to evaluate and the prompt-eval time. With the prefix layout the static
+instructions are reused from the KV cache, so both numbers should drop after
+the first request.
+
+Usage:
+    python bench_prompt_layout.py --requests 6
+"""
+
+import argparse
+import os
+import statistics
+
+import requests
+
+os.environ.setdefault("RESTAURANT_DATA_WATCH", "0")
+
+from crew_ollama import OLLAMA_SETTINGS, analysis_prefetched_task, generation_task, research_task  # noqa: E402
+from prompt_layout import apply_layout  # noqa: E402
+
+SAMPLE_REQUESTS = [
+    ("A cozy restaurant in Berlin for a birthday", "Vegetarian", "Traditional"),
+    ("Quick lunch spot in Tokyo", "No restrictions", "Casual"),
+    ("Anniversary dinner in San Francisco with a view", "Vegan", "Romantic"),
+    ("Client dinner in Berlin near Mitte", "Gluten-Free", "Business"),
+    ("Sushi in Tokyo, price is no object", "Pescatarian", "Fine Dining"),
+    ("Family brunch in San Francisco", "Vegetarian, Gluten-Free", "Family-Friendly"),
+]
+
+
+def build_prompt(task, layout, values):
+    agent = task.agent
+    description = apply_layout(task.description, layout).format_map(values)
+    return (
+        f"You are {agent.role}. {agent.backstory}\n"
+        f"Your personal goal is: {agent.goal}\n\n"
+        f"Current Task: {description}\n\n"
+        f"This is the expected criteria for your final answer: {task.expected_output}\n\n"
+        "Begin! This is VERY important to you, use the tools available and give your best Final Answer."
+    )
+
+
+def evaluate(prompt):
+    response = requests.post(
+        f"{OLLAMA_SETTINGS['base_url']}/api/generate",
+        json={
+            "model": OLLAMA_SETTINGS["model"],
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": OLLAMA_SETTINGS["keep_alive"],
+            "options": {"num_ctx": OLLAMA_SETTINGS["num_ctx"], "num_predict": 1},
+        },
+        timeout=300,
+    )
+    response.raise_for_status()
+    data = response.json()
+    return data.get("prompt_eval_count", 0), data.get("prompt_eval_duration", 0) / 1e6
+
+
+def run(layout, request_count):
+    tokens, millis = [], []
+    for i in range(request_count):
+        preferences, dietary, ambiance = SAMPLE_REQUESTS[i % len(SAMPLE_REQUESTS)]
+        values = {
+            "user_preferences": preferences,
+            "dietary_restrictions": dietary,
+            "ambiance_preference": ambiance,
+            "prefetched_context": "(prefetched weather, peak time, dietary and ambiance lookups)",
+        }
+        for task in (research_task, analysis_prefetched_task, generation_task):
+            count, duration = evaluate(build_prompt(task, layout, values))
+            tokens.append(count)
+            millis.append(duration)
+    return tokens, millis
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=len(SAMPLE_REQUESTS))
+    args = parser.parse_args()
+
+    print(f"Model: {OLLAMA_SETTINGS['model']}  num_ctx: {OLLAMA_SETTINGS['num_ctx']}  "
+          f"keep_alive: {OLLAMA_SETTINGS['keep_alive']}\n")
+    print(f"{'layout':<8} {'prompt tokens evaluated (mean)':>32} {'prompt eval ms (mean)':>24} {'p95 ms':>10}")
+    for layout in ("inline", "prefix"):
+        # Warm the model and this layout's prefixes before measuring
+        run(layout, 1)
+        tokens, millis = run(layout, args.requests)
+        p95 = sorted(millis)[max(0, int(len(millis) * 0.95) - 1)]
+        print(f"{layout:<8} {statistics.mean(tokens):>32.0f} {statistics.mean(millis):>24.1f} {p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
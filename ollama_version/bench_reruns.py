@@ -0,0 +1,128 @@
+"""
+Server CPU per rerun of the Streamlit front-ends under concurrent sessions.
+
+Simulates ``--sessions`` users at once, each with Streamlit's ``AppTest``
+running the app and then the interactions of someone filling in the form
+(typing a location, picking options, toggling the debug panel, loading the
+example) without submitting it, so no model is needed. As in a browser, an
+edit to a widget inside an ``st.form`` only updates its value and doesn't
+rerun the script.
+
+Reports the reruns per session, the process CPU time per rerun and per
+session, and the wall time per rerun (p50/p95). To compare with an earlier
+revision, point ``--app`` at a checkout of it (e.g. a ``git worktree``).
+
+Usage:
+    python bench_reruns.py --sessions 8 --repeat 3
+    python bench_reruns.py --app ../app.py
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from pathlib import Path
+
+os.environ.setdefault("RESTAURANT_DATA_WATCH", "0")
+
+import crew_ollama  # noqa: E402,F401 (puts the repository root on sys.path)
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from warmup import start_warmup  # noqa: E402
+
+# (widget kind, key, label, action, value); the label finds widgets in revisions without keys
+OLLAMA_SESSION = [
+    ("text_input", "location", "Preferred Location", "input", "Ber"),
+    ("text_input", "location", "Preferred Location", "input", "Berlin"),
+    ("text_area", "preferences", "What are you looking for in a restaurant?", "input", "Ramen near the river"),
+    ("multiselect", "dietary", "Dietary Restrictions", "select", "Vegan"),
+    ("multiselect", "ambiance", "Desired Ambiance", "select", "Romantic"),
+    ("selectbox", "price", "Price Range", "select", "$$"),
+    ("number_input", "party_size", "Party Size", "set_value", 4),
+    ("checkbox", "profile_requests", "Profile requests", "check", None),
+    ("button", None, "📋 Load Example", "click", None),
+]
+CREW_SESSION = [
+    ("text_area", "preference", "Tell us your dining preferences (Cuisine, Location, Price Range, Occasion, etc.):",
+     "input", "Sushi for two"),
+    ("text_input", "location_query", "Location (optional):", "input", "Wick"),
+    ("text_input", "location_query", "Location (optional):", "input", "Wicker"),
+    ("checkbox", "include_weather", "Include current weather insights", "uncheck", None),
+    ("checkbox", "profile_requests", "Profile requests", "check", None),
+]
+SESSIONS = {"app_ollama.py": OLLAMA_SESSION, "app.py": CREW_SESSION}
+
+
+def _widget(app, kind, key, label):
+    widgets = getattr(app, kind)
+    if key is not None:
+        try:
+            return widgets(key=key)
+        except KeyError:
+            pass
+    return next((widget for widget in widgets if widget.label == label), None)
+
+
+def run_session(path, steps, timeout, wall_times):
+    """One simulated user; returns the number of reruns it caused."""
+    app = AppTest.from_file(path, default_timeout=timeout)
+    started = time.perf_counter()
+    app.run()
+    wall_times.append(time.perf_counter() - started)
+    reruns = 1
+    for kind, key, label, action, value in steps:
+        widget = _widget(app, kind, key, label)
+        if widget is None:
+            continue
+        getattr(widget, action)(*([] if value is None else [value]))
+        if getattr(widget, "form_id", ""):
+            continue  # Sent with the form's submit, not on its own
+        started = time.perf_counter()
+        app.run()
+        wall_times.append(time.perf_counter() - started)
+        reruns += 1
+    return reruns
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default=str(Path(__file__).parent / "app_ollama.py"))
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per script run")
+    args = parser.parse_args()
+
+    steps = SESSIONS[Path(args.app).name]
+    # The apps' warm-up loads the model in a background thread; skip it so its CPU isn't counted
+    start_warmup(lambda: [])
+    # The first run imports the crew modules; keep it out of the measurement
+    run_session(args.app, [], args.timeout, [])
+
+    wall_times, reruns, lock = [], [], threading.Lock()
+
+    def user():
+        count = run_session(args.app, steps, args.timeout, wall_times)
+        with lock:
+            reruns.append(count)
+
+    cpu_started = time.process_time()
+    for _ in range(args.repeat):
+        threads = [threading.Thread(target=user) for _ in range(args.sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    cpu = time.process_time() - cpu_started
+
+    total = sum(reruns)
+    wall_times.sort()
+    print(f"{args.app}: {len(reruns)} sessions ({args.sessions} concurrent), {len(steps)} interactions each")
+    print(f"reruns per session: {total / len(reruns):.1f}")
+    print(f"CPU per rerun:      {cpu / total * 1000:.1f} ms")
+    print(f"CPU per session:    {cpu / len(reruns) * 1000:.1f} ms")
+    print(f"wall per rerun:     p50 {statistics.median(wall_times) * 1000:.1f} ms, "
+          f"p95 {wall_times[int(len(wall_times) * 0.95)] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Compare the prompt tokens each tool output format costs on the bundled data.
+
+Renders the restaurant search for every city in the catalog in each format
+(all fields and all venues, then the defaults: top TOOL_TOP_K, and a typical
+projection an agent asks for) and reports the estimated tokens per output, as
+a share of the 2048-token context.
+
+Usage:
+    python bench_tool_output.py
+"""
+
+import argparse
+import os
+import statistics
+
+os.environ.setdefault("RESTAURANT_DATA_WATCH", "0")
+
+from crew_ollama import OLLAMA_SETTINGS, SEARCH_FIELDS, _ranked_venues, data_source  # noqa: E402
+from tool_output import DEFAULT_TOP_K, FORMATS, estimate_tokens, render_records  # noqa: E402
+
+VARIANTS = [
+    ("all fields, all venues", SEARCH_FIELDS, 0),
+    (f"all fields, top {DEFAULT_TOP_K}", SEARCH_FIELDS, DEFAULT_TOP_K),
+    ("name/rating/price/address, top 3", ("name", "rating", "price_range", "address"), 3),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    catalog = data_source.snapshot().catalog
+    records = {
+        city: [dict(venue.to_dict(), city=city) for venue in _ranked_venues(catalog, city)]
+        for city in catalog.cities
+    }
+    context = OLLAMA_SETTINGS["num_ctx"]
+    print(f"{len(records)} cities, num_ctx {context}\n")
+    print(f"{'variant':<36} {'format':<6} {'tokens (mean)':>14} {'max':>6} {'of context':>11}")
+    for label, fields, top_k in VARIANTS:
+        for format in FORMATS:
+            tokens = [estimate_tokens(render_records(rows, fields, top_k, format)[0]) for rows in records.values()]
+            print(f"{label:<36} {format:<6} {statistics.mean(tokens):>14.0f} {max(tokens):>6} "
+                  f"{max(tokens) / context:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
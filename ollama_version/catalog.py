@@ -0,0 +1,514 @@
+"""
+Compact restaurant catalog for the Ollama recommender.
+
+Venues are stored column-wise: every string is dictionary-encoded into a
+shared string table, numeric fields live in typed arrays and small tag
+vocabularies (dietary options, weather suitability) are packed into 64-bit
+masks.  The same layout is used on disk, so a catalog file can be
+memory-mapped read-only and shared by every worker process through the page
+cache instead of being copied into each interpreter's heap.
+
+Usage:
+    python catalog.py convert restaurants.json restaurants.rcat
+    python catalog.py convert restaurants.csv restaurants.rcat
+    python catalog.py info restaurants.rcat
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+MAGIC = b"RCAT"
+FORMAT_VERSION = 1
+
+# magic, version, header length (the JSON header follows the prefix)
+_PREFIX = struct.Struct("<4sHI")
+_ALIGN = 8
+
+# Columns stored as string-table ids, in venue order.
+STRING_FIELDS = ("name", "cuisine", "address", "peak_hours", "ambiance", "special_features")
+# Columns stored as bitmasks over a per-catalog vocabulary (max 64 tags).
+TAG_FIELDS = ("weather_suitable", "dietary_options")
+# Free-form list fields that are joined into a single dictionary-encoded string.
+LIST_STRING_FIELDS = ("special_features",)
+LIST_SEPARATOR = ", "
+
+
+def _pad(length):
+    return (-length) % _ALIGN
+
+
+class Venue:
+    """A lazily decoded view of one catalog row."""
+
+    __slots__ = ("_catalog", "_row")
+
+    def __init__(self, catalog, row):
+        self._catalog = catalog
+        self._row = row
+
+    def _string(self, field):
+        return self._catalog.string(self._catalog._columns[field][self._row])
+
+    @property
+    def name(self):
+        return self._string("name")
+
+    @property
+    def city(self):
+        return self._catalog.city_of(self._row)
+
+    @property
+    def cuisine(self):
+        return self._string("cuisine")
+
+    @property
+    def rating(self):
+        return self._catalog._columns["rating"][self._row] / 100
+
+    @property
+    def price_range(self):
+        return "$" * self._catalog._columns["price"][self._row]
+
+    @property
+    def address(self):
+        return self._string("address")
+
+    @property
+    def peak_hours(self):
+        return self._string("peak_hours")
+
+    @property
+    def ambiance(self):
+        return self._string("ambiance")
+
+    @property
+    def special_features(self):
+        joined = self._string("special_features")
+        return joined.split(LIST_SEPARATOR) if joined else []
+
+    @property
+    def weather_suitable(self):
+        return self._catalog.tags_of("weather_suitable", self._row)
+
+    @property
+    def dietary_options(self):
+        return self._catalog.tags_of("dietary_options", self._row)
+
+    def has_tag(self, field, tag):
+        return self._catalog.has_tag(field, self._row, tag)
+
+    def to_dict(self):
+        """Return the venue in the same shape as the in-code restaurant dicts."""
+        return {
+            "name": self.name,
+            "cuisine": self.cuisine,
+            "rating": self.rating,
+            "price_range": self.price_range,
+            "address": self.address,
+            "weather_suitable": self.weather_suitable,
+            "peak_hours": self.peak_hours,
+            "dietary_options": self.dietary_options,
+            "ambiance": self.ambiance,
+            "special_features": self.special_features,
+        }
+
+    def __repr__(self):
+        return f"Venue({self.name!r}, city={self.city!r})"
+
+
+class Catalog:
+    """
+    Read-only columnar catalog backed by a bytes object or a memory map.
+
+    Venues are grouped by city, so a city lookup is a slice of row ids and
+    a name lookup is a binary search over a pre-sorted permutation.
+    """
+
+    def __init__(self, buffer, _mmap=None, _file=None):
+        self._buffer = memoryview(buffer)
+        self._mmap = _mmap
+        self._file = _file
+
+        magic, version, header_length = _PREFIX.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a restaurant catalog file (bad magic)")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported catalog format version {version}")
+
+        header_start = _PREFIX.size
+        header = json.loads(bytes(self._buffer[header_start:header_start + header_length]))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("Catalog was written on a machine with a different byte order")
+
+        self.venue_count = header["venue_count"]
+        self.cities = header["cities"]
+        self._city_index = {city.lower(): i for i, city in enumerate(self.cities)}
+        self._tag_vocab = header["tags"]
+
+        self._columns = {}
+        for name, (typecode, offset, length) in header["sections"].items():
+            self._columns[name] = self._buffer[offset:offset + length].cast(typecode)
+
+        self._string_offsets = self._columns.pop("string_offsets")
+        self._string_blob = self._columns.pop("string_blob")
+        self._city_offsets = self._columns.pop("city_offsets")
+        self._name_order = self._columns.pop("name_order")
+        self._row_digests = None
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def from_records(cls, records_by_city):
+        """Build an in-memory catalog from ``{city: [venue dict, ...]}``."""
+        return cls(build_catalog(records_by_city))
+
+    @classmethod
+    def open(cls, path):
+        """Memory-map a catalog file read-only; pages are shared between processes."""
+        handle = open(path, "rb")
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            handle.close()
+            raise
+        return cls(mapped, _mmap=mapped, _file=handle)
+
+    def close(self):
+        """Release the memory map (views handed out earlier become invalid)."""
+        views = list(self._columns.values())
+        views += [self._string_offsets, self._string_blob, self._city_offsets, self._name_order]
+        self._columns.clear()
+        for view in views:
+            view.release()
+        self._buffer.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Decoding helpers
+    # ------------------------------------------------------------------
+
+    def string(self, string_id):
+        start = self._string_offsets[string_id]
+        end = self._string_offsets[string_id + 1]
+        return bytes(self._string_blob[start:end]).decode("utf-8")
+
+    def city_of(self, row):
+        city_id = bisect_left(self._city_offsets, row + 1) - 1
+        return self.cities[city_id]
+
+    def tags_of(self, field, row):
+        mask = self._columns[field][row]
+        return [tag for bit, tag in enumerate(self._tag_vocab[field]) if mask >> bit & 1]
+
+    def has_tag(self, field, row, tag):
+        try:
+            bit = self._tag_vocab[field].index(tag)
+        except ValueError:
+            return False
+        return bool(self._columns[field][row] >> bit & 1)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return self.venue_count
+
+    def __iter__(self):
+        for row in range(self.venue_count):
+            yield Venue(self, row)
+
+    def venue(self, row):
+        return Venue(self, row)
+
+    def venues_in(self, city):
+        """Return the venues of ``city`` (case-insensitive), or an empty list."""
+        city_id = self._city_index.get(city.lower())
+        if city_id is None:
+            return []
+        start, end = self._city_offsets[city_id], self._city_offsets[city_id + 1]
+        return [Venue(self, row) for row in range(start, end)]
+
+    def find(self, name):
+        """Return the first venue with exactly this name, or None."""
+        order = self._name_order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.string(self._columns["name"][order[mid]]) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order):
+            row = order[lo]
+            if self.string(self._columns["name"][row]) == name:
+                return Venue(self, row)
+        return None
+
+    def with_tag(self, field, tag, city=None):
+        """Return venues whose ``field`` tag set contains ``tag``."""
+        try:
+            bit = 1 << self._tag_vocab[field].index(tag)
+        except ValueError:
+            return []
+        rows = range(self.venue_count)
+        if city is not None:
+            city_id = self._city_index.get(city.lower())
+            if city_id is None:
+                return []
+            rows = range(self._city_offsets[city_id], self._city_offsets[city_id + 1])
+        column = self._columns[field]
+        return [Venue(self, row) for row in rows if column[row] & bit]
+
+    def row_digests(self):
+        """
+        ``{(city, venue name): digest of the venue's values}``, hashed straight
+        from the columns (string bytes, numbers, sorted tag names) without
+        decoding venues. Computed once per catalog; used to diff reloads.
+        """
+        if self._row_digests is not None:
+            return self._row_digests
+        blob, offsets = self._string_blob, self._string_offsets
+        strings = [self._columns[field] for field in STRING_FIELDS]
+        tags = [(self._columns[field], self._tag_vocab[field]) for field in TAG_FIELDS]
+        rating, price = self._columns["rating"], self._columns["price"]
+        digests = {}
+        for city_id, city in enumerate(self.cities):
+            for row in range(self._city_offsets[city_id], self._city_offsets[city_id + 1]):
+                digest = hashlib.blake2b(digest_size=16)
+                for column in strings:
+                    string_id = column[row]
+                    digest.update(blob[offsets[string_id]:offsets[string_id + 1]])
+                    digest.update(b"\0")
+                digest.update(struct.pack("<HB", rating[row], price[row]))
+                for column, vocab in tags:
+                    mask = column[row]
+                    digest.update("\0".join(sorted(tag for bit, tag in enumerate(vocab) if mask >> bit & 1)).encode())
+                    digest.update(b"\1")
+                digests[(city, self.string(self._columns["name"][row]))] = digest.digest()
+        self._row_digests = digests
+        return digests
+
+    def to_records(self):
+        """Expand back into ``{city: [venue dict, ...]}`` (mainly for tooling)."""
+        return {city: [venue.to_dict() for venue in self.venues_in(city)] for city in self.cities}
+
+
+# ============================================================================
+# BUILDING / SERIALISATION
+# ============================================================================
+
+def _price_level(price_range):
+    price_range = (price_range or "").strip()
+    if price_range and set(price_range) != {"$"}:
+        raise ValueError(f"Unsupported price range {price_range!r}")
+    return len(price_range)
+
+
+def build_catalog(records_by_city):
+    """Serialise ``{city: [venue dict, ...]}`` into the binary catalog format."""
+    strings = {}
+    string_list = []
+
+    def intern(value):
+        string_id = strings.get(value)
+        if string_id is None:
+            string_id = strings[value] = len(string_list)
+            string_list.append(value)
+        return string_id
+
+    tag_vocab = {field: [] for field in TAG_FIELDS}
+    tag_bits = {field: {} for field in TAG_FIELDS}
+
+    def tag_mask(field, tags):
+        mask = 0
+        for tag in tags:
+            bit = tag_bits[field].get(tag)
+            if bit is None:
+                bit = len(tag_vocab[field])
+                if bit >= 64:
+                    raise ValueError(f"More than 64 distinct {field} tags; cannot pack into a bitmask")
+                tag_bits[field][tag] = bit
+                tag_vocab[field].append(tag)
+            mask |= 1 << bit
+        return mask
+
+    columns = {field: array("I") for field in STRING_FIELDS}
+    columns["rating"] = array("H")
+    columns["price"] = array("B")
+    for field in TAG_FIELDS:
+        columns[field] = array("Q")
+
+    cities = []
+    city_offsets = array("I", [0])
+    for city, venues in records_by_city.items():
+        cities.append(city)
+        for venue in venues:
+            for field in STRING_FIELDS:
+                value = venue.get(field, "")
+                if field in LIST_STRING_FIELDS:
+                    value = LIST_SEPARATOR.join(value or [])
+                columns[field].append(intern(value))
+            columns["rating"].append(round(float(venue.get("rating", 0)) * 100))
+            columns["price"].append(_price_level(venue.get("price_range")))
+            for field in TAG_FIELDS:
+                columns[field].append(tag_mask(field, venue.get(field) or []))
+        city_offsets.append(len(columns["name"]))
+
+    names = columns["name"]
+    name_order = array("I", sorted(range(len(names)), key=lambda row: string_list[names[row]]))
+
+    string_offsets = array("I", [0])
+    blob = bytearray()
+    for value in string_list:
+        blob += value.encode("utf-8")
+        string_offsets.append(len(blob))
+
+    sections = dict(columns)
+    sections["string_offsets"] = string_offsets
+    sections["string_blob"] = array("B", blob)
+    sections["city_offsets"] = city_offsets
+    sections["name_order"] = name_order
+
+    # Two passes: the header records absolute offsets, which depend on its own length.
+    header = {
+        "byteorder": sys.byteorder,
+        "venue_count": len(names),
+        "cities": cities,
+        "tags": tag_vocab,
+        "sections": {},
+    }
+    header_bytes = b""
+    for _ in range(3):
+        offset = _PREFIX.size + len(header_bytes)
+        offset += _pad(offset)
+        layout = {}
+        for name, values in sections.items():
+            length = len(values) * values.itemsize
+            layout[name] = [values.typecode, offset, length]
+            offset += length + _pad(length)
+        header["sections"] = layout
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        if encoded == header_bytes:
+            break
+        header_bytes = encoded
+
+    out = bytearray(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+    out += header_bytes
+    out += b"\0" * _pad(len(out))
+    for values in sections.values():
+        data = values.tobytes()
+        out += data
+        out += b"\0" * _pad(len(data))
+    return bytes(out)
+
+
+def write_catalog(records_by_city, path):
+    """Write a catalog file atomically (write to a temp file, then rename)."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(build_catalog(records_by_city))
+    tmp_path.replace(path)
+    return path
+
+
+# ============================================================================
+# CONVERTERS
+# ============================================================================
+
+def _split_list(value):
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in (value or "").replace("|", ";").split(";") if item.strip()]
+
+
+def load_json_records(path):
+    """
+    Read venues from JSON: either ``{city: [venue, ...]}`` (the shape used in
+    ``crew_ollama.py``) or a flat list of venues that each carry a ``city`` key.
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        return data
+    records = {}
+    for venue in data:
+        venue = dict(venue)
+        records.setdefault(venue.pop("city"), []).append(venue)
+    return records
+
+
+def load_csv_records(path):
+    """
+    Read venues from CSV with one row per venue and a ``city`` column.
+    List columns (weather_suitable, dietary_options, special_features) use
+    ``;`` or ``|`` as the item separator.
+    """
+    records = {}
+    with open(path, newline="", encoding="utf-8") as handle:
+        for row in csv.DictReader(handle):
+            venue = dict(row)
+            city = venue.pop("city")
+            venue["rating"] = float(venue.get("rating") or 0)
+            for field in TAG_FIELDS + LIST_STRING_FIELDS:
+                venue[field] = _split_list(venue.get(field))
+            records.setdefault(city, []).append(venue)
+    return records
+
+
+def load_records(path):
+    """Load venue records from a ``.json``, ``.csv`` or ``.rcat`` file."""
+    suffix = Path(path).suffix.lower()
+    if suffix == ".csv":
+        return load_csv_records(path)
+    if suffix == ".rcat":
+        with Catalog.open(path) as catalog:
+            return catalog.to_records()
+    return load_json_records(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Restaurant catalog tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    convert = subcommands.add_parser("convert", help="Convert JSON/CSV venues into a binary catalog")
+    convert.add_argument("source")
+    convert.add_argument("destination")
+
+    info = subcommands.add_parser("info", help="Show a summary of a binary catalog")
+    info.add_argument("path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        records = load_records(args.source)
+        path = write_catalog(records, args.destination)
+        venue_count = sum(len(venues) for venues in records.values())
+        print(f"Wrote {venue_count} venues in {len(records)} cities to {path} ({path.stat().st_size} bytes)")
+    else:
+        with Catalog.open(args.path) as catalog:
+            print(f"Venues: {len(catalog)}")
+            print(f"Cities: {len(catalog.cities)}")
+            for field, vocab in catalog._tag_vocab.items():
+                print(f"{field} tags: {', '.join(vocab)}")
+
+
+if __name__ == "__main__":
+    main()
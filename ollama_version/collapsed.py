@@ -0,0 +1,106 @@
+"""
+Single-call "collapsed" pipeline for small local models.
+
+The crew runs three agents one after another, each re-reading the previous
+agent's output and making its own LLM calls. In collapsed mode all tool data is
+gathered up front and one structured prompt asks the model for the research
+summary, the analysis and the final recommendation in delimited sections of a
+single generation. The sections are parsed back into the same shape as a crew
+result, so callers and the UI don't need to know which mode produced it.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+SECTIONS = ("RESEARCH", "ANALYSIS", "RECOMMENDATION")
+
+# Static instructions first, request data last (see prompt_layout.py)
+COLLAPSED_INSTRUCTIONS = """You are a team of three dining experts working in sequence:
+1. Restaurant Researcher: select the 3-5 restaurants from the search results that best match the user's preferences, with name, cuisine, rating, price range, address, peak hours, dietary options and ambiance.
+2. Dining Experience Analyst: evaluate those restaurants against the weather, peak hours and wait times, the dietary restrictions and the desired ambiance, and identify the SINGLE BEST recommendation with reasoning for each factor.
+3. Personalized Recommendation Generator: write a friendly, persuasive recommendation for the best restaurant covering why it suits the user, the address and how to get there, how it fits their dietary needs and ambiance, the best time to visit considering peak hours and weather, and what to expect.
+
+Use only the data provided below. Answer with exactly these three sections, in this order, each starting with its heading on its own line:
+### RESEARCH
+### ANALYSIS
+### RECOMMENDATION"""
+
+_HEADING = re.compile(r"^\s*#{1,6}\s*(RESEARCH|ANALYSIS|RECOMMENDATION)\b.*$", re.IGNORECASE | re.MULTILINE)
+
+
+@dataclass
+class CollapsedTaskOutput:
+    """Mirrors the fields of a CrewAI task output that callers read."""
+
+    description: str
+    agent: str
+    raw: str
+
+    def __str__(self):
+        return self.raw
+
+
+@dataclass
+class CollapsedResult:
+    """Mirrors a crew kickoff result: ``raw`` is the final recommendation."""
+
+    raw: str
+    tasks_output: List[CollapsedTaskOutput] = field(default_factory=list)
+    mode: str = "collapsed"
+
+    def __str__(self):
+        return self.raw
+
+
+def build_prompt(user_preferences, dietary_restrictions, ambiance_preference, search_results, lookups):
+    return (
+        f"{COLLAPSED_INSTRUCTIONS}\n\n"
+        "Request details\n---------------\n"
+        f"User preferences:\n{user_preferences}\n\n"
+        f"Dietary restrictions:\n{dietary_restrictions}\n\n"
+        f"Desired ambiance:\n{ambiance_preference}\n\n"
+        f"Restaurant search results:\n{search_results.strip()}\n\n"
+        f"Weather, peak time, dietary and ambiance lookups:\n{lookups.strip()}\n"
+    )
+
+
+def parse_sections(text):
+    """
+    Split a collapsed generation into its sections.
+
+    Missing sections come back empty; if the model ignored the headings
+    entirely, the whole text is treated as the recommendation.
+    """
+    sections = dict.fromkeys(SECTIONS, "")
+    matches = list(_HEADING.finditer(text))
+    if not matches:
+        sections["RECOMMENDATION"] = text.strip()
+        return sections
+    for match, following in zip(matches, matches[1:] + [None]):
+        end = following.start() if following else len(text)
+        name = match.group(1).upper()
+        if not sections[name]:
+            sections[name] = text[match.end():end].strip()
+    if not sections["RECOMMENDATION"]:
+        # Fall back to the last section the model did produce
+        sections["RECOMMENDATION"] = next(
+            (sections[name] for name in reversed(SECTIONS) if sections[name]), text.strip()
+        )
+    return sections
+
+
+def run_collapsed(llm, user_preferences, dietary_restrictions, ambiance_preference, search_results, lookups):
+    """Run the whole pipeline as one generation and return a CollapsedResult."""
+    prompt = build_prompt(user_preferences, dietary_restrictions, ambiance_preference, search_results, lookups)
+    text = llm.invoke(prompt)
+    text = getattr(text, "content", text)
+    sections = parse_sections(text)
+    return CollapsedResult(
+        raw=sections["RECOMMENDATION"],
+        tasks_output=[
+            CollapsedTaskOutput("Research", "Restaurant Researcher", sections["RESEARCH"]),
+            CollapsedTaskOutput("Analysis", "Dining Experience Analyst", sections["ANALYSIS"]),
+            CollapsedTaskOutput("Recommendation", "Personalized Recommendation Generator", sections["RECOMMENDATION"]),
+        ],
+    )
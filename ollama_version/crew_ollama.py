@@ -6,167 +6,199 @@ Includes: Weather, Peak Time, Address, Dietary Restrictions, Ambiance
 from crewai import Agent, Task, Crew
 from langchain_community.llms import Ollama
 from langchain_community.tools import Tool
+import requests
 import json
+import os
+import sys
 from datetime import datetime
-
-# Initialize Ollama LLM (Neural Chat 7B)
-# Make sure Ollama is running: ollama serve
-llm = Ollama(
-    model="neural-chat",
-    base_url="http://localhost:11434",
+from functools import partial
+from pathlib import Path
+
+# Shared modules (completion cache, checkpoints, ...) live at the repository root
+_REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
+
+from budgets import budget_scope, budgeted_tool
+from checkpoints import checkpoint_key, checkpoint_store_from_env, task_output_text
+from collapsed import CollapsedResult, CollapsedTaskOutput, run_collapsed
+from completion_cache import install_completion_cache
+from crew_logging import CREW_VERBOSE, crew_log, step_callback, task_callback
+from data_source import DataSource, TaggedCache
+from degradation import controller as degradation, with_tier_note
+from gazetteer import gazetteer, normalize
+from materialized import MaterializedRecommendations, canonical_preference, query_key
+from memory import agents_in_use, monitor as memory_monitor, track_request, watch
+from model_routing import RoutedModel, tier_clients, tier_models
+from prefetch import Lookup, format_prefetched, run_lookups, split_terms
+from profiling import profile_request
+from prompt_layout import apply_layout
+from query_planner import fan_out, merge_prompt, merged_fallback, plan_query
+from request_context import request_scope
+from scheduler import scheduler
+from tool_output import DEFAULT_TOP_K, parse_fields, record_output_size, render_records, structured_tool
+from warmup import WARMUP_TOP_CITIES, WarmupStep, traffic
+
+# Repeated agent prompts are answered from a persistent completion cache
+completion_cache = install_completion_cache()
+
+# Agents are routed to a model tier by role (see model_routing.py). The
+# researcher mostly reformats search results, so it runs on a small model and
+# is escalated to Neural Chat when its reply doesn't parse.
+OLLAMA_MODELS = tier_models("OLLAMA_MODEL", {"small": "llama3.2:3b", "medium": "neural-chat", "large": "neural-chat"})
+ROLE_TIERS = {"researcher": "small", "analyst": "medium", "generator": "large"}
+
+OLLAMA_SETTINGS = dict(
+    model=OLLAMA_MODELS["medium"],
+    base_url=os.environ.get("OLLAMA_HOST", "http://localhost:11434"),
     temperature=0.7,
     top_p=0.9,
-    num_ctx=2048  # Context window size
+    num_ctx=2048,  # Context window size; changing it forces a model reload and drops the KV cache
+    keep_alive=os.environ.get("OLLAMA_KEEP_ALIVE", "30m")  # Keep the model and cached prompt prefix resident
 )
 
+# Initialize Ollama LLM (Neural Chat 7B); used as is by the collapsed pipeline
+# Make sure Ollama is running: ollama serve
+llm = Ollama(**OLLAMA_SETTINGS)
+
+models = tier_clients(OLLAMA_MODELS, lambda name: Ollama(**dict(OLLAMA_SETTINGS, model=name)))
+
+# The generator writes the user-facing copy, so it bypasses the completion cache
+creative_models = tier_clients(OLLAMA_MODELS, lambda name: Ollama(**dict(OLLAMA_SETTINGS, model=name), cache=False))
+
+
+# ============================================================================
+# TOOL DATA
+# ============================================================================
+
+# Tool data lives in data/ (or RESTAURANT_DATA_DIR) and is hot-reloaded when
+# the files change, so data updates don't need a deploy or a restart.
+data_source = DataSource()
+if os.environ.get("RESTAURANT_DATA_WATCH", "1") != "0":
+    data_source.start_watching(float(os.environ.get("RESTAURANT_DATA_WATCH_INTERVAL", "2")))
+
+# Used for restaurants missing from peak_times.json
+DEFAULT_PEAK_INFO = {
+    "peak_hours": "12:00-14:00, 18:00-20:00",
+    "best_time": "Off-peak hours recommended",
+    "wait_time_peak": "20-30 minutes",
+    "wait_time_off_peak": "5-10 minutes"
+}
+
+# Formatted tool outputs, tagged so a data update only evicts affected entries
+tool_output_cache = TaggedCache()
+data_source.subscribe(tool_output_cache.invalidate)
+
+
+def _cached_tool_output(key, render):
+    """
+    Return ``render(snapshot)`` for the request's snapshot, cached by ``key``.
+
+    ``render`` returns ``(output, tags)``. Results are only cached while the
+    request's snapshot is the latest one, so a request that started before an
+    update can never repopulate the cache with stale data. That is checked
+    again under the cache lock when storing: a swap that lands while rendering
+    is either seen there or followed by its invalidation.
+    """
+    snapshot = data_source.snapshot()
+    if data_source.is_latest(snapshot):
+        cached = tool_output_cache.get(key)
+        if cached is not None:
+            return record_output_size(key[0], cached)
+    output, tags = render(snapshot)
+    tool_output_cache.put(key, output, tags, valid=lambda: data_source.is_latest(snapshot))
+    return record_output_size(key[0], output)
+
 
 # ============================================================================
 # TOOLS DEFINITION
 # ============================================================================
 
-def restaurant_search_tool(query: str) -> str:
+def resolve_location(query: str):
+    """
+    Return the catalog city for the first place mentioned in ``query`` (a
+    neighborhood counts for its city), or None if it mentions none we cover.
+    """
+    catalog = data_source.snapshot().catalog
+    places = gazetteer()
+    for place in places.find_places(query):
+        city = places.city_of(place).name
+        if city in catalog.cities:
+            return city
+
+    # Cities added to the tool data but not (yet) to the gazetteer
+    words = f" {normalize(query)} "
+    for city in catalog.cities:
+        if f" {normalize(city)} " in words:
+            return city
+    return None
+
+
+def _unknown_location(query: str) -> str:
+    mentioned = [place.name for place in gazetteer().find_places(query)]
+    where = " or ".join(mentioned) if mentioned else "the requested location"
+    covered = ", ".join(data_source.snapshot().catalog.cities)
+    return f"No restaurant data for {where}. Restaurant data is available for: {covered}."
+
+
+# Fields each tool returns unless the caller asks for others (see tool_output.py)
+SEARCH_FIELDS = ("name", "cuisine", "rating", "price_range", "address", "weather_suitable", "peak_hours",
+                 "dietary_options", "ambiance", "special_features")
+LIST_FIELDS = ("name",)
+
+
+def _ranked_venues(catalog, location):
+    """The venues of ``location``, best rated first (the order top-K cuts by)."""
+    return sorted(catalog.venues_in(location), key=lambda venue: venue.rating, reverse=True)
+
+
+def _shown_venues(catalog, location):
+    """The venues a default search for ``location`` lists (the top TOOL_TOP_K)."""
+    venues = _ranked_venues(catalog, location)
+    return venues[:DEFAULT_TOP_K] if DEFAULT_TOP_K > 0 else venues
+
+
+def _venue_records(snapshot, names, location=None):
+    """Records for the named venues (optionally only those in ``location``), best rated first."""
+    records = []
+    for name in names:
+        venue = snapshot.catalog.find(name)
+        if venue is None:
+            if location is None:
+                records.append(dict.fromkeys(SEARCH_FIELDS + ("city",), "") | {"name": name, "rating": 0.0})
+            continue
+        if location is None or venue.city == location:
+            records.append(dict(venue.to_dict(), city=venue.city))
+    return sorted(records, key=lambda record: record["rating"], reverse=True)
+
+
+def restaurant_search_tool(query: str, fields=None, top_k=None, location: str = None, format: str = None) -> str:
     """
     Simulated restaurant search tool with enhanced properties.
     In production, this would connect to Google Maps API, Yelp, or similar.
     
-    Returns restaurants with: name, cuisine, rating, price, address, 
-    weather suitability, peak hours, dietary options, ambiance
+    Returns the best rated restaurants (top_k, default TOOL_TOP_K) with:
+    name, cuisine, rating, price, address, weather suitability, peak hours,
+    dietary options, ambiance; ``fields`` selects a subset and ``format`` the
+    layout (see tool_output.py).
     """
     
-    # Simulated restaurant database with enhanced properties
-    restaurants_db = {
-        "San Francisco": [
-            {
-                "name": "Greens Restaurant",
-                "cuisine": "Vegetarian/Vegan",
-                "rating": 4.8,
-                "price_range": "$$$",
-                "address": "Building A, Fort Mason, San Francisco, CA 94123",
-                "weather_suitable": ["sunny", "clear", "partly_cloudy"],
-                "peak_hours": "12:00-13:30, 18:00-20:00",
-                "dietary_options": ["vegan", "vegetarian", "gluten-free"],
-                "ambiance": "upscale, romantic, with bay view",
-                "special_features": ["outdoor seating", "bay view", "wine selection"]
-            },
-            {
-                "name": "State Bird Provisions",
-                "cuisine": "American/Asian Fusion",
-                "rating": 4.7,
-                "price_range": "$$",
-                "address": "1529 Fillmore St, San Francisco, CA 94115",
-                "weather_suitable": ["any"],
-                "peak_hours": "11:30-13:00, 17:30-19:30",
-                "dietary_options": ["vegetarian", "pescatarian"],
-                "ambiance": "casual, trendy, intimate",
-                "special_features": ["dim sum style", "creative plating", "intimate setting"]
-            },
-            {
-                "name": "Gary Danko",
-                "cuisine": "French/Contemporary",
-                "rating": 4.9,
-                "price_range": "$$$$",
-                "address": "800 North Point St, San Francisco, CA 94109",
-                "weather_suitable": ["any"],
-                "peak_hours": "17:30-19:00, 20:00-21:30",
-                "dietary_options": ["vegetarian", "gluten-free"],
-                "ambiance": "fine dining, elegant, upscale",
-                "special_features": ["michelin star", "tasting menu", "sommelier service"]
-            }
-        ],
-        "Berlin": [
-            {
-                "name": "Nobelhart & Schmutzig",
-                "cuisine": "German/Contemporary",
-                "rating": 4.8,
-                "price_range": "$$$",
-                "address": "Friedrichstr. 218, 10969 Berlin, Germany",
-                "weather_suitable": ["any"],
-                "peak_hours": "18:00-19:30, 20:30-22:00",
-                "dietary_options": ["vegetarian"],
-                "ambiance": "fine dining, modern, minimalist",
-                "special_features": ["michelin star", "local ingredients", "tasting menu"]
-            },
-            {
-                "name": "Mustafa's Gemüse Kebap",
-                "cuisine": "Turkish/Street Food",
-                "rating": 4.6,
-                "price_range": "$",
-                "address": "Mehringdamm 32, 10961 Berlin, Germany",
-                "weather_suitable": ["sunny", "clear"],
-                "peak_hours": "12:00-14:00, 18:00-22:00",
-                "dietary_options": ["vegetarian", "vegan"],
-                "ambiance": "casual, street food, lively",
-                "special_features": ["famous kebab", "quick service", "budget-friendly"]
-            },
-            {
-                "name": "Zur Letzten Instanz",
-                "cuisine": "German/Traditional",
-                "rating": 4.5,
-                "price_range": "$$",
-                "address": "Waisenstr. 14-16, 10179 Berlin, Germany",
-                "weather_suitable": ["any"],
-                "peak_hours": "12:00-14:00, 18:00-21:00",
-                "dietary_options": ["vegetarian"],
-                "ambiance": "traditional, cozy, historic",
-                "special_features": ["oldest restaurant in Berlin", "traditional decor", "beer selection"]
-            }
-        ],
-        "Tokyo": [
-            {
-                "name": "Sukiyabashi Jiro",
-                "cuisine": "Sushi/Japanese",
-                "rating": 4.9,
-                "price_range": "$$$$",
-                "address": "4 Chome-2-15 Ginza, Chuo City, Tokyo 104-0061, Japan",
-                "weather_suitable": ["any"],
-                "peak_hours": "11:30-14:00, 16:30-20:30",
-                "dietary_options": ["pescatarian"],
-                "ambiance": "fine dining, minimalist, intimate",
-                "special_features": ["3 michelin stars", "omakase only", "counter seating"]
-            },
-            {
-                "name": "Ichiran Ramen",
-                "cuisine": "Ramen/Japanese",
-                "rating": 4.4,
-                "price_range": "$",
-                "address": "Multiple locations in Tokyo",
-                "weather_suitable": ["any"],
-                "peak_hours": "11:30-14:00, 17:00-22:00",
-                "dietary_options": ["vegetarian option available"],
-                "ambiance": "casual, lively, counter seating",
-                "special_features": ["famous ramen chain", "quick service", "individual booths"]
-            }
-        ]
-    }
-    
-    # Parse query to extract location
-    location = None
-    for city in restaurants_db.keys():
-        if city.lower() in query.lower():
-            location = city
-            break
-    
-    if not location:
-        location = "San Francisco"  # Default
-    
-    # Get restaurants for the location
-    restaurants = restaurants_db.get(location, [])
-    
-    # Format output
-    output = f"Found {len(restaurants)} restaurants in {location}:\n\n"
-    for i, rest in enumerate(restaurants, 1):
-        output += f"{i}. {rest['name']}\n"
-        output += f"   Cuisine: {rest['cuisine']}\n"
-        output += f"   Rating: {rest['rating']}/5.0\n"
-        output += f"   Price: {rest['price_range']}\n"
-        output += f"   Address: {rest['address']}\n"
-        output += f"   Weather Suitable: {', '.join(rest['weather_suitable'])}\n"
-        output += f"   Peak Hours: {rest['peak_hours']}\n"
-        output += f"   Dietary Options: {', '.join(rest['dietary_options'])}\n"
-        output += f"   Ambiance: {rest['ambiance']}\n"
-        output += f"   Special Features: {', '.join(rest['special_features'])}\n\n"
-    
-    return output
+    location = resolve_location(location or query)
+    if location is None:
+        return _unknown_location(query)
+    fields = parse_fields(fields, SEARCH_FIELDS)
+    return _cached_tool_output(("restaurant_search", location, fields, top_k, format),
+                               lambda snapshot: _render_restaurants(snapshot, location, fields, top_k, format))
+
+
+def _render_restaurants(snapshot, location, fields, top_k, format):
+    restaurants = [dict(venue.to_dict(), city=location) for venue in _ranked_venues(snapshot.catalog, location)]
+    table, shown = render_records(restaurants, fields, top_k, format)
+    header = f"Found {len(restaurants)} restaurants in {location}"
+    if len(shown) < len(restaurants):
+        header += f" (top {len(shown)} by rating)"
+    tags = {("city", location)} | {("venue", rest["name"]) for rest in restaurants}
+    return f"{header}:\n\n{table}", tags
 
 
 def weather_tool(location: str) -> str:
@@ -175,31 +207,20 @@ def weather_tool(location: str) -> str:
     In production, this would call OpenWeatherMap API or similar.
     """
     
-    weather_db = {
-        "San Francisco": {
-            "current": "Partly Cloudy",
-            "temperature": "65°F",
-            "humidity": "65%",
-            "wind": "10 mph",
-            "recommendation": "Perfect for outdoor dining with a light jacket"
-        },
-        "Berlin": {
-            "current": "Sunny",
-            "temperature": "72°F",
-            "humidity": "55%",
-            "wind": "8 mph",
-            "recommendation": "Excellent weather for outdoor seating"
-        },
-        "Tokyo": {
-            "current": "Clear",
-            "temperature": "68°F",
-            "humidity": "60%",
-            "wind": "5 mph",
-            "recommendation": "Beautiful weather, perfect for any dining experience"
-        }
-    }
-    
-    weather = weather_db.get(location, weather_db["San Francisco"])
+    return _cached_tool_output(("weather", location), lambda snapshot: _render_weather(snapshot, location))
+
+
+def _render_weather(snapshot, location):
+    weather_db = snapshot.weather
+    source = location
+    if source not in weather_db:
+        # A neighborhood or alias ("Kreuzberg", "SF") reports its city's weather
+        place = gazetteer().resolve(location)
+        source = gazetteer().city_of(place).name if place else None
+    if source not in weather_db:
+        covered = ", ".join(weather_db)
+        return f"No weather data for {location}. Weather data is available for: {covered}.", {("city", location)}
+    weather = weather_db[source]
     
     output = f"Weather in {location}:\n"
     output += f"Current: {weather['current']}\n"
@@ -208,7 +229,7 @@ def weather_tool(location: str) -> str:
     output += f"Wind: {weather['wind']}\n"
     output += f"Recommendation: {weather['recommendation']}\n"
     
-    return output
+    return output, {("city", location), ("city", source)}
 
 
 def peak_time_tool(restaurant_name: str) -> str:
@@ -216,33 +237,12 @@ def peak_time_tool(restaurant_name: str) -> str:
     Provides information about peak dining hours and recommendations.
     """
     
-    peak_info = {
-        "Greens Restaurant": {
-            "peak_hours": "12:00-13:30 (lunch), 18:00-20:00 (dinner)",
-            "best_time": "14:00-17:00 or after 20:30",
-            "wait_time_peak": "30-45 minutes",
-            "wait_time_off_peak": "5-10 minutes"
-        },
-        "State Bird Provisions": {
-            "peak_hours": "11:30-13:00 (lunch), 17:30-19:30 (dinner)",
-            "best_time": "13:30-17:00 or after 20:00",
-            "wait_time_peak": "45-60 minutes",
-            "wait_time_off_peak": "10-15 minutes"
-        },
-        "Gary Danko": {
-            "peak_hours": "17:30-19:00, 20:00-21:30",
-            "best_time": "Reservation required (no walk-ins)",
-            "wait_time_peak": "N/A - Reservation only",
-            "wait_time_off_peak": "N/A - Reservation only"
-        }
-    }
-    
-    info = peak_info.get(restaurant_name, {
-        "peak_hours": "12:00-14:00, 18:00-20:00",
-        "best_time": "Off-peak hours recommended",
-        "wait_time_peak": "20-30 minutes",
-        "wait_time_off_peak": "5-10 minutes"
-    })
+    return _cached_tool_output(("peak_time", restaurant_name),
+                               lambda snapshot: _render_peak_time(snapshot, restaurant_name))
+
+
+def _render_peak_time(snapshot, restaurant_name):
+    info = snapshot.peak_times.get(restaurant_name, DEFAULT_PEAK_INFO)
     
     output = f"Peak Time Information for {restaurant_name}:\n"
     output += f"Peak Hours: {info['peak_hours']}\n"
@@ -250,95 +250,98 @@ def peak_time_tool(restaurant_name: str) -> str:
     output += f"Wait Time (Peak): {info['wait_time_peak']}\n"
     output += f"Wait Time (Off-Peak): {info['wait_time_off_peak']}\n"
     
-    return output
+    return output, {("venue", restaurant_name)}
 
 
-def dietary_restrictions_tool(dietary_preference: str) -> str:
+def dietary_restrictions_tool(dietary_preference: str, fields=None, top_k=None, location: str = None,
+                              format: str = None) -> str:
     """
-    Filters restaurants based on dietary restrictions.
+    Filters restaurants based on dietary restrictions, optionally only those
+    in ``location``; ``fields``, ``top_k`` and ``format`` as for the search.
     """
     
-    dietary_db = {
-        "vegan": ["Greens Restaurant", "State Bird Provisions", "Mustafa's Gemüse Kebap"],
-        "vegetarian": ["Greens Restaurant", "State Bird Provisions", "Nobelhart & Schmutzig", "Mustafa's Gemüse Kebap", "Zur Letzten Instanz"],
-        "gluten-free": ["Greens Restaurant", "Gary Danko", "Sukiyabashi Jiro"],
-        "pescatarian": ["State Bird Provisions", "Sukiyabashi Jiro"],
-        "halal": ["Mustafa's Gemüse Kebap"],
-        "kosher": []
-    }
-    
-    restaurants = dietary_db.get(dietary_preference.lower(), [])
-    
-    if restaurants:
-        output = f"Restaurants suitable for {dietary_preference} diet:\n"
-        for rest in restaurants:
-            output += f"• {rest}\n"
-    else:
-        output = f"No restaurants found with {dietary_preference} options in our database."
-    
-    return output
+    return _filtered_output("dietary", dietary_preference, fields, top_k, location, format)
 
 
-def ambiance_tool(ambiance_type: str) -> str:
+def ambiance_tool(ambiance_type: str, fields=None, top_k=None, location: str = None, format: str = None) -> str:
     """
-    Recommends restaurants based on desired ambiance.
+    Recommends restaurants based on desired ambiance, optionally only those
+    in ``location``; ``fields``, ``top_k`` and ``format`` as for the search.
     """
     
-    ambiance_db = {
-        "romantic": ["Greens Restaurant", "Gary Danko"],
-        "casual": ["State Bird Provisions", "Mustafa's Gemüse Kebap", "Ichiran Ramen"],
-        "fine dining": ["Gary Danko", "Nobelhart & Schmutzig", "Sukiyabashi Jiro"],
-        "business": ["Gary Danko", "Nobelhart & Schmutzig"],
-        "family-friendly": ["State Bird Provisions", "Ichiran Ramen"],
-        "trendy": ["State Bird Provisions"],
-        "traditional": ["Zur Letzten Instanz"],
-        "upscale": ["Greens Restaurant", "Gary Danko"]
-    }
-    
-    restaurants = ambiance_db.get(ambiance_type.lower(), [])
+    return _filtered_output("ambiance", ambiance_type, fields, top_k, location, format)
+
+
+def _filtered_output(dataset, term, fields, top_k, location, format):
+    city = None
+    if location:
+        city = resolve_location(location)
+        if city is None:
+            return _unknown_location(location)
+    fields = parse_fields(fields, LIST_FIELDS)
+    return _cached_tool_output((dataset, term, fields, top_k, city, format),
+                               lambda snapshot: _render_filtered(snapshot, dataset, term, fields, top_k, city, format))
+
+
+def _render_filtered(snapshot, dataset, term, fields, top_k, city, format):
+    key = term.lower()
+    names = getattr(snapshot, dataset).get(key, [])
+    restaurants = _venue_records(snapshot, names, city)
+    where = f" in {city}" if city else ""
     
     if restaurants:
-        output = f"Restaurants with {ambiance_type} ambiance:\n"
-        for rest in restaurants:
-            output += f"• {rest}\n"
+        title = f"Restaurants suitable for {term} diet" if dataset == "dietary" else f"Restaurants with {term} ambiance"
+        table, _ = render_records(restaurants, fields, top_k, format)
+        output = f"{title}{where}:\n{table}"
+    elif dataset == "dietary":
+        output = f"No restaurants found with {term} options{where} in our database."
     else:
-        output = f"No restaurants found with {ambiance_type} ambiance in our database."
+        output = f"No restaurants found with {term} ambiance{where} in our database."
     
-    return output
+    return output, {(dataset, key)} | {("venue", name) for name in names}
 
 
 # ============================================================================
 # TOOL WRAPPERS FOR CREWAI
 # ============================================================================
 
+# Agents' tool calls count against the run's budget; repeated identical calls
+# are answered from the run's memo (see budgets.py). The search and filter
+# tools also take a JSON object with fields / top_k / location / format
+# options, so an agent can ask for just what it needs (see tool_output.py).
+_TOOL_OPTIONS = (' Input: a plain string, or a JSON object with "{primary}" and optional "fields" (e.g. '
+                 '["name", "rating", "address"]), "top_k" (number of restaurants){location}.')
 restaurant_search = Tool(
     name="Restaurant Search",
-    func=restaurant_search_tool,
+    func=budgeted_tool("Restaurant Search", structured_tool(restaurant_search_tool, "query")),
     description="Search for restaurants with detailed information including address, weather suitability, peak hours, dietary options, and ambiance"
+    + _TOOL_OPTIONS.format(primary="query", location=""),
 )
 
 weather_info = Tool(
     name="Weather Information",
-    func=weather_tool,
+    func=budgeted_tool("Weather Information", weather_tool),
     description="Get current weather conditions and recommendations for a specific location"
 )
 
 peak_time_info = Tool(
     name="Peak Time Information",
-    func=peak_time_tool,
+    func=budgeted_tool("Peak Time Information", peak_time_tool),
     description="Get peak dining hours and wait times for a specific restaurant"
 )
 
 dietary_filter = Tool(
     name="Dietary Restrictions Filter",
-    func=dietary_restrictions_tool,
+    func=budgeted_tool("Dietary Restrictions Filter", structured_tool(dietary_restrictions_tool, "dietary_preference")),
     description="Filter restaurants based on dietary preferences (vegan, vegetarian, gluten-free, etc.)"
+    + _TOOL_OPTIONS.format(primary="dietary_preference", location=' and "location" (a city)'),
 )
 
 ambiance_filter = Tool(
     name="Ambiance Filter",
-    func=ambiance_tool,
+    func=budgeted_tool("Ambiance Filter", structured_tool(ambiance_tool, "ambiance_type")),
     description="Find restaurants with specific ambiance (romantic, casual, fine dining, etc.)"
+    + _TOOL_OPTIONS.format(primary="ambiance_type", location=' and "location" (a city)'),
 )
 
 tools = [restaurant_search, weather_info, peak_time_info, dietary_filter, ambiance_filter]
@@ -356,8 +359,8 @@ researcher = Agent(
     You excel at finding restaurants that match specific criteria and gathering comprehensive information about them. 
     You use the Restaurant Search tool to find options and consider factors like address, peak hours, and special features.""",
     tools=[restaurant_search],
-    llm=llm,
-    verbose=True
+    llm=RoutedModel("researcher", models, ROLE_TIERS["researcher"]),
+    verbose=CREW_VERBOSE
 )
 
 # Agent 2: Enhanced Analyst (considers weather, peak time, dietary, ambiance)
@@ -368,8 +371,21 @@ analyst = Agent(
     You analyze weather conditions, peak dining hours, dietary requirements, and desired ambiance. 
     You use multiple tools to gather comprehensive information and make the best recommendation based on all factors.""",
     tools=[weather_info, peak_time_info, dietary_filter, ambiance_filter],
-    llm=llm,
-    verbose=True
+    llm=RoutedModel("analyst", models, ROLE_TIERS["analyst"]),
+    verbose=CREW_VERBOSE
+)
+
+# Agent 2 in prefetch mode: tool results are gathered concurrently up front,
+# so the analyst reasons over them in one pass instead of a ReAct tool loop.
+analyst_prefetched = Agent(
+    role=analyst.role,
+    goal=analyst.goal,
+    backstory="""You are an expert dining consultant who considers multiple factors when recommending restaurants. 
+    You analyze weather conditions, peak dining hours, dietary requirements, and desired ambiance. 
+    You are given the results of all relevant weather, peak time, dietary and ambiance lookups and base your recommendation on them.""",
+    tools=[],
+    llm=analyst.llm,
+    verbose=CREW_VERBOSE
 )
 
 # Agent 3: Recommendation Generator
@@ -380,10 +396,13 @@ generator = Agent(
     You craft personalized, persuasive recommendations that explain why a restaurant is perfect for the user. 
     You consider weather, timing, dietary needs, and ambiance to create a compelling narrative around your recommendation.""",
     tools=[],
-    llm=llm,
-    verbose=True
+    llm=RoutedModel("generator", creative_models, ROLE_TIERS["generator"]),
+    verbose=CREW_VERBOSE
 )
 
+# Writes the comparative answer for fan-out requests (see _run_plan); plain text, not a ReAct step
+merger = RoutedModel("merger", creative_models, ROLE_TIERS["generator"], validate=None)
+
 
 # ============================================================================
 # TASKS DEFINITION
@@ -422,6 +441,25 @@ analysis_task = Task(
     agent=analyst
 )
 
+# Task 2 in prefetch mode: the tool results arrive through {prefetched_context}
+analysis_prefetched_task = Task(
+    description="""Analyze the restaurants found by the Researcher considering:
+    1. Current weather conditions for the location
+    2. Peak dining hours and wait times
+    3. Dietary restrictions: {dietary_restrictions}
+    4. Desired ambiance: {ambiance_preference}
+    
+    The weather, peak time, dietary and ambiance lookups have already been run for you; do not call any tools.
+    
+    Evaluate each restaurant against these criteria and identify the SINGLE BEST recommendation.
+    Explain your reasoning for each factor considered.
+    
+    Lookup results:
+    {prefetched_context}""",
+    expected_output=analysis_task.expected_output,
+    agent=analyst_prefetched
+)
+
 # Task 3: Generation
 generation_task = Task(
     description="""Based on the Analyst's recommendation, create a personalized restaurant recommendation that includes:
@@ -444,18 +482,153 @@ generation_task = Task(
 # CREW ORCHESTRATION
 # ============================================================================
 
-def create_crew():
-    """Create and return the CrewAI crew"""
+# Task templates in execution order: (name, template, previous task name)
+TASK_PIPELINE = [
+    ("research", research_task, None),
+    ("analysis", analysis_task, "research"),
+    ("generation", generation_task, "analysis"),
+]
+
+checkpoint_store = checkpoint_store_from_env()
+
+# Prefetch the analyst's tool lookups concurrently (set ANALYST_PREFETCH=0 for the tool loop)
+ANALYST_PREFETCH = os.environ.get("ANALYST_PREFETCH", "1") != "0"
+
+# "crew" (three agents) or "collapsed" (one generation); selectable per request
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "crew")
+
+
+def _task_inputs(name, inputs, weather=True):
+    """
+    The request inputs each task actually depends on (used for checkpoint
+    keys). The tool data is identified by its content hash, which stays valid
+    across restarts and processes sharing a checkpoint store. Analyses and
+    recommendations made without the weather lookup (the degraded tiers) are
+    kept apart from full ones.
+    """
+    if name == "research":
+        return {"user_preferences": inputs["user_preferences"], "data_digest": data_source.snapshot().digest}
+    return {
+        "dietary_restrictions": inputs["dietary_restrictions"],
+        "ambiance_preference": inputs["ambiance_preference"],
+        "data_digest": data_source.snapshot().digest,
+        "weather": weather,
+    }
+
+
+def _copy_task(template, reused_step=None):
+    """
+    A fresh per-request copy of a task template, so concurrent requests never
+    share task outputs. If the previous step was restored from a checkpoint,
+    its output is passed in through the ``{<step>_output}`` input.
+    """
+    description = template.description
+    if reused_step:
+        description += f"\n\nOutput of the earlier {reused_step} step (reused from a previous run):\n{{{reused_step}_output}}"
+    # Keep the instructions a byte-identical prefix so Ollama can reuse its KV cache
+    description = apply_layout(description)
+    return Task(description=description, expected_output=template.expected_output, agent=template.agent)
+
+
+def create_crew(completed=None, prefetch=False):
+    """
+    Create and return the CrewAI crew.
+
+    ``completed`` maps task names to checkpointed outputs; those tasks are left
+    out and the crew starts at the first task that still has to run. With
+    ``prefetch`` the analysis task expects its tool results in the
+    ``{prefetched_context}`` input instead of calling tools itself.
+    """
+    completed = completed or {}
+    tasks = []
+    for name, template, previous in TASK_PIPELINE:
+        if name in completed:
+            continue
+        if name == "analysis" and prefetch:
+            template = analysis_prefetched_task
+        tasks.append(_copy_task(template, previous if previous in completed else None))
+
     crew = Crew(
-        agents=[researcher, analyst, generator],
-        tasks=[research_task, analysis_task, generation_task],
-        verbose=True
+        agents=[task.agent for task in tasks],
+        tasks=tasks,
+        verbose=CREW_VERBOSE,
+        step_callback=step_callback,
+        task_callback=_task_finished
     )
     return crew
 
 
+def _task_finished(output):
+    """Log the task, then let a waiting higher-priority request take the slot before the next task."""
+    task_callback(output)
+    scheduler.yield_point()
+
+
+def _restore_checkpoints(inputs, weather=True):
+    """Outputs of the leading tasks whose checkpoints are still valid."""
+    completed = {}
+    if checkpoint_store is None:
+        return completed
+    for name, _, previous in TASK_PIPELINE:
+        upstream = [completed[previous]] if previous else []
+        output = checkpoint_store.get(checkpoint_key(name, _task_inputs(name, inputs, weather), upstream))
+        if output is None:
+            break
+        completed[name] = output
+    return completed
+
+
+def _save_checkpoints(inputs, completed, crew, weather=True):
+    if checkpoint_store is None:
+        return
+    outputs = dict(completed)
+    live_tasks = iter(crew.tasks)
+    for name, _, previous in TASK_PIPELINE:
+        if name in completed:
+            continue
+        output = task_output_text(next(live_tasks))
+        if output is None:
+            break
+        outputs[name] = output
+        upstream = [outputs[previous]] if previous else []
+        checkpoint_store.put(checkpoint_key(name, _task_inputs(name, inputs, weather), upstream), name, output)
+
+
+def _analysis_lookups(inputs, weather=True):
+    """Every tool call the analyst would make for this request, known from the inputs alone."""
+    location = resolve_location(inputs["user_preferences"])
+    lookups = []
+    if location is not None:
+        if weather:
+            lookups.append(Lookup("Weather Information", location, weather_tool))
+        # Only the venues the research step lists, and filters restricted to the location
+        for venue in _shown_venues(data_source.snapshot().catalog, location):
+            lookups.append(Lookup("Peak Time Information", venue.name, peak_time_tool))
+    for diet in split_terms(inputs["dietary_restrictions"]):
+        lookups.append(Lookup("Dietary Restrictions Filter", diet, partial(dietary_restrictions_tool, location=location)))
+    for ambiance in split_terms(inputs["ambiance_preference"]):
+        lookups.append(Lookup("Ambiance Filter", ambiance, partial(ambiance_tool, location=location)))
+    return lookups
+
+
+def _run_collapsed(inputs, weather=True):
+    """Gather all tool data concurrently, then run research, analysis and recommendation as one generation."""
+    search = Lookup("Restaurant Search", inputs["user_preferences"], restaurant_search_tool)
+    results = run_lookups([search] + _analysis_lookups(inputs, weather=weather))
+    return run_collapsed(
+        llm,
+        inputs["user_preferences"],
+        inputs["dietary_restrictions"],
+        inputs["ambiance_preference"],
+        search_results=results[0][1],
+        lookups=format_prefetched(results[1:]),
+    )
+
+
 def get_recommendation(user_preferences: str, dietary_restrictions: str = "no restrictions", 
-                       ambiance_preference: str = "casual") -> str:
+                       ambiance_preference: str = "casual", prefetch: bool = None,
+                       mode: str = None, profile: bool = None, priority: str = "interactive",
+                       tenant: str = "default") -> str:
     """
     Main function to get a restaurant recommendation
     
@@ -463,13 +636,26 @@ def get_recommendation(user_preferences: str, dietary_restrictions: str = "no re
         user_preferences: User's dining preferences (location, cuisine, etc.)
         dietary_restrictions: Dietary needs (vegan, vegetarian, gluten-free, etc.)
         ambiance_preference: Desired ambiance (romantic, casual, fine dining, etc.)
+        prefetch: Run the analyst's tool lookups concurrently up front instead of
+            in its ReAct loop (defaults to the ANALYST_PREFETCH setting)
+        mode: "crew" runs the three agents; "collapsed" gathers the tool data up
+            front and produces research, analysis and recommendation in a single
+            generation (defaults to the PIPELINE_MODE setting)
+        profile: Record a sampling profile of this request (defaults to
+            sampling at PROFILE_SAMPLE_RATE; see profiling.py)
+        priority: Scheduling class, "interactive", "api" or "batch" (see scheduler.py)
+        tenant: Session or job the request belongs to; tenants share their
+            class fairly. Under load, interactive and api requests are served
+            at a reduced tier (see degradation.py); batch requests never are
+    
+    Comparison requests ("sushi in Tokyo vs Berlin") gather each option's
+    data concurrently and are answered in one comparative generation (see
+    query_planner.py).
     
     Returns:
         Personalized restaurant recommendation
     """
     
-    crew = create_crew()
-    
     # Prepare inputs for tasks
     inputs = {
         "user_preferences": user_preferences,
@@ -477,12 +663,228 @@ def get_recommendation(user_preferences: str, dietary_restrictions: str = "no re
         "ambiance_preference": ambiance_preference
     }
     
-    # Execute the crew
-    result = crew.kickoff(inputs=inputs)
+    plan = plan_query(user_preferences)
+    locations = [resolve_location(subquery.text) for subquery in plan.subqueries] if plan else \
+        [resolve_location(user_preferences)]
+    for location in locations:
+        traffic.record(location)
+    key = _materialization_key(inputs) if plan is None and locations[0] is not None else None
+    with request_scope() as request_id:
+        answer = materialized_recommendations.get(key)
+        if answer is not None:
+            crew_log.info("Served the materialized recommendation for '%s'", canonical_preference(key))
+            return answer
+        with scheduler.slot(priority, tenant), profile_request("get_recommendation", profile), \
+                track_request("get_recommendation"), budget_scope():
+            tier = "full" if priority == "batch" else degradation.admit(request_id)
+            if plan is not None:
+                return with_tier_note(_run_plan(inputs, plan, tier), tier)
+            return with_tier_note(_get_recommendation(inputs, prefetch, mode, tier), tier)
+
+
+# Each option of a comparison gets a narrower search, so all of them fit the context together
+COMPARISON_FIELDS = ("name", "cuisine", "rating", "price_range", "address", "peak_hours", "ambiance")
+COMPARISON_TOP_K = 3
+
+
+def _run_plan(inputs, plan, tier="full"):
+    """
+    Answer a comparison: gather every option's search and lookups concurrently
+    (through the shared tool caches), then compare them in one generation.
+    """
+
+    def gather(subquery):
+        search = partial(restaurant_search_tool, fields=COMPARISON_FIELDS, top_k=COMPARISON_TOP_K)
+        lookups = [
+            lookup for lookup in _analysis_lookups(dict(inputs, user_preferences=subquery.text), weather=tier == "full")
+            if lookup.tool != "Peak Time Information"  # Peak hours are in the search fields
+        ]
+        results = run_lookups([Lookup("Restaurant Search", subquery.text, search)] + lookups)
+        return f"Restaurants:\n{results[0][1].strip()}\n\n{format_prefetched(results[1:])}".strip()
+
+    with data_source.pinned():
+        crew_log.info("Comparing %s", ", ".join(plan.labels))
+        results = fan_out(plan.subqueries, gather)
+        research = [
+            CollapsedTaskOutput(f"Research: {subquery.label}", "Restaurant Researcher", data)
+            for subquery, data in results
+        ]
+        if tier == "data_only":
+            return CollapsedResult(raw=merged_fallback(results), tasks_output=research, mode="data_only")
+        request = (f"{inputs['user_preferences']} (dietary restrictions: {inputs['dietary_restrictions']}; "
+                   f"ambiance: {inputs['ambiance_preference']})")
+        text = merger.invoke(merge_prompt(request, results))
+    text = getattr(text, "content", text)
+    return CollapsedResult(
+        raw=text,
+        tasks_output=research + [CollapsedTaskOutput("Comparison", "Personalized Recommendation Generator", text)],
+        mode="comparison",
+    )
+
+
+def _get_recommendation(inputs, prefetch, mode, tier="full"):
+    # Execute the crew against one consistent version of the tool data
+    with data_source.pinned():
+        if tier != "full":
+            crew_log.info("Serving at degradation tier %s", tier)
+        if tier == "data_only":
+            return _data_only_recommendation(inputs)
+        weather = tier == "full"
+        if (mode or PIPELINE_MODE) == "collapsed":
+            crew_log.info("Running collapsed pipeline")
+            return _run_collapsed(inputs, weather=weather)
+
+        # Resume after the tasks whose inputs haven't changed since an earlier run
+        completed = _restore_checkpoints(inputs, weather)
+        if len(completed) == len(TASK_PIPELINE):
+            crew_log.info("All tasks restored from checkpoints")
+            return completed["generation"]
+        if completed:
+            crew_log.info("Resuming crew after checkpointed tasks: %s", ", ".join(completed))
+        if tier == "cached_research" and "research" not in completed:
+            # The catalog search output stands in for the research agent
+            completed["research"] = restaurant_search_tool(inputs["user_preferences"])
+        inputs.update({f"{name}_output": output for name, output in completed.items()})
+
+        # Reduced tiers skip the analyst's tool loop as well as the weather lookup
+        if prefetch is None:
+            prefetch = ANALYST_PREFETCH
+        prefetch = prefetch or tier != "full"
+        if prefetch and "analysis" not in completed:
+            inputs["prefetched_context"] = format_prefetched(run_lookups(_analysis_lookups(inputs, weather=weather)))
+
+        crew = create_crew(completed, prefetch=prefetch)
+        watch(crew, "crew")
+        for task in crew.tasks:
+            watch(task, "task")
+        crew_log.info("Starting crew (prefetch=%s)", bool(prefetch))
+        # The agents are module-level; don't let this request's state ride along to the next one
+        with agents_in_use(crew.agents):
+            result = crew.kickoff(inputs=inputs)
+        watch(result, "result")
+        crew_log.info("Crew finished")
+        _save_checkpoints(inputs, completed, crew, weather)
     
     return result
 
 
+def _data_only_recommendation(inputs):
+    """A deterministic answer from the catalog data alone, without LLM calls (the data_only tier)."""
+    search = Lookup("Restaurant Search", inputs["user_preferences"], restaurant_search_tool)
+    results = run_lookups([search] + _analysis_lookups(inputs, weather=False))
+    research, details = results[0][1].strip(), format_prefetched(results[1:])
+    text = f"### Restaurants matching your preferences\n\n{research}"
+    if details:
+        text += f"\n\n### Peak times, dietary options and ambiance\n\n{details}"
+    return CollapsedResult(
+        raw=text,
+        tasks_output=[
+            CollapsedTaskOutput("Research", "Restaurant Researcher", research),
+            CollapsedTaskOutput("Analysis", "Dining Experience Analyst", details),
+        ],
+        mode="data_only",
+    )
+
+
+# ============================================================================
+# MATERIALIZED RECOMMENDATIONS
+# ============================================================================
+
+def _materialization_key(inputs):
+    return query_key(
+        inputs["user_preferences"],
+        dietary=", ".join(sorted(split_terms(inputs["dietary_restrictions"]))) or "no restrictions",
+        ambiance=", ".join(sorted(split_terms(inputs["ambiance_preference"]))) or "casual",
+    )
+
+
+def _weather_condition(city):
+    """The city's venues that suit its current weather; only a change in this invalidates its materialized answers."""
+    snapshot = data_source.snapshot()
+    current = normalize(snapshot.weather.get(city, {}).get("current", "")).replace(" ", "_")
+    return frozenset(
+        venue.name for venue in snapshot.catalog.venues_in(city) if {"any", current} & set(venue.weather_suitable)
+    )
+
+
+def _materialize(key):
+    """Run the crew for a popular query at batch priority and within the usual budgets, for materialized_recommendations."""
+    options = dict(key.options)
+    inputs = {
+        "user_preferences": canonical_preference(key),
+        "dietary_restrictions": options["dietary"],
+        "ambiance_preference": options["ambiance"],
+    }
+    with request_scope(), scheduler.slot("batch", "materializer"), budget_scope():
+        result = _get_recommendation(inputs, None, None)
+    venues = data_source.snapshot().catalog.venues_in(key.city)
+    return str(result), {("venue", venue.name) for venue in venues}
+
+
+def _invalidate_materialized(change):
+    """Catalog and tool data updates drop the answers that list a changed venue; weather updates only condition changes."""
+    tags = {("venue", venue) for venue in change.venues}
+    if "restaurants" in change.datasets:
+        tags |= {("city", city) for city in change.cities}
+    materialized_recommendations.invalidate(tags)
+    if "weather" in change.datasets:
+        materialized_recommendations.check_conditions()
+
+
+materialized_recommendations = MaterializedRecommendations(_materialize, condition=_weather_condition)
+data_source.subscribe(_invalidate_materialized)
+
+
+# ============================================================================
+# WARM-UP
+# ============================================================================
+
+def _load_model():
+    """Load the models into GPU memory with a one-token generation (same num_ctx, so they aren't reloaded later)."""
+    loaded = []
+    for model in dict.fromkeys(OLLAMA_MODELS.values()):
+        response = requests.post(
+            f"{OLLAMA_SETTINGS['base_url']}/api/generate",
+            json={
+                "model": model,
+                "prompt": "Hello",
+                "stream": False,
+                "keep_alive": OLLAMA_SETTINGS["keep_alive"],
+                "options": {"num_predict": 1, "num_ctx": OLLAMA_SETTINGS["num_ctx"]},
+            },
+            timeout=600,
+        )
+        response.raise_for_status()
+        loaded.append(f"{model} in {response.json().get('load_duration', 0) / 1e9:.1f}s")
+    return "loaded " + ", ".join(loaded)
+
+
+def _prime_tool_caches(top_n):
+    """Render the search, weather and peak time outputs for the most requested cities (and start the prefetch pool)."""
+    catalog = data_source.snapshot().catalog
+    cities = [city for city in traffic.top(top_n) if city in catalog.cities] or list(catalog.cities)[:top_n]
+    lookups = []
+    for city in cities:
+        lookups.append(Lookup("Restaurant Search", city, restaurant_search_tool))
+        lookups.append(Lookup("Weather Information", city, weather_tool))
+        for venue in _shown_venues(catalog, city):
+            lookups.append(Lookup("Peak Time Information", venue.name, peak_time_tool))
+    run_lookups(lookups)
+    return f"{len(lookups)} lookups for {', '.join(cities)}"
+
+
+def warmup_steps(top_n=WARMUP_TOP_CITIES):
+    """Warm-up for this process; see warmup.py."""
+    return [
+        WarmupStep("model", _load_model),
+        WarmupStep("crew", lambda: f"{len(create_crew().tasks)} tasks"),
+        WarmupStep("gazetteer", lambda: f"{len(gazetteer().places)} places"),
+        WarmupStep("tool caches", lambda: _prime_tool_caches(top_n), required=False),
+        WarmupStep("materializer", materialized_recommendations.start, required=False),
+        WarmupStep("memory monitor", memory_monitor.start, required=False),
+    ]
+
+
 # ============================================================================
 # TESTING
 # ============================================================================
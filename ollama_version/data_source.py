@@ -0,0 +1,344 @@
+"""
+Hot-reloadable data layer for the Ollama recommender tools.
+
+All tool data (restaurant catalog, weather, peak times, dietary and ambiance
+indexes) is loaded from files in a data directory into an immutable,
+versioned Snapshot.  A background watcher polls the files and, when one
+changes, rebuilds only that dataset and swaps in a new snapshot atomically.
+
+Requests pin the snapshot that was current when they started (see
+``DataSource.pinned``), so an update landing mid-request never mixes two
+versions.  Subscribers receive a Change describing which cities and venues
+were affected, so caches can drop just those entries.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from catalog import Catalog, load_records
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_DIR = Path(__file__).parent / "data"
+
+# Dataset name -> file name (without extension for the catalog, see _dataset_path).
+DATASETS = {
+    "restaurants": "restaurants",
+    "weather": "weather.json",
+    "peak_times": "peak_times.json",
+    "dietary": "dietary.json",
+    "ambiance": "ambiance.json",
+}
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """One consistent version of every tool dataset."""
+
+    version: int
+    catalog: Catalog
+    weather: dict
+    peak_times: dict
+    dietary: dict
+    ambiance: dict
+    # Content hash of the dataset files; ``version`` only counts reloads within this process
+    digest: str
+    loaded_at: float = field(default_factory=time.time)
+
+
+@dataclass(frozen=True)
+class Change:
+    """What changed between two snapshot versions."""
+
+    version: int
+    datasets: frozenset
+    cities: frozenset
+    venues: frozenset
+    # (dataset, key) pairs for keyed datasets, e.g. ("dietary", "vegan")
+    keys: frozenset = frozenset()
+
+    def affects(self, city=None, venue=None):
+        return (city is not None and city in self.cities) or (venue is not None and venue in self.venues)
+
+    def tags(self):
+        """Cache tags invalidated by this change (see TaggedCache)."""
+        tags = {("city", city) for city in self.cities}
+        tags |= {("venue", venue) for venue in self.venues}
+        return tags | self.keys
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _combined_digest(digests):
+    return hashlib.sha256("".join(f"{name}:{digests[name]}\n" for name in sorted(digests)).encode()).hexdigest()
+
+
+def _diff_keys(old, new):
+    """Keys whose values were added, removed or modified."""
+    return {key for key in old.keys() | new.keys() if old.get(key) != new.get(key)}
+
+
+def _diff_index(old, new):
+    """Venue names that entered or left any list of a ``{key: [venue, ...]}`` index."""
+    venues = set()
+    for key in old.keys() | new.keys():
+        venues |= set(old.get(key, [])) ^ set(new.get(key, []))
+    return venues
+
+
+def _diff_catalogs(old, new):
+    """Cities and venue names whose rows were added, removed or modified (compared by row digest)."""
+    changed = _diff_keys(old.row_digests(), new.row_digests())
+    return {city for city, _ in changed}, {name for _, name in changed}
+
+
+class DataSource:
+    """Loads tool datasets from ``data_dir`` and swaps in new snapshots on change."""
+
+    def __init__(self, data_dir=None, catalog_path=None):
+        self.data_dir = Path(data_dir or os.environ.get("RESTAURANT_DATA_DIR") or DEFAULT_DATA_DIR)
+        self.catalog_path = catalog_path or os.environ.get("RESTAURANT_CATALOG")
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._stamps = {}
+        self._digests = {}
+        self._pinned = contextvars.ContextVar(f"pinned_snapshot_{id(self)}", default=None)
+        self._watcher = None
+        self._stop = threading.Event()
+
+        datasets = {}
+        for name in DATASETS:
+            datasets[name], self._stamps[name], self._digests[name] = self._load(name)
+        self._snapshot = Snapshot(version=1, digest=_combined_digest(self._digests), **self._as_fields(datasets))
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _dataset_path(self, name):
+        if name == "restaurants":
+            if self.catalog_path:
+                return Path(self.catalog_path)
+            binary = self.data_dir / "restaurants.rcat"
+            return binary if binary.exists() else self.data_dir / "restaurants.json"
+        return self.data_dir / DATASETS[name]
+
+    @staticmethod
+    def _stamp(path):
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, name):
+        """Load one dataset; returns the value, the file stamp it was read at and the file's content hash."""
+        path = self._dataset_path(name)
+        stamp = (path, self._stamp(path))
+        if name == "restaurants":
+            value = Catalog.open(path) if path.suffix == ".rcat" else Catalog.from_records(load_records(path))
+            digest = _file_digest(path)
+        else:
+            data = path.read_bytes()
+            value = json.loads(data.decode("utf-8"))
+            digest = hashlib.sha256(data).hexdigest()
+        return value, stamp, digest
+
+    @staticmethod
+    def _as_fields(datasets):
+        fields = dict(datasets)
+        if "restaurants" in fields:
+            fields["catalog"] = fields.pop("restaurants")
+        return fields
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    def snapshot(self):
+        """The snapshot pinned to the current request, or the latest one."""
+        return self._pinned.get() or self._snapshot
+
+    def is_latest(self, snapshot):
+        """Whether ``snapshot`` is still the newest version (safe to populate caches from)."""
+        return snapshot is self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    @contextmanager
+    def pinned(self):
+        """Pin the current snapshot for the duration of a request."""
+        if self._pinned.get() is not None:
+            yield self._pinned.get()
+            return
+        token = self._pinned.set(self._snapshot)
+        try:
+            yield self._pinned.get()
+        finally:
+            self._pinned.reset(token)
+
+    def subscribe(self, listener):
+        """Call ``listener(change)`` after every snapshot swap."""
+        self._listeners.append(listener)
+        return listener
+
+    def reload(self):
+        """
+        Reload datasets whose files changed since the last load.
+
+        Returns the Change that was applied, or None if nothing changed or a
+        file could not be parsed (the previous snapshot stays in place).
+        """
+        with self._lock:
+            changed = {}
+            for name in DATASETS:
+                path = self._dataset_path(name)
+                try:
+                    current = (path, self._stamp(path))
+                except OSError:
+                    continue
+                if current != self._stamps.get(name):
+                    changed[name] = path
+            if not changed:
+                return None
+
+            loaded, stamps, digests = {}, {}, {}
+            try:
+                for name in changed:
+                    loaded[name], stamps[name], digests[name] = self._load(name)
+            except (OSError, ValueError) as exc:
+                logger.warning("Keeping data version %s; reload failed: %s", self._snapshot.version, exc)
+                return None
+            self._stamps.update(stamps)
+            self._digests.update(digests)
+
+            old = self._snapshot
+            fields = self._as_fields(loaded)
+            cities, venues, keys = set(), set(), set()
+            if "catalog" in fields:
+                catalog_cities, catalog_venues = _diff_catalogs(old.catalog, fields["catalog"])
+                cities |= catalog_cities
+                venues |= catalog_venues
+            if "weather" in fields:
+                cities |= _diff_keys(old.weather, fields["weather"])
+            if "peak_times" in fields:
+                venues |= _diff_keys(old.peak_times, fields["peak_times"])
+            for name in ("dietary", "ambiance"):
+                if name in fields:
+                    venues |= _diff_index(getattr(old, name), fields[name])
+                    keys |= {(name, key) for key in _diff_keys(getattr(old, name), fields[name])}
+
+            current = {
+                "catalog": old.catalog,
+                "weather": old.weather,
+                "peak_times": old.peak_times,
+                "dietary": old.dietary,
+                "ambiance": old.ambiance,
+            }
+            current.update(fields)
+            self._snapshot = Snapshot(version=old.version + 1, digest=_combined_digest(self._digests), **current)
+            change = Change(
+                version=self._snapshot.version,
+                datasets=frozenset(changed),
+                cities=frozenset(cities),
+                venues=frozenset(venues),
+                keys=frozenset(keys),
+            )
+
+        logger.info(
+            "Loaded data version %s (datasets: %s, cities: %s, venues: %s)",
+            change.version, ", ".join(sorted(change.datasets)), len(change.cities), len(change.venues),
+        )
+        for listener in list(self._listeners):
+            try:
+                listener(change)
+            except Exception:
+                logger.exception("Data change listener failed")
+        return change
+
+    # ------------------------------------------------------------------
+    # Watching
+    # ------------------------------------------------------------------
+
+    def start_watching(self, interval=2.0):
+        """Poll the data files every ``interval`` seconds in a daemon thread."""
+        if self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(interval):
+                try:
+                    self.reload()
+                except Exception:
+                    logger.exception("Data reload failed")
+
+        self._watcher = threading.Thread(target=watch, name="data-source-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+class TaggedCache:
+    """
+    A small cache whose entries carry tags such as ``("city", "Berlin")`` or
+    ``("dietary", "vegan")``, so a data Change only evicts the entries that
+    depend on what actually changed.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def put(self, key, value, tags=(), valid=None):
+        """
+        Store ``value``; with ``valid``, only if ``valid()`` still holds under the
+        cache lock (checked atomically with the insert, so an invalidation can't
+        slip in between). Returns whether it was stored.
+        """
+        with self._lock:
+            if valid is not None and not valid():
+                return False
+            if len(self._entries) >= self.max_entries and key not in self._entries:
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (value, frozenset(tags))
+            return True
+
+    def invalidate(self, change):
+        """Drop entries tagged with anything ``change`` touched; returns the count."""
+        changed = change.tags()
+        with self._lock:
+            stale = [key for key, (_, tags) in self._entries.items() if tags & changed]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
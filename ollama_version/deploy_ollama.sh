@@ -96,7 +96,8 @@ fi
 print_header "PHASE 4: Ollama Service Setup"
 
 print_info "Starting Ollama service..."
-ollama serve &
+# One KV-cache slot per agent, so each agent's static prompt prefix stays cached
+OLLAMA_NUM_PARALLEL="${OLLAMA_NUM_PARALLEL:-3}" ollama serve &
 OLLAMA_PID=$!
 print_info "Ollama PID: $OLLAMA_PID"
 
@@ -126,9 +127,26 @@ else
     print_success "Neural Chat 7B model downloaded successfully"
 fi
 
+# Small model the researcher agent is routed to (see model_routing.py)
+if ollama list | grep -q "llama3.2:3b"; then
+    print_success "Llama 3.2 3B model already installed"
+else
+    print_warning "Downloading Llama 3.2 3B model..."
+    ollama pull llama3.2:3b
+    print_success "Llama 3.2 3B model downloaded successfully"
+fi
+
 print_info "Installed models:"
 ollama list
 
+print_info "Loading the models into GPU memory..."
+# A one-token generation with the app's num_ctx, so the first request doesn't pay for the load
+for model in neural-chat llama3.2:3b; do
+    curl -s http://localhost:11434/api/generate \
+        -d "{\"model\": \"$model\", \"prompt\": \"Hello\", \"stream\": false, \"keep_alive\": \"30m\", \"options\": {\"num_predict\": 1, \"num_ctx\": 2048}}" \
+        > /dev/null && print_success "$model loaded" || print_warning "$model warm-up failed; the first request will load it"
+done
+
 # ============================================================================
 # PHASE 6: PYTHON VIRTUAL ENVIRONMENT
 # ============================================================================
@@ -226,11 +244,22 @@ ${BLUE}To start the Streamlit application:${NC}
 
 ${BLUE}For production (background) deployment:${NC}
 
-   ${YELLOW}nohup streamlit run app_ollama.py --server.port 8501 --server.address 0.0.0.0 > streamlit_ollama.log 2>&1 &${NC}
+   ${YELLOW}nohup python ../serve.py app_ollama.py --port 8501 --address 0.0.0.0 > streamlit_ollama.log 2>&1 &${NC}
+
+   serve.py warms the app up (model, crew, connections, tool caches for the most
+   requested cities) before the first session. Wait for readiness before
+   sending traffic, and point load balancer health checks at the same URL:
+
+   ${YELLOW}until curl -sf http://localhost:8599/ready > /dev/null; do sleep 2; done${NC}
+
+   Crew events no longer go to stdout, so streamlit_ollama.log only holds server
+   output and warnings. Agent steps and task results are written asynchronously
+   to a size-rotated log (10 MB x 5 by default; see CREW_LOG_* settings).
 
 ${BLUE}Monitor the application:${NC}
 
    ${YELLOW}tail -f streamlit_ollama.log${NC}
+   ${YELLOW}tail -f ~/.cache/crewai-restaurant/logs/crew.log${NC}
 
 ${BLUE}System Information:${NC}
 
@@ -243,7 +272,7 @@ ${BLUE}Troubleshooting:${NC}
 
    - Check Ollama: ${YELLOW}curl http://localhost:11434/api/tags${NC}
    - Check GPU: ${YELLOW}nvidia-smi${NC}
-   - Check logs: ${YELLOW}tail -f streamlit_ollama.log${NC}
+   - Check logs: ${YELLOW}tail -f streamlit_ollama.log ~/.cache/crewai-restaurant/logs/crew.log${NC}
 
 ========================================
 
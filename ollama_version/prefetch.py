@@ -0,0 +1,76 @@
+"""
+Concurrent tool prefetch for the Dining Experience Analyst.
+
+Instead of letting the analyst discover tool calls one ReAct round at a time
+(each round costing a full LLM generation just to decide on the next call),
+every lookup the analysis needs is known up front from the location, dietary
+and ambiance inputs. The lookups run concurrently and their combined output is
+handed to the analyst as context, so it can answer in a single pass.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+from request_context import context_task
+
+DEFAULT_MAX_WORKERS = 8
+
+_executor = None
+
+
+@dataclass(frozen=True)
+class Lookup:
+    """One tool call to prefetch: ``func(argument)``, reported under ``tool``."""
+
+    tool: str
+    argument: str
+    func: Callable[[str], str]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix="tool-prefetch")
+    return _executor
+
+
+def split_terms(value, ignore=("none", "no restrictions", "no restriction")):
+    """Split a comma-separated UI selection ("Vegan, Gluten-Free") into tool arguments."""
+    terms = []
+    for term in (value or "").split(","):
+        term = term.strip()
+        if term and term.lower() not in ignore and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def run_lookups(lookups, timeout=None):
+    """
+    Run ``lookups`` concurrently and return ``[(lookup, output), ...]`` in input order.
+
+    Each lookup runs in a copy of the caller's context, so request-scoped state
+    (such as the pinned data snapshot) is visible to the tool functions. A
+    failing lookup yields an error line instead of failing the whole batch.
+    """
+    executor = _get_executor()
+    futures = [executor.submit(context_task(lookup.func, lookup.argument)) for lookup in lookups]
+    deadline = None if timeout is None else time.monotonic() + timeout
+    results = []
+    for lookup, future in zip(lookups, futures):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            output = future.result(timeout=remaining)
+        except Exception as exc:
+            output = f"{lookup.tool} lookup failed for '{lookup.argument}': {exc}"
+        results.append((lookup, output))
+    return results
+
+
+def format_prefetched(results):
+    """Render prefetched tool results as one context block for the analyst prompt."""
+    sections = []
+    for lookup, output in results:
+        sections.append(f"[{lookup.tool}: {lookup.argument}]\n{output.strip()}")
+    return "\n\n".join(sections)
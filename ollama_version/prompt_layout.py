@@ -0,0 +1,62 @@
+"""
+Prefix-cache-friendly prompt layout for the Ollama crew.
+
+Ollama reuses the KV cache for the longest prompt prefix it has already
+evaluated. The task templates interpolate per-request values such as
+``{user_preferences}`` and ``{dietary_restrictions}`` in the middle of the
+instructions, so every request diverges from the cached prefix early and the
+whole backstory + instructions get re-evaluated.
+
+``prefix_friendly`` rewrites a template so every placeholder is replaced by a
+reference to a "Request details" block appended at the very end. Everything
+before that block is byte-identical across requests.
+"""
+
+import os
+import re
+
+PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+# Human-readable labels for the request details block
+LABELS = {
+    "user_preferences": "User preferences",
+    "dietary_restrictions": "Dietary restrictions",
+    "ambiance_preference": "Desired ambiance",
+    "prefetched_context": "Lookup results",
+    "research_output": "Researcher findings",
+    "analysis_output": "Analyst recommendation",
+}
+
+# "prefix" (default) moves request values to the end; "inline" keeps the original templates
+PROMPT_LAYOUT = os.environ.get("PROMPT_LAYOUT", "prefix")
+
+
+def _label(name):
+    return LABELS.get(name, name.replace("_", " ").capitalize())
+
+
+def prefix_friendly(description):
+    """
+    Return ``description`` with all ``{placeholders}`` moved into a trailing
+    "Request details" block, keeping the instructions as a static prefix.
+    """
+    names = []
+
+    def reference(match):
+        name = match.group(1)
+        if name not in names:
+            names.append(name)
+        return "(see Request details below)"
+
+    body = PLACEHOLDER.sub(reference, description)
+    if not names:
+        return description
+    details = "\n\n".join(f"{_label(name)}:\n{{{name}}}" for name in names)
+    return f"{body.rstrip()}\n\nRequest details\n---------------\n{details}"
+
+
+def apply_layout(description, layout=None):
+    """Lay out a task description according to ``layout`` (default: PROMPT_LAYOUT)."""
+    if (layout or PROMPT_LAYOUT) == "prefix":
+        return prefix_friendly(description)
+    return description
@@ -0,0 +1,202 @@
+"""
+Compact, projected tool outputs for the Ollama recommender.
+
+Every byte a tool returns becomes prompt tokens for the next generation, and
+with a 2048-token context an oversized search result both slows the model
+down and pushes the instructions out of the window. The tools therefore
+render their records through ``render_records``:
+
+  - ``fields`` projects each record onto the fields the caller asked for,
+  - ``top_k`` keeps only the first K records (the tools rank by rating),
+  - ``format`` picks the layout: "table" (one dense row per record, a
+    Markdown table), "jsonl" (one compact JSON object per line) or "text"
+    (the original labelled block per record).
+
+Agents pass these options by giving a tool a JSON object instead of a plain
+string, e.g. ``{"query": "Italian in Berlin", "fields": ["name", "rating"],
+"top_k": 3}`` (see ``parse_tool_input``).
+
+``record_output_size`` keeps a tokens-per-output histogram per tool in
+``metrics`` (tool_output_tokens); ``python bench_tool_output.py`` compares the
+formats on the bundled data.
+
+Settings: TOOL_OUTPUT_FORMAT ("table"), TOOL_TOP_K (5 records; 0 for all).
+"""
+
+import json
+import math
+import os
+
+from metrics import metrics
+
+FORMATS = ("table", "jsonl", "text")
+DEFAULT_FORMAT = os.environ.get("TOOL_OUTPUT_FORMAT", "table")
+DEFAULT_TOP_K = int(os.environ.get("TOOL_TOP_K", "5"))
+
+if DEFAULT_FORMAT not in FORMATS:
+    raise ValueError(f"TOOL_OUTPUT_FORMAT={DEFAULT_FORMAT!r}; use one of {', '.join(FORMATS)}")
+
+# Labels for the "text" format, in the order fields are rendered by default
+FIELD_LABELS = {
+    "name": "Name",
+    "city": "City",
+    "cuisine": "Cuisine",
+    "rating": "Rating",
+    "price_range": "Price",
+    "address": "Address",
+    "weather_suitable": "Weather Suitable",
+    "peak_hours": "Peak Hours",
+    "dietary_options": "Dietary Options",
+    "ambiance": "Ambiance",
+    "special_features": "Special Features",
+}
+
+# Rough characters per token for the Llama / Neural Chat tokenizers on this kind of text
+CHARS_PER_TOKEN = 4
+
+_TOKEN_BUCKETS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+
+
+def estimate_tokens(text):
+    """Approximate prompt tokens ``text`` costs (no tokenizer needed)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def record_output_size(tool, text):
+    """Count one tool output's size in ``metrics``; returns ``text`` unchanged."""
+    metrics.observe("tool_output_tokens", estimate_tokens(text), buckets=_TOKEN_BUCKETS, tool=tool)
+    metrics.inc("tool_output_chars_total", len(text), tool=tool)
+    return text
+
+
+def parse_fields(fields, default):
+    """
+    The known fields out of a list or comma-separated string, in the order
+    given; ``default`` when none are given (unknown names are ignored).
+    """
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    if not fields or not isinstance(fields, (list, tuple)):
+        return tuple(default)
+    names = [field.strip().lower().replace(" ", "_") for field in fields if isinstance(field, str)]
+    names = ["price_range" if name == "price" else name for name in names]
+    return tuple(dict.fromkeys(name for name in names if name in FIELD_LABELS)) or tuple(default)
+
+
+def parse_tool_input(argument, primary):
+    """
+    Split an agent's tool input into keyword arguments.
+
+    A JSON object is taken as the tool's options (its ``primary`` argument may
+    be given under that name or as "query"); anything else is the primary
+    argument itself. Options of the wrong type are dropped, so their defaults
+    apply: a ``top_k`` that isn't a non-negative whole number, ``fields`` that
+    aren't a string or a list of strings, a ``location`` that isn't a
+    non-empty string and a ``format`` that isn't one of FORMATS.
+    """
+    text = argument.strip() if isinstance(argument, str) else argument
+    if isinstance(text, str) and text.startswith("{"):
+        try:
+            options = json.loads(text)
+        except ValueError:
+            options = None
+        if isinstance(options, dict):
+            value = options.pop(primary, None) or options.pop("query", None) or ""
+            options = {key: _OPTIONS[key](value) for key, value in options.items() if key in _OPTIONS}
+            options = {key: value for key, value in options.items() if value is not None}
+            return dict(options, **{primary: str(value)})
+    return {primary: text if isinstance(text, str) else str(text)}
+
+
+def _top_k(value):
+    """``value`` as a record count (3, 3.0 and "3" alike), or None if it isn't one."""
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() and number >= 0 else None
+
+
+def _fields(value):
+    """``value`` as a field list (a string stays a comma-separated string), or None."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(item for item in value if isinstance(item, str)) or None
+    return None
+
+
+def _location(value):
+    return (value.strip() or None) if isinstance(value, str) else None
+
+
+def _format(value):
+    return value.strip().lower() if isinstance(value, str) and value.strip().lower() in FORMATS else None
+
+
+# Option name -> coercion to a valid value (None drops the option)
+_OPTIONS = {"fields": _fields, "top_k": _top_k, "location": _location, "format": _format}
+
+
+def structured_tool(func, primary):
+    """Wrap a tool function taking ``primary`` plus options so it accepts one (possibly JSON) input."""
+
+    def run(argument):
+        return func(**parse_tool_input(argument, primary))
+
+    run.__name__ = func.__name__
+    run.__doc__ = func.__doc__
+    return run
+
+
+def _value(value):
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+def _text(records, fields):
+    lines = []
+    rest = [field for field in fields if field != "name"]
+    for i, record in enumerate(records, 1):
+        lines.append(f"{i}. {record['name']}" if "name" in fields else f"{i}.")
+        for field in rest:
+            value = _value(record[field])
+            if field == "rating":
+                value += "/5.0"
+            lines.append(f"   {FIELD_LABELS[field]}: {value}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _table(records, fields):
+    rows = [" | ".join(fields), " | ".join("---" for _ in fields)]
+    rows.extend(" | ".join(_value(record[field]).replace("|", "/") for field in fields) for record in records)
+    return "\n".join(rows) + "\n"
+
+
+def _jsonl(records, fields):
+    return "".join(
+        json.dumps({field: record[field] for field in fields}, ensure_ascii=False, separators=(",", ":")) + "\n"
+        for record in records
+    )
+
+
+_RENDERERS = {"text": _text, "table": _table, "jsonl": _jsonl}
+
+
+def render_records(records, fields, top_k=None, format=None):
+    """
+    Render ``records`` (dicts with every field in ``fields``) projected onto
+    ``fields`` and cut to ``top_k`` (None: TOOL_TOP_K; 0: all). Returns the
+    rendered text and the records kept.
+    """
+    top_k = DEFAULT_TOP_K if top_k is None else int(top_k)
+    if top_k > 0:
+        records = records[:top_k]
+    format = format if format in FORMATS else DEFAULT_FORMAT
+    return _RENDERERS[format](records, fields), records
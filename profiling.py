@@ -0,0 +1,219 @@
+"""
+On-demand per-request profiling for both crews.
+
+``profile_request`` wraps ``run_crew`` / ``get_recommendation``. When a
+request is selected for profiling (explicitly, by the X-Profile request header
+or the Streamlit debug toggle, or at random with PROFILE_SAMPLE_RATE) a
+sampling profiler records the Python stacks of the request thread and of the
+workers running in its copied context (prefetch and planner workers, see
+request_context.context_task) every PROFILE_INTERVAL_MS milliseconds. Threads
+serving other requests, or no request, are left out. Samples are wall-clock,
+so time spent waiting on the network shows up in socket frames next to CPU
+hot spots in CrewAI, LangChain and tool code.
+
+Each profiled request writes three files to PROFILE_DIR:
+  <request id>.trace.json       timing summary (wall, CPU) and top self-time frames
+  <request id>.collapsed.txt    collapsed stacks for flamegraph.pl / inferno
+  <request id>.speedscope.json  open in https://www.speedscope.app
+
+When a request is not profiled the hook costs one random() call.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from crew_logging import crew_log
+from request_context import current_request_id, new_request_id, request_threads
+
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", Path.home() / ".cache" / "crewai-restaurant" / "profiles"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+
+# Request header that turns profiling on for one request (any value but "0")
+PROFILE_HEADER = "X-Profile"
+
+# Workers whose innermost frame is in one of these modules are idle (waiting
+# for work), not waiting on the request's I/O, and are left out of the profile
+_IDLE_MODULES = ("threading.py", "queue.py", "selectors.py")
+
+MAX_DEPTH = 256
+
+# Trace files written by recent profiled requests, newest last
+recent_profiles = deque(maxlen=20)
+
+
+def header_requests_profile(headers):
+    """Whether request ``headers`` (any mapping, may be None) ask for a profile."""
+    if not headers:
+        return False
+    value = headers.get(PROFILE_HEADER) or headers.get(PROFILE_HEADER.lower())
+    return bool(value) and value != "0"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of one request's threads from a background thread into a
+    Counter of (thread, stack) -> samples: the target thread, and the workers
+    ``request_threads`` lists as working on ``request_id``.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, target_thread=None, request_id=None):
+        self.interval = interval
+        self.target_thread = target_thread or threading.get_ident()
+        self.request_id = request_id
+        self.samples = Counter()
+        self.ticks = 0
+        self._labels = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _frame_label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (code.co_name, code.co_filename, code.co_firstlineno)
+        return label
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            owners = request_threads() if self.request_id is not None else {}
+            for ident, frame in sys._current_frames().items():
+                if ident != self.target_thread:
+                    if self.request_id is None or owners.get(ident) != self.request_id:
+                        continue  # Another request's thread, or not working on a request
+                    if frame.f_code.co_filename.endswith(_IDLE_MODULES):
+                        continue
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(self._frame_label(frame.f_code))
+                    frame = frame.f_back
+                thread = "request" if ident == self.target_thread else names.get(ident, str(ident))
+                self.samples[(thread, tuple(reversed(stack)))] += 1
+            self.ticks += 1
+
+    # --- Export ---
+
+    def collapsed(self):
+        """Brendan Gregg's collapsed-stack format: 'thread;outer;...;inner count' per line."""
+        lines = []
+        for (thread, stack), count in sorted(self.samples.items()):
+            frames = [thread] + [f"{name} ({Path(file).name}:{line})" for name, file, line in stack]
+            lines.append(";".join(frame.replace(";", ":") for frame in frames) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name, wall_seconds):
+        frames, index = [], {}
+        profiles = {}
+        weight = wall_seconds / self.ticks if self.ticks else self.interval
+        for (thread, stack), count in sorted(self.samples.items()):
+            indices = []
+            for frame in stack:
+                if frame not in index:
+                    index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indices.append(index[frame])
+            profile = profiles.setdefault(thread, {"samples": [], "weights": []})
+            profile["samples"].append(indices)
+            profile["weights"].append(count * weight)
+        ordered = sorted(profiles, key=lambda thread: thread != "request")
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "crewai-restaurant profiling.py",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": wall_seconds,
+                    "samples": profiles[thread]["samples"],
+                    "weights": profiles[thread]["weights"],
+                }
+                for thread in ordered
+            ],
+        }
+
+    def hot_spots(self, limit=15):
+        """Frames with the most self (innermost) samples, across all threads."""
+        self_samples = Counter()
+        for (_, stack), count in self.samples.items():
+            if stack:
+                self_samples[stack[-1]] += count
+        total = sum(self_samples.values()) or 1
+        return [
+            {"frame": f"{name} ({file}:{line})", "samples": count, "share": round(count / total, 3)}
+            for (name, file, line), count in self_samples.most_common(limit)
+        ]
+
+
+@contextmanager
+def profile_request(name, enabled=None):
+    """
+    Profile the block if ``enabled`` (None: sample at PROFILE_SAMPLE_RATE).
+    Yields the profiler, or None when the request is not profiled.
+    """
+    if enabled is None:
+        enabled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+    if not enabled:
+        yield None
+        return
+
+    request_id = current_request_id() or new_request_id()
+    profiler = SamplingProfiler(request_id=request_id)
+    started_at = datetime.now(timezone.utc)
+    wall_start, cpu_start, process_start = time.perf_counter(), time.thread_time(), time.process_time()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        wall = time.perf_counter() - wall_start
+        try:
+            _write_profile(profiler, request_id, name, started_at, wall,
+                           time.thread_time() - cpu_start, time.process_time() - process_start)
+        except OSError as exc:
+            crew_log.warning("Could not write profile for request %s: %s", request_id, exc)
+
+
+def _write_profile(profiler, request_id, name, started_at, wall, thread_cpu, process_cpu):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    base = PROFILE_DIR / request_id
+    collapsed_path = base.with_suffix(".collapsed.txt")
+    speedscope_path = base.with_suffix(".speedscope.json")
+    trace_path = base.with_suffix(".trace.json")
+
+    collapsed_path.write_text(profiler.collapsed(), encoding="utf-8")
+    speedscope_path.write_text(json.dumps(profiler.speedscope(f"{name} {request_id}", wall)), encoding="utf-8")
+    trace = {
+        "request_id": request_id,
+        "name": name,
+        "started_at": started_at.isoformat(),
+        "wall_seconds": round(wall, 4),
+        "request_thread_cpu_seconds": round(thread_cpu, 4),
+        "process_cpu_seconds": round(process_cpu, 4),
+        "sample_interval_seconds": profiler.interval,
+        "samples": profiler.ticks,
+        "hot_spots": profiler.hot_spots(),
+        "files": {"collapsed": str(collapsed_path), "speedscope": str(speedscope_path)},
+    }
+    trace_path.write_text(json.dumps(trace, indent=2), encoding="utf-8")
+    recent_profiles.append(str(trace_path))
+    crew_log.info("Profile for request %s (%.1fs wall, %.1fs CPU) written to %s", request_id, wall, thread_cpu, trace_path)
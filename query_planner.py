@@ -0,0 +1,227 @@
+"""
+Query planner for comparison requests in both crews.
+
+"Compare sushi in Tokyo vs Berlin", "ramen in Shibuya or Shinjuku" and
+"Italian or Thai in Chicago" ask for several independent answers. Run as one
+crew, the research step only looks at the first place it recognises and the
+agents work through the alternatives one after another. ``plan_query`` splits
+such a request into one sub-query per alternative:
+
+  - places (cities or neighborhoods from the gazetteer; a city that only
+    qualifies its neighborhoods, like Tokyo above, is kept as context),
+  - areas of a city without a gazetteer entry ("downtown or the airport"),
+  - cuisines, when the request names a single place or none.
+
+Alternatives must be joined only by connectors ("vs", "or", "and", commas,
+...), so "sushi in Tokyo and ramen in Osaka" is not mistaken for the same
+question asked twice. ``fan_out`` runs the sub-queries concurrently (each in a
+copy of the caller's context, so the request id and pinned data snapshot carry
+over); the crews then merge the answers with one generation from
+``merge_prompt``, or ``merged_fallback`` without a model.
+
+Settings: PLANNER (1; 0 runs every request as a single query),
+PLANNER_MAX_SUBQUERIES (4), PLANNER_WORKERS (8 threads shared by all requests).
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from crew_logging import crew_log
+from gazetteer import gazetteer, normalize
+from materialized import CUISINES
+from metrics import metrics
+from request_context import context_task
+
+ENABLED = os.environ.get("PLANNER", "1") != "0"
+MAX_SUBQUERIES = int(os.environ.get("PLANNER_MAX_SUBQUERIES", "4"))
+WORKERS = int(os.environ.get("PLANNER_WORKERS", "8"))
+
+AREAS = {
+    "airport", "beach", "city center", "city centre", "downtown", "harbor", "harbour", "midtown", "old town",
+    "train station", "uptown", "waterfront",
+}
+DISTRICTS = {"downtown", "midtown", "uptown"}  # Areas named without an article
+# Words that may join two alternatives ("Tokyo vs Berlin", "downtown or the airport")
+CONNECTORS = {"and", "or", "vs", "v", "versus", "compared", "to", "with", "against", "the", "either", "in", "near"}
+# Words that may introduce the first alternative ("in Tokyo", "between Tokyo and ...")
+LEADS = {"in", "near", "around", "at", "by", "either", "between", "both", "the"}
+# Leading words that only say "compare"
+COMPARE_WORDS = {"compare", "comparing", "comparison", "of"}
+
+MERGE_INSTRUCTIONS = """You are a dining concierge comparing restaurant recommendations for one request.
+Below is what was found for each option the user is weighing, independently (a recommendation or the restaurant data). Write a single comparative answer in markdown:
+1. For each option, its best restaurant in one or two sentences (name, cuisine, rating, price, what stands out).
+2. A short side-by-side comparison of the options (cuisine, price, ratings, ambiance and any weather considerations).
+3. Which option you recommend for this request and why.
+Use only the information below; do not invent restaurants."""
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class SubQuery:
+    label: str  # The alternative, e.g. "Berlin" or "Thai"
+    text: str  # The request text for that alternative alone
+    place: Optional[str] = None  # Gazetteer place name, for location sub-queries
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    kind: str  # "locations" or "cuisines"
+    subqueries: Tuple[SubQuery, ...]
+
+    @property
+    def labels(self):
+        return [subquery.label for subquery in self.subqueries]
+
+
+def _words(normalized):
+    """The words of a normalised text with their start offsets."""
+    words, starts, offset = [], [], 0
+    for word in normalized.split(" "):
+        words.append(word)
+        starts.append(offset)
+        offset += len(word) + 1
+    return words, starts
+
+
+def _phrase_spans(words, phrases):
+    """(first word, end word, phrase) for every one- or two-word phrase in ``words``."""
+    spans, i = [], 0
+    while i < len(words):
+        pair = " ".join(words[i:i + 2])
+        if i + 1 < len(words) and pair in phrases:
+            spans.append((i, i + 2, pair))
+            i += 2
+        elif words[i] in phrases:
+            spans.append((i, i + 1, words[i]))
+            i += 1
+        else:
+            i += 1
+    return spans
+
+
+def _alternatives(text, words, starts):
+    """
+    The dimension the request compares along, its spans and the spans of
+    cities that only qualify the compared neighborhoods; (None, [], []) for a
+    single query.
+    """
+    def word_at(offset):
+        return max(i for i, start in enumerate(starts) if start <= offset)
+
+    matches = gazetteer().find_all(text)
+    qualified = {match.place.city for match in matches if match.place.city}
+    spans = [(word_at(match.start), word_at(match.end - 1) + 1, match.place) for match in matches]
+    places = [span for span in spans if span[2].name not in qualified]
+    if len({place for _, _, place in places}) >= 2:
+        return "locations", places, [span for span in spans if span[2].name in qualified]
+    if len(places) <= 1:
+        areas = _phrase_spans(words, AREAS)
+        if len({area for _, _, area in areas}) >= 2:
+            return "locations", areas, []
+        cuisines = _phrase_spans(words, CUISINES)
+        if len({cuisine for _, _, cuisine in cuisines}) >= 2:
+            return "cuisines", cuisines, []
+    return None, [], []
+
+
+def plan_query(text, max_subqueries=MAX_SUBQUERIES):
+    """The sub-queries for a comparison request, or None for a single query."""
+    if not ENABLED or not text:
+        return None
+    normalized = normalize(text)
+    if not normalized:
+        return None
+    words, starts = _words(normalized)
+    kind, spans, qualifiers = _alternatives(text, words, starts)
+    if kind is None:
+        return None
+
+    removed = set()
+    for (_, end, _), (start, _, _) in zip(spans, spans[1:]):
+        between = range(end, start)
+        if any(words[i] not in CONNECTORS for i in between):
+            return None  # The alternatives come with different wishes
+        removed.update(between)
+    first = spans[0][0]
+    while first > 0 and words[first - 1] in LEADS:
+        first -= 1
+        removed.add(first)
+    for start, end, _ in spans + qualifiers:
+        removed.update(range(start, end))
+    for start, _, _ in qualifiers:
+        if start > 0 and words[start - 1] in LEADS:
+            removed.add(start - 1)
+    rest = [word for i, word in enumerate(words) if i not in removed]
+    while rest and rest[0] in COMPARE_WORDS:
+        rest.pop(0)
+    base = " ".join(rest) or "restaurants"
+
+    subqueries, seen = [], set()
+    for _, _, value in spans:
+        label = value.name if hasattr(value, "name") else value
+        if label in seen:
+            continue
+        seen.add(label)
+        if kind == "cuisines":
+            subqueries.append(SubQuery(label.title(), f"{label} {base}"))
+        elif hasattr(value, "name"):
+            where = f"{label}, {value.city}" if value.city else label
+            subqueries.append(SubQuery(label, f"{base} in {where}", place=label))
+        else:
+            article = "" if label in DISTRICTS else "the "
+            subqueries.append(SubQuery(label, f"{base} near {article}{label}"))
+    if len(subqueries) > max_subqueries:
+        crew_log.info("Comparing only the first %d of %d options", max_subqueries, len(subqueries))
+    metrics.inc("planner_plans_total", kind=kind)
+    return QueryPlan(kind, tuple(subqueries[:max_subqueries]))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="planner")
+        return _executor
+
+
+def fan_out(subqueries, run):
+    """
+    Run ``run(subquery)`` for every sub-query concurrently; returns
+    ``[(subquery, result), ...]`` in order. A failing sub-query yields a note
+    instead of failing the others.
+    """
+    executor = _get_executor()
+    futures = [executor.submit(context_task(run, subquery)) for subquery in subqueries]
+    results = []
+    for subquery, future in zip(subqueries, futures):
+        try:
+            results.append((subquery, future.result()))
+        except Exception as exc:
+            crew_log.warning("Sub-query '%s' failed: %s", subquery.text, exc)
+            metrics.inc("planner_subquery_errors_total")
+            results.append((subquery, f"No recommendation could be produced for {subquery.label}: {exc}"))
+    return results
+
+
+def result_text(result):
+    """The final text of a crew result, a collapsed result or a plain string."""
+    return str(getattr(result, "raw", result)).strip()
+
+
+def merge_prompt(request, results):
+    """The prompt for the merge generation (static instructions first)."""
+    sections = "\n\n".join(f"### Option: {subquery.label}\n{result_text(result)}" for subquery, result in results)
+    return f"{MERGE_INSTRUCTIONS}\n\nUser request:\n{request}\n\n{sections}\n"
+
+
+def merged_fallback(results):
+    """The sub-query answers side by side, for when the merge can't call a model."""
+    labels = " vs ".join(subquery.label for subquery, _ in results)
+    sections = "\n\n".join(f"### {subquery.label}\n\n{result_text(result)}" for subquery, result in results)
+    return f"## Comparison: {labels}\n\n{sections}"
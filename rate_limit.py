@@ -0,0 +1,271 @@
+"""
+Client-side rate limiting and adaptive concurrency for external dependencies.
+
+Each dependency (OpenAI, Serper, Open-Meteo) gets a DependencyLimiter that
+combines:
+  - a token bucket capping the request rate,
+  - an AIMD concurrency limit: +1/limit per healthy response, halved on a 429
+    (at most once per cool-down) and trimmed when latency exceeds the target,
+  - a FIFO queue so callers are served in arrival order,
+  - a shared back-off window that honours Retry-After for every caller.
+
+The limiters wrap the HTTP clients rather than the call sites: a requests
+adapter for the tools and an httpx transport for the OpenAI client. Current
+limits, queue depth and throttling counts are exported through ``metrics``.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+DEFAULT_LIMITS = {
+    "openai": dict(rate=8.0, burst=16, max_concurrency=16, latency_target=30.0),
+    "serper": dict(rate=5.0, burst=10, max_concurrency=8, latency_target=5.0),
+    "open-meteo": dict(rate=10.0, burst=20, max_concurrency=8, latency_target=3.0),
+}
+
+HOST_DEPENDENCIES = {
+    "api.openai.com": "openai",
+    "google.serper.dev": "serper",
+    "api.open-meteo.com": "open-meteo",
+    "geocoding-api.open-meteo.com": "open-meteo",
+}
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when a caller waited longer than ``max_queue_wait`` for a slot."""
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class Call:
+    """One admitted request; report its outcome with ``record`` before leaving the block."""
+
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._start = time.monotonic()
+        self.status = None
+        self.retry_after = None
+
+    def record(self, status, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        status = self.status if self.status is not None or exc_type is None else "error"
+        self._limiter._release(status, time.monotonic() - self._start, self.retry_after)
+        return False
+
+
+class DependencyLimiter:
+    """Token bucket + AIMD concurrency limit + FIFO queue for one dependency."""
+
+    def __init__(self, name, rate, burst, max_concurrency, min_concurrency=1, latency_target=None,
+                 max_queue_wait=60.0, decrease_cooldown=1.0):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self.max_queue_wait = max_queue_wait
+        self.decrease_cooldown = decrease_cooldown
+
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._in_flight = 0
+        self._limit = float(max_concurrency)
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._decreased_at = 0.0
+        self._publish()
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    def _publish(self):
+        metrics.set("rate_limit_concurrency_limit", int(self._limit), dependency=self.name)
+        metrics.set("rate_limit_in_flight", self._in_flight, dependency=self.name)
+        metrics.set("rate_limit_queue_depth", len(self._queue), dependency=self.name)
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def acquire(self, timeout=None):
+        """Wait for a turn (FIFO), a rate token and a concurrency slot; returns a Call."""
+        timeout = self.max_queue_wait if timeout is None else timeout
+        enqueued = time.monotonic()
+        deadline = enqueued + timeout
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            self._publish()
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = None
+                    if self._queue[0] is ticket:
+                        if now < self._blocked_until:
+                            wait = self._blocked_until - now
+                        elif self._tokens < 1:
+                            wait = (1 - self._tokens) / self.rate
+                        elif self._in_flight < int(self._limit):
+                            break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        metrics.inc("rate_limit_queue_timeouts_total", dependency=self.name)
+                        raise RateLimitTimeout(f"Timed out waiting {timeout:.0f}s for a {self.name} request slot")
+                    self._cond.wait(min(wait, remaining) if wait is not None else remaining)
+                self._queue.popleft()
+                self._tokens -= 1
+                self._in_flight += 1
+            except BaseException:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                raise
+            finally:
+                self._publish()
+                self._cond.notify_all()
+        metrics.observe("rate_limit_queue_wait_seconds", time.monotonic() - enqueued, dependency=self.name)
+        return Call(self)
+
+    def _decrease(self, now, factor):
+        if now - self._decreased_at >= self.decrease_cooldown:
+            self._limit = max(self.min_concurrency, self._limit * factor)
+            self._decreased_at = now
+
+    def _release(self, status, latency, retry_after):
+        with self._cond:
+            now = time.monotonic()
+            self._in_flight -= 1
+            if status == 429:
+                metrics.inc("rate_limit_throttled_total", dependency=self.name)
+                self._decrease(now, 0.5)
+                if retry_after:
+                    self._blocked_until = max(self._blocked_until, now + retry_after)
+            elif self.latency_target and latency > self.latency_target:
+                self._decrease(now, 0.9)
+            elif status != "error":
+                self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+            metrics.observe("rate_limit_request_seconds", latency, dependency=self.name)
+            self._publish()
+            self._cond.notify_all()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(name):
+    """
+    The shared limiter for a dependency. Defaults can be overridden with
+    RATE_LIMIT_<NAME>_RPS, RATE_LIMIT_<NAME>_BURST and RATE_LIMIT_<NAME>_CONCURRENCY
+    (name upper-cased with dashes as underscores, e.g. RATE_LIMIT_OPEN_METEO_RPS).
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            settings = dict(DEFAULT_LIMITS.get(name, dict(rate=5.0, burst=10, max_concurrency=8)))
+            prefix = "RATE_LIMIT_" + name.upper().replace("-", "_")
+            if os.environ.get(f"{prefix}_RPS"):
+                settings["rate"] = float(os.environ[f"{prefix}_RPS"])
+            if os.environ.get(f"{prefix}_BURST"):
+                settings["burst"] = int(os.environ[f"{prefix}_BURST"])
+            if os.environ.get(f"{prefix}_CONCURRENCY"):
+                settings["max_concurrency"] = int(os.environ[f"{prefix}_CONCURRENCY"])
+            _limiters[name] = DependencyLimiter(name, **settings)
+        return _limiters[name]
+
+
+def dependency_for_url(url):
+    return HOST_DEPENDENCIES.get(urlsplit(url).hostname or "")
+
+
+# ============================================================================
+# HTTP CLIENT INTEGRATION
+# ============================================================================
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    requests adapter that routes each request through its dependency's limiter
+    and, on a 429, waits out Retry-After (shared with all callers) before
+    retrying up to ``max_throttle_retries`` times.
+    """
+
+    def __init__(self, dependency=None, max_throttle_retries=2, **kwargs):
+        self.dependency = dependency
+        self.max_throttle_retries = max_throttle_retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        name = self.dependency or dependency_for_url(request.url)
+        if name is None:
+            return super().send(request, **kwargs)
+        dependency_limiter = limiter(name)
+        for attempt in range(self.max_throttle_retries + 1):
+            try:
+                call = dependency_limiter.acquire()
+            except RateLimitTimeout as exc:
+                raise requests.exceptions.Timeout(str(exc), request=request) from exc
+            with call:
+                response = super().send(request, **kwargs)
+                call.record(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+            if response.status_code != 429 or attempt == self.max_throttle_retries:
+                return response
+            response.close()
+        return response
+
+
+def rate_limited_session(dependency=None, pool_maxsize=16):
+    """A pooled requests Session whose requests go through the dependency limiters."""
+    session = requests.Session()
+    adapter = RateLimitedAdapter(dependency=dependency, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def rate_limited_http_client(dependency="openai", **client_kwargs):
+    """An httpx client for SDKs such as OpenAI's, with requests routed through ``dependency``'s limiter."""
+    import httpx
+
+    class RateLimitedTransport(httpx.BaseTransport):
+        def __init__(self):
+            self._transport = httpx.HTTPTransport()
+
+        def handle_request(self, request):
+            with limiter(dependency).acquire() as call:
+                response = self._transport.handle_request(request)
+                call.record(response.status_code, parse_retry_after(response.headers.get("retry-after")))
+            return response
+
+        def close(self):
+            self._transport.close()
+
+    return httpx.Client(transport=RateLimitedTransport(), **client_kwargs)
@@ -0,0 +1,85 @@
+"""
+Per-request identity shared by the profiling and logging hooks.
+
+``request_scope()`` gives the current request an id, stored in a context
+variable so it follows the request into tool threads that copy the context
+(see ollama_version/prefetch.py). Nested scopes reuse the outer id, so a UI
+that opens a scope before calling ``run_crew`` gets one id for the request.
+
+Threads also record which request they are working on while in a scope or in
+a ``context_task`` (``request_threads``), so the per-request profiler can
+leave out threads serving other requests.
+"""
+
+import contextvars
+import threading
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_request_id = ContextVar("request_id", default=None)
+
+_threads = {}  # thread ident -> id of the request it is working on
+_threads_lock = threading.Lock()
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:12]
+
+
+@contextmanager
+def request_scope(request_id=None):
+    """Run the block as one request; yields its id."""
+    if request_id is None and _request_id.get() is not None:
+        yield _request_id.get()
+        return
+    token = _request_id.set(request_id or new_request_id())
+    try:
+        with _working_on(_request_id.get()):
+            yield _request_id.get()
+    finally:
+        _request_id.reset(token)
+
+
+@contextmanager
+def _working_on(request_id):
+    ident = threading.get_ident()
+    with _threads_lock:
+        previous = _threads.get(ident)
+        _threads[ident] = request_id
+    try:
+        yield
+    finally:
+        with _threads_lock:
+            if previous is None:
+                _threads.pop(ident, None)
+            else:
+                _threads[ident] = previous
+
+
+def request_threads():
+    """Snapshot of thread ident -> request id for the threads currently working on a request."""
+    with _threads_lock:
+        return dict(_threads)
+
+
+def _run_tracked(func, args, kwargs):
+    request_id = _request_id.get()
+    if request_id is None:
+        return func(*args, **kwargs)
+    with _working_on(request_id):
+        return func(*args, **kwargs)
+
+
+def context_task(func, *args, **kwargs):
+    """
+    A callable for a worker thread that runs ``func(*args, **kwargs)`` in a
+    copy of the caller's context, with the worker counted as working on the
+    caller's request while it runs.
+    """
+    context = contextvars.copy_context()
+    return lambda: context.run(_run_tracked, func, args, kwargs)
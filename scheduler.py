@@ -0,0 +1,185 @@
+"""
+Priority scheduling of crew runs in front of the shared LLM backend.
+
+Every ``run_crew`` / ``get_recommendation`` call takes a slot from the
+process-wide ``scheduler`` before it starts:
+
+  - priority classes are served in order (interactive, then api, then batch);
+    a lower class only runs when no higher class has a runnable request,
+  - each class has its own concurrency limit inside the global one, so batch
+    work can never occupy every slot,
+  - within a class, tenants (Streamlit sessions, API keys, batch jobs) share
+    the class by start-time fair queuing: a tenant submitting many requests
+    is interleaved with the others instead of being served first-come,
+  - a running request gives its slot up at task boundaries (``yield_point``,
+    called from the crews' task callback) when a higher-priority request is
+    waiting, and queues again with its original position.
+
+Queue depth, running requests, preemptions and queue wait per class are
+exported through ``metrics``.
+
+Settings: SCHEDULER_CONCURRENCY (2) and SCHEDULER_LIMIT_<CLASS>
+(interactive 2, api 2, batch 1).
+"""
+
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import metrics
+
+PRIORITIES = ("interactive", "api", "batch")
+
+DEFAULT_LIMITS = {"interactive": 2, "api": 2, "batch": 1}
+
+_current_job = ContextVar("scheduler_job", default=None)
+
+
+class SchedulerTimeout(TimeoutError):
+    """Raised when a request waited longer than its timeout for a slot."""
+
+
+class Job:
+    __slots__ = ("priority", "tenant", "start_tag", "finish_tag", "seq", "enqueued_at")
+
+    def __init__(self, priority, tenant, start_tag, finish_tag, seq):
+        self.priority = priority
+        self.tenant = tenant
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+
+
+class Scheduler:
+    def __init__(self, concurrency=2, limits=None):
+        self.concurrency = concurrency
+        self.limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        self._cond = threading.Condition()
+        self._waiting = {priority: [] for priority in PRIORITIES}
+        self._running = dict.fromkeys(PRIORITIES, 0)
+        self._virtual_time = dict.fromkeys(PRIORITIES, 0.0)
+        self._tenant_finish = {priority: {} for priority in PRIORITIES}
+        self._seq = itertools.count()
+        for priority in PRIORITIES:
+            metrics.set("scheduler_concurrency_limit", self.limits[priority], priority=priority)
+            self._publish(priority)
+
+    def _publish(self, priority):
+        metrics.set("scheduler_queue_depth", len(self._waiting[priority]), priority=priority)
+        metrics.set("scheduler_running", self._running[priority], priority=priority)
+
+    def _enqueue(self, job):
+        self._waiting[job.priority].append(job)
+        self._publish(job.priority)
+
+    def _new_job(self, priority, tenant, cost):
+        start = max(self._virtual_time[priority], self._tenant_finish[priority].get(tenant, 0.0))
+        finish = start + cost
+        self._tenant_finish[priority][tenant] = finish
+        return Job(priority, tenant, start, finish, next(self._seq))
+
+    def _next(self):
+        """The job that should get the next free slot, or None."""
+        if sum(self._running.values()) >= self.concurrency:
+            return None
+        for priority in PRIORITIES:
+            waiting = self._waiting[priority]
+            if waiting and self._running[priority] < self.limits[priority]:
+                return min(waiting, key=lambda job: (job.finish_tag, job.seq))
+        return None
+
+    def _wait_for_turn(self, job, deadline):
+        while self._next() is not job:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self._waiting[job.priority].remove(job)
+                self._publish(job.priority)
+                self._cond.notify_all()
+                metrics.inc("scheduler_timeouts_total", priority=job.priority)
+                raise SchedulerTimeout(f"Timed out waiting for a {job.priority} slot")
+            self._cond.wait(remaining)
+        self._waiting[job.priority].remove(job)
+        self._running[job.priority] += 1
+        self._virtual_time[job.priority] = max(self._virtual_time[job.priority], job.start_tag)
+        self._publish(job.priority)
+        metrics.observe("scheduler_queue_wait_seconds", time.monotonic() - job.enqueued_at, priority=job.priority)
+        self._cond.notify_all()
+
+    def _release(self, job):
+        self._running[job.priority] -= 1
+        self._publish(job.priority)
+        self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority="interactive", tenant="default", cost=1.0, timeout=None):
+        """
+        Run the block in a scheduler slot. Nested calls (a crew run inside a
+        scheduled request) reuse the outer slot.
+        """
+        if _current_job.get() is not None:
+            yield _current_job.get()
+            return
+        if priority not in self._waiting:
+            raise ValueError(f"Unknown priority {priority!r}; use one of {', '.join(PRIORITIES)}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            job = self._new_job(priority, tenant, cost)
+            self._enqueue(job)
+            self._wait_for_turn(job, deadline)
+        token = _current_job.set(job)
+        try:
+            yield job
+        finally:
+            _current_job.reset(token)
+            with self._cond:
+                self._release(job)
+
+    def yield_point(self):
+        """
+        Called between tasks: if a higher-priority request is waiting for a slot
+        this request holds, hand the slot over and queue again.
+        """
+        job = _current_job.get()
+        if job is None:
+            return
+        with self._cond:
+            rank = PRIORITIES.index(job.priority)
+            if not any(self._waiting[priority] for priority in PRIORITIES[:rank]):
+                return
+            self._release(job)
+            successor = self._next()
+            if successor is None or PRIORITIES.index(successor.priority) >= rank:
+                # No higher-priority request can use the slot after all; take it back
+                self._running[job.priority] += 1
+                self._publish(job.priority)
+                return
+            metrics.inc("scheduler_preemptions_total", priority=job.priority)
+            job.enqueued_at = time.monotonic()
+            self._enqueue(job)
+            self._wait_for_turn(job, None)
+
+    def stats(self):
+        with self._cond:
+            return {
+                priority: {
+                    "waiting": len(self._waiting[priority]),
+                    "running": self._running[priority],
+                    "limit": self.limits[priority],
+                }
+                for priority in PRIORITIES
+            }
+
+
+def _limits_from_env():
+    return {
+        priority: int(os.environ.get(f"SCHEDULER_LIMIT_{priority.upper()}", limit))
+        for priority, limit in DEFAULT_LIMITS.items()
+    }
+
+
+# Process-wide scheduler in front of the LLM backend
+scheduler = Scheduler(int(os.environ.get("SCHEDULER_CONCURRENCY", "2")), _limits_from_env())
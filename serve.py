@@ -0,0 +1,60 @@
+"""
+Start a Streamlit app with warm-up and a readiness endpoint.
+
+The crew module is imported and warmed (see warmup.py) in this process
+before the first session arrives, then Streamlit serves the app from the same
+process, so the app reuses the loaded modules, pooled connections and primed
+caches. GET /ready on --ready-port answers 200 only after warm-up completes;
+point load balancer health checks there rather than at Streamlit's own
+/_stcore/health, which passes as soon as the server is up.
+
+Usage:
+    python serve.py app.py --port 8501
+    python ../serve.py app_ollama.py --port 8501 --address 0.0.0.0 --ready-port 8599
+"""
+
+import argparse
+import importlib
+import os
+import sys
+from pathlib import Path
+
+# Crew module warmed for each app (overridable with --crew)
+CREW_MODULES = {"app.py": "crew", "app_ollama.py": "crew_ollama"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", help="Streamlit script to serve")
+    parser.add_argument("--crew", help="module providing warmup_steps() (default: chosen from the app name)")
+    parser.add_argument("--port", type=int, default=8501)
+    parser.add_argument("--address", default=None)
+    parser.add_argument("--ready-port", type=int, default=int(os.environ.get("WARMUP_READY_PORT", "8599")))
+    args = parser.parse_args()
+
+    app_path = Path(args.app).resolve()
+    # Same import roots as `streamlit run`: the app's directory, then the repository root
+    sys.path.insert(0, str(app_path.parent))
+    repo_root = str(Path(__file__).resolve().parent)
+    if repo_root not in sys.path:
+        sys.path.append(repo_root)
+
+    from warmup import serve_readiness, start_warmup
+
+    crew_module = args.crew or CREW_MODULES.get(app_path.name)
+    if crew_module is None:
+        parser.error(f"don't know which crew module {app_path.name} uses; pass --crew")
+
+    serve_readiness(args.ready_port)
+    start_warmup(lambda: importlib.import_module(crew_module).warmup_steps())
+    print(f"Warming up {crew_module}; readiness on http://localhost:{args.ready_port}/ready")
+
+    from streamlit.web import bootstrap
+
+    flag_options = {"server_port": args.port, "server_address": args.address, "server_headless": True}
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(str(app_path), None, [], flag_options)
+
+
+if __name__ == "__main__":
+    main()
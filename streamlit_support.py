@@ -0,0 +1,29 @@
+"""
+Helpers that keep the Streamlit front-ends from re-running more than they must.
+
+Streamlit re-executes the whole app script on every interaction, and each run
+costs server CPU the crews need. The apps therefore:
+
+  - collect their inputs in an ``st.form``, so editing a field doesn't rerun
+    anything until the form is submitted,
+  - keep the last result in ``st.session_state`` and render it from there, so
+    it survives reruns without running the crew again,
+  - wrap the parts that change on their own (location autocomplete, the
+    recommendation area, debug panels) in ``fragment``s, which rerun alone
+    when one of their widgets changes,
+  - set widget values from button callbacks (``set_state``) instead of
+    assigning them and calling ``st.rerun()``, which runs the script twice.
+
+``fragment`` is ``st.fragment`` where available (``st.experimental_fragment``
+on 1.33-1.36); on older Streamlit releases it is a no-op and the decorated
+function simply runs as part of the full script.
+"""
+
+import streamlit as st
+
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+
+def set_state(**values):
+    """Button callback: set session state (widget values included) before the next run."""
+    st.session_state.update(values)
@@ -0,0 +1,139 @@
+"""
+JSON-mode agent replies for both crews.
+
+CrewAI's ReAct parser wants "Thought / Action / Action Input" or "Thought /
+Final Answer" text, and small models often get that format slightly wrong:
+a missing "Action Input:", a tool call and a final answer in one reply, an
+answer without its "Final Answer:" prefix. Each rejected reply costs another
+generation in which the agent is told to fix its format.
+
+With structured output the agents' models (model_routing.RoutedModel) ask
+for one JSON object per reply instead, and constrain the backend to valid
+JSON (Ollama's ``format="json"``, OpenAI's JSON response format):
+
+    {"thought": "...", "action": "<tool name>", "action_input": {...}}
+    {"thought": "...", "final_answer": "..."}
+
+``parse_agent_reply`` validates the object against that schema and renders
+it as the ReAct text CrewAI expects (tool names are matched to the listed
+tools case-insensitively). A reply that doesn't validate is a parse failure
+and goes through the usual tier escalation.
+
+``is_format_retry`` spots the calls CrewAI makes after rejecting a reply, so
+RoutedModel can count them per agent (model_format_retries_total) next to
+the parse failures (model_parse_failures_total, by mode).
+
+Settings: STRUCTURED_OUTPUT (1; 0 keeps free-text replies), overridable per
+role as STRUCTURED_OUTPUT_<ROLE> (e.g. STRUCTURED_OUTPUT_GENERATOR=0).
+"""
+
+import json
+import os
+import re
+
+ENABLED = os.environ.get("STRUCTURED_OUTPUT", "1") != "0"
+
+INSTRUCTIONS = """
+
+Reply with exactly one JSON object and nothing else, in one of these two forms.
+To use a tool:
+{"thought": "what you are thinking", "action": "the tool name", "action_input": {"argument": "value"}}
+To give your final answer:
+{"thought": "I now know the final answer", "final_answer": "your complete final answer"}
+Put the whole final answer (Markdown is fine) in the "final_answer" string."""
+
+# What CrewAI tells an agent after rejecting its reply
+_FORMAT_ERRORS = ("I did it wrong", "Invalid Format")
+_TOOL_NAMES = re.compile(r"only one name of \[([^\]]*)\]")
+
+
+def structured_enabled(role):
+    """Whether ``role`` uses JSON-mode replies (STRUCTURED_OUTPUT, STRUCTURED_OUTPUT_<ROLE>)."""
+    return os.environ.get(f"STRUCTURED_OUTPUT_{role.upper()}", "1" if ENABLED else "0") != "0"
+
+
+def json_mode(client):
+    """Call arguments that constrain ``client`` to JSON output ({} for backends without a JSON mode)."""
+    name = type(client).__name__
+    if "Ollama" in name:
+        return {"format": "json"}
+    if "OpenAI" in name:
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def prompt_text(prompt):
+    if hasattr(prompt, "to_string"):
+        return prompt.to_string()
+    if isinstance(prompt, list):
+        return "\n".join(str(getattr(message, "content", message)) for message in prompt)
+    return str(prompt)
+
+
+def json_prompt(prompt):
+    """The agent's prompt with the JSON reply instructions appended (messages stay messages)."""
+    if isinstance(prompt, str):
+        text = prompt.rstrip()
+        if text.endswith("Thought:"):  # The ReAct cue for a free-text reply
+            text = text[:-len("Thought:")].rstrip()
+        return text + INSTRUCTIONS
+    messages = prompt.to_messages() if hasattr(prompt, "to_messages") else list(prompt)
+    return messages + [("human", INSTRUCTIONS.strip())]
+
+
+def tool_names(prompt):
+    """The tool names CrewAI lists in the agent's prompt."""
+    match = _TOOL_NAMES.search(prompt_text(prompt))
+    return [name.strip() for name in match.group(1).split(",") if name.strip()] if match else []
+
+
+def _as_text(value):
+    if isinstance(value, str):
+        return value.strip()
+    if value is None:
+        return ""
+    return json.dumps(value, ensure_ascii=False)
+
+
+def parse_agent_reply(text, tools=()):
+    """
+    The ReAct text for a JSON agent reply, or None when it isn't one object
+    with either a non-empty "action" or a non-empty "final_answer".
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        reply = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(reply, dict):
+        return None
+    thought = _as_text(reply.get("thought"))
+    action = reply.get("action")
+    if isinstance(action, str) and action.strip():
+        action = action.strip()
+        # A tool call wins over an answer given in the same reply; the answer comes after the observation
+        action = next((tool for tool in tools if tool.lower() == action.lower()), action)
+        action_input = reply.get("action_input")
+        return f"Thought: {thought}\nAction: {action}\nAction Input: {_as_text(action_input) or '{}'}"
+    answer = _as_text(reply.get("final_answer"))
+    if answer:
+        return f"Thought: {thought or 'I now know the final answer'}\nFinal Answer: {answer}"
+    return None
+
+
+def is_format_retry(prompt):
+    """Whether the agent's last observation is CrewAI rejecting its previous reply's format."""
+    text = prompt_text(prompt)
+    marker = text.rfind("Observation:")
+    tail = text[marker:] if marker >= 0 else text[-1000:]
+    return any(error in tail for error in _FORMAT_ERRORS)
+
+
+def with_text(result, text):
+    """``result`` (a string or a chat message) with its text replaced."""
+    if isinstance(result, str):
+        return text
+    result.content = text
+    return result
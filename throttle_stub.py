@@ -0,0 +1,138 @@
+"""
+Local stub API that injects throttling, for exercising rate_limit.py.
+
+The stub admits ``--rps`` requests per second (its own token bucket) and
+answers everything above that with 429 and a Retry-After header. With
+``--load`` it also fires concurrent requests at itself through a rate-limited
+session and prints the limiter metrics, so the AIMD behaviour can be observed
+without touching the real APIs.
+
+Usage:
+    python throttle_stub.py --port 8099 --rps 5 --retry-after 1
+    python throttle_stub.py --rps 5 --load 200 --workers 32
+"""
+
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, rps, retry_after, latency):
+        self.rps = rps
+        self.retry_after = retry_after
+        self.latency = latency
+        self.tokens = float(rps)
+        self.refilled_at = time.monotonic()
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.throttled = 0
+
+    def admit(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rps, self.tokens + (now - self.refilled_at) * self.rps)
+            self.refilled_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.accepted += 1
+                return True
+            self.throttled += 1
+            return False
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self):
+            if not state.admit():
+                self.send_response(429)
+                self.send_header("Retry-After", str(state.retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            time.sleep(state.latency)
+            body = json.dumps({"ok": True, "path": self.path}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = _respond
+        do_POST = _respond
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(port=0, rps=5.0, retry_after=1, latency=0.05):
+    """Start the stub in a daemon thread; returns (server, state)."""
+    state = StubState(rps, retry_after, latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def run_load(url, total, workers):
+    from metrics import metrics
+    from rate_limit import rate_limited_session
+
+    session = rate_limited_session(dependency="stub")
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(_):
+        try:
+            status = session.get(url, timeout=30).status_code
+        except Exception as exc:
+            status = type(exc).__name__
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.monotonic() - start
+
+    print(f"{total} requests in {elapsed:.1f}s -> {statuses}")
+    snapshot = metrics.snapshot()
+    for section in ("gauges", "counters", "histograms"):
+        for name, value in sorted(snapshot[section].items()):
+            if "dependency=stub" in name:
+                print(f"  {name}: {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--rps", type=float, default=5.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--load", type=int, default=0, help="send this many requests through a limited session")
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    server, state = start_stub(args.port, args.rps, args.retry_after, args.latency)
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/test"
+    print(f"Throttling stub listening on {url} ({args.rps} req/s)")
+
+    if args.load:
+        run_load(url, args.load, args.workers)
+        print(f"Stub accepted {state.accepted}, throttled {state.throttled}")
+        server.shutdown()
+        return
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
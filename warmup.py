@@ -0,0 +1,223 @@
+"""
+Startup warm-up and readiness for the Streamlit apps and worker processes.
+
+Each crew module exposes ``warmup_steps()``: loading the model, building the
+agents and a crew, opening pooled connections and priming the tool caches for
+the cities that were requested most recently (``traffic``). ``start_warmup``
+runs them once per process in a background thread; ``status.ready`` is set
+when every required step has succeeded.
+
+Readiness is reported by ``serve_readiness`` (GET /ready answers 503 until
+warm-up completes, /live always 200) and, if WARMUP_READY_FILE is set, by
+writing that file. serve.py starts both before handing over to Streamlit.
+
+Worker processes can warm up the same way, or check a deployment with:
+    python warmup.py crew_ollama    (exits non-zero if a required step fails)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from crew_logging import crew_log
+from metrics import metrics
+
+WARMUP_TOP_CITIES = int(os.environ.get("WARMUP_TOP_CITIES", "5"))
+TRAFFIC_PATH = Path(os.environ.get("TRAFFIC_STATS_PATH",
+                                   Path.home() / ".cache" / "crewai-restaurant" / "traffic.json"))
+
+
+class WarmupStep:
+    def __init__(self, name, func, required=True):
+        self.name = name
+        self.func = func
+        self.required = required
+
+
+class WarmupStatus:
+    def __init__(self):
+        self.state = "pending"  # pending -> running -> ready | failed
+        self.steps = []
+        self.ready = threading.Event()
+        self.done = threading.Event()  # Set when warm-up has finished, successfully or not
+        self._lock = threading.Lock()
+
+    def as_dict(self):
+        with self._lock:
+            return {"state": self.state, "steps": list(self.steps)}
+
+
+status = WarmupStatus()
+_started = False
+_start_lock = threading.Lock()
+
+
+def run_warmup(steps, status=status):
+    """Run ``steps`` in order, recording their timings; optional steps may fail without blocking readiness."""
+    status.state = "running"
+    failed = False
+    for step in steps:
+        start = time.perf_counter()
+        entry = {"name": step.name, "required": step.required}
+        try:
+            detail = step.func()
+            entry["ok"] = True
+            if detail is not None:
+                entry["detail"] = detail
+        except Exception as exc:
+            entry["ok"] = False
+            entry["error"] = f"{type(exc).__name__}: {exc}"
+            failed = failed or step.required
+            if step.required:
+                crew_log.exception("Warm-up %s failed", step.name)
+            else:
+                crew_log.warning("Warm-up %s (optional) failed: %s", step.name, entry["error"])
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        metrics.set("warmup_step_seconds", entry["seconds"], step=step.name)
+        with status._lock:
+            status.steps.append(entry)
+        if entry["ok"]:
+            crew_log.info("Warm-up %s: ok (%ss)", step.name, entry["seconds"])
+
+    status.state = "failed" if failed else "ready"
+    metrics.set("warmup_ready", 0 if failed else 1)
+    if not failed:
+        status.ready.set()
+        ready_file = os.environ.get("WARMUP_READY_FILE")
+        if ready_file:
+            Path(ready_file).write_text(json.dumps(status.as_dict(), indent=2), encoding="utf-8")
+    status.done.set()
+    return status
+
+
+def wait_until_warm(timeout=None, status=status):
+    """Block until warm-up has finished (if it was started); returns whether the process is ready."""
+    if status.state != "pending":
+        status.done.wait(timeout)
+    return status.ready.is_set()
+
+
+def start_warmup(steps_factory, background=True):
+    """
+    Run the warm-up once per process. ``steps_factory`` is called lazily (in
+    the warm-up thread when ``background``) so importing heavy modules is part
+    of the warm-up too.
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return status
+        _started = True
+
+    def run():
+        try:
+            steps = steps_factory()
+        except Exception:
+            crew_log.exception("Warm-up could not start")
+            status.state = "failed"
+            status.done.set()
+            return
+        run_warmup(steps)
+
+    if background:
+        threading.Thread(target=run, name="warmup", daemon=True).start()
+    else:
+        run()
+    return status
+
+
+def serve_readiness(port, status=status):
+    """Serve GET /ready (200 once warmed up, 503 before) and GET /live on ``port`` in a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith("/live"):
+                code, body = 200, {"state": "live"}
+            elif self.path.startswith("/ready"):
+                code, body = (200 if status.ready.is_set() else 503), status.as_dict()
+            else:
+                code, body = 404, {"error": "not found"}
+            payload = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="readiness", daemon=True).start()
+    return server
+
+
+# ============================================================================
+# RECENT TRAFFIC
+# ============================================================================
+
+class TrafficStats:
+    """
+    Request counts per city, persisted so the next process knows what to warm.
+    Saves are throttled to one every ``save_interval`` seconds.
+    """
+
+    def __init__(self, path=TRAFFIC_PATH, save_interval=60.0):
+        self.path = Path(path)
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        try:
+            self._counts = Counter(json.loads(self.path.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            self._counts = Counter()
+
+    def record(self, city):
+        if not city:
+            return
+        with self._lock:
+            self._counts[city] += 1
+            if time.monotonic() - self._saved_at < self.save_interval:
+                return
+            self._saved_at = time.monotonic()
+            counts = dict(self._counts)
+        self._save(counts)
+
+    def _save(self, counts):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(counts), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as exc:
+            crew_log.warning("Could not save traffic stats: %s", exc)
+
+    def top(self, n=WARMUP_TOP_CITIES):
+        with self._lock:
+            return [city for city, _ in self._counts.most_common(n)]
+
+
+traffic = TrafficStats()
+
+
+def main():
+    import argparse
+    import importlib
+    import sys
+
+    parser = argparse.ArgumentParser(description="Run a crew module's warm-up steps once and report them")
+    parser.add_argument("crew", help="module providing warmup_steps(), e.g. crew or crew_ollama")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent / "ollama_version"))
+    result = start_warmup(lambda: importlib.import_module(args.crew).warmup_steps(), background=False)
+    print(json.dumps(result.as_dict(), indent=2))
+    sys.exit(0 if result.ready.is_set() else 1)
+
+
+if __name__ == "__main__":
+    main()